@@ -1,3 +1,5 @@
+import asyncio
+import logging
 from pathlib import Path
 from typing import List
 
@@ -6,10 +8,20 @@ from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 
 from cado.app import routes
+from cado.app.autosave import flush_all
+from cado.app.metrics import monitor_event_loop_lag
+from cado.app.notebook_registry import notebook_registry
+from cado.app.settings import Settings
+from cado.core.kernel_pool import create_kernel_pool, preload_modules, shutdown_kernel_pool
+
+logger = logging.getLogger(__name__)
 
 ALLOWED_ORIGINS: List[str] = []
 
 app = FastAPI()
+app.state.settings = Settings()
+app.state.executor = None
+app.state.event_loop_monitor = None
 
 app.include_router(routes.router)
 
@@ -23,3 +35,43 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+
+
+@app.on_event("startup")
+def start_executor() -> None:
+    """Size the notebook cache, preload modules and start the worker pool for running cells, if workers are enabled."""
+    settings: Settings = app.state.settings
+    notebook_registry.max_bytes = settings.cache_size * 1024 * 1024
+    # Cells also run in the server process when there are no workers
+    preload_modules(settings.preload)
+    if settings.workers > 0:
+        logger.info("Starting pool with %d workers", settings.workers)
+        app.state.executor = create_kernel_pool(settings.workers, settings.preload)
+
+
+@app.on_event("startup")
+async def start_event_loop_monitor() -> None:
+    """Start measuring event loop lag for the metrics endpoint."""
+    app.state.event_loop_monitor = asyncio.create_task(monitor_event_loop_lag())
+
+
+@app.on_event("shutdown")
+async def stop_event_loop_monitor() -> None:
+    """Stop measuring event loop lag."""
+    if app.state.event_loop_monitor is not None:
+        app.state.event_loop_monitor.cancel()
+        app.state.event_loop_monitor = None
+
+
+@app.on_event("shutdown")
+def save_notebooks() -> None:
+    """Save notebooks with changes that have not been written yet."""
+    flush_all()
+
+
+@app.on_event("shutdown")
+def stop_executor() -> None:
+    """Stop the worker pool."""
+    if app.state.executor is not None:
+        shutdown_kernel_pool(app.state.executor)
+        app.state.executor = None
@@ -0,0 +1,98 @@
+import logging
+import threading
+import weakref
+from concurrent.futures import Executor
+from typing import Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+FLUSH_TIMEOUT = 10.0
+
+
+class Autosaver:
+    """Coalesces a burst of notebook changes into a single save.
+
+    The first change after a save starts a timer, and the save happens once the timer fires, however many
+    changes were made in between. A save that fails is retried after the same delay. Saves run on the given
+    executor, and the save function must make sure that they never overlap with changes to the notebook.
+
+    Args:
+        save (Callable[[], None]): Function that saves the notebook.
+        executor (Executor): Executor to run saves on.
+        delay (float): Seconds to wait after a change before saving.
+    """
+
+    def __init__(self, save: Callable[[], None], executor: Executor, delay: float):
+        self.save = save
+        self.executor = executor
+        self.delay = delay
+        self._dirty = False
+        self._timer: Optional[threading.Timer] = None
+        self._lock = threading.Lock()
+        _autosavers.add(self)
+
+    def schedule(self) -> None:
+        """Mark the notebook as changed and start the save timer if it is not already running."""
+        with self._lock:
+            self._dirty = True
+            if self._timer is None:
+                self._timer = threading.Timer(self.delay, self._on_timer)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def flush(self) -> None:
+        """Save now if there are unsaved changes.
+
+        If the save fails then the changes stay unsaved, so that a later flush saves them.
+        """
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            dirty = self._dirty
+            self._dirty = False
+        if not dirty:
+            return
+        try:
+            self.save()
+        except BaseException:
+            with self._lock:
+                self._dirty = True
+            raise
+
+    def flush_on_executor(self) -> None:
+        """Save now if there are unsaved changes, waiting for the executor to be free."""
+        try:
+            self.executor.submit(self.flush).result(timeout=FLUSH_TIMEOUT)
+        except RuntimeError:
+            # The executor has already shut down, so nothing else can be changing the notebook
+            self.flush()
+
+    def _on_timer(self) -> None:
+        with self._lock:
+            self._timer = None
+        try:
+            self.executor.submit(self._flush_or_retry)
+        except RuntimeError:
+            self._flush_or_retry()
+
+    def _flush_or_retry(self) -> None:
+        try:
+            self.flush()
+        # pylint: disable=broad-exception-caught
+        except Exception:
+            logger.exception("Failed to save notebook, retrying in %s seconds", self.delay)
+            self.schedule()
+
+
+_autosavers: "weakref.WeakSet[Autosaver]" = weakref.WeakSet()
+
+
+def flush_all() -> None:
+    """Save every notebook that has unsaved changes."""
+    for autosaver in list(_autosavers):
+        try:
+            autosaver.flush_on_executor()
+        # pylint: disable=broad-exception-caught
+        except Exception:
+            logger.exception("Failed to save notebook")
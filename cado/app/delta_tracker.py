@@ -0,0 +1,97 @@
+from typing import Dict, List, Optional, Set
+from uuid import UUID
+
+from cado.app.message import GetNotebookResponse, NotebookDeltaResponse
+from cado.core.cell import Cell
+from cado.core.evaluation import Evaluation
+from cado.core.execution_plan import ExecutionPlan
+from cado.core.notebook import Notebook
+
+
+class DeltaTracker:
+    """Tracks the notebook state that the client has been sent, so that responses only carry what changed.
+
+    Every response gets the next version number. A client that sees a gap in versions should request the full
+    notebook again. Cell outputs that are still in the output store are not loaded to send them, and a client
+    that needs them should pull the cells.
+    """
+
+    def __init__(self) -> None:
+        self.version = 0
+        self._revisions: Dict[UUID, int] = {}
+        self._cell_ids: List[UUID] = []
+        # Cells that were sent before their outputs were loaded
+        self._deferred_cell_ids: Set[UUID] = set()
+        self._name: Optional[str] = None
+        self._evaluation: Optional[Evaluation] = None
+
+    def full_response(
+        self,
+        notebook: Optional[Notebook],
+        execution_plan: Optional[ExecutionPlan] = None,
+    ) -> GetNotebookResponse:
+        """Create a response with the whole notebook, without loading cell outputs that are not loaded yet.
+
+        Args:
+            notebook (Optional[Notebook]): The current notebook.
+            execution_plan (Optional[ExecutionPlan]): Plan that was run to produce the notebook state.
+
+        Returns:
+            GetNotebookResponse: Response with the whole notebook.
+        """
+        self.version += 1
+        self._observe(notebook)
+        return GetNotebookResponse(notebook=notebook, version=self.version, execution_plan=execution_plan)
+
+    def delta_response(
+        self,
+        notebook: Notebook,
+        execution_plan: Optional[ExecutionPlan] = None,
+    ) -> NotebookDeltaResponse:
+        """Create a response with the changes to the notebook since the last response.
+
+        Args:
+            notebook (Notebook): The current notebook.
+            execution_plan (Optional[ExecutionPlan]): Plan that was run to produce the notebook state.
+
+        Returns:
+            NotebookDeltaResponse: Response with the changed cells and the cells whose outputs were loaded since
+                they were sent, and the cell order, name and evaluation policy if they changed.
+        """
+        self.version += 1
+        cell_ids = [cell.id for cell in notebook.cells]
+        current_ids = set(cell_ids)
+        changed_cells = [cell for cell in notebook.cells if self._is_changed(cell)]
+        for cell in changed_cells:
+            cell.load_outputs()
+        response = NotebookDeltaResponse(
+            version=self.version,
+            name=notebook.name if notebook.name != self._name else None,
+            evaluation=notebook.evaluation if notebook.evaluation != self._evaluation else None,
+            cells=changed_cells,
+            cell_ids=cell_ids if cell_ids != self._cell_ids else None,
+            deleted_cell_ids=[cell_id for cell_id in self._revisions if cell_id not in current_ids],
+            execution_plan=execution_plan,
+        )
+        self._observe(notebook)
+        return response
+
+    def _is_changed(self, cell: Cell) -> bool:
+        if self._revisions.get(cell.id) != cell.revision:
+            return True
+        # Outputs that were loaded after the cell was sent have not been sent yet
+        return cell.id in self._deferred_cell_ids and cell.outputs_loaded
+
+    def _observe(self, notebook: Optional[Notebook]) -> None:
+        if notebook is None:
+            self._revisions = {}
+            self._cell_ids = []
+            self._deferred_cell_ids = set()
+            self._name = None
+            self._evaluation = None
+            return
+        self._revisions = {cell.id: cell.revision for cell in notebook.cells}
+        self._cell_ids = [cell.id for cell in notebook.cells]
+        self._deferred_cell_ids = {cell.id for cell in notebook.cells if not cell.outputs_loaded}
+        self._name = notebook.name
+        self._evaluation = notebook.evaluation
@@ -1,14 +1,21 @@
 import logging
+import time
 from pathlib import Path
 from typing import List
 
 from cado.app.example import load_example_notebook
+from cado.app.metrics import server_metrics
+from cado.app.notebook_registry import notebook_registry
 from cado.app.session_state import SessionState
-from cado.core.notebook import Notebook
+from cado.core.notebook import Notebook, find_shared_output_refs
 from cado.core.notebook_details import NotebookDetails
+from cado.core.notebook_index import NotebookIndex
+from cado.core.output_store import OutputStore
 
 logger = logging.getLogger(__name__)
 
+notebook_index = NotebookIndex()
+
 
 def save_notebook(session_state: SessionState) -> None:
     """Save the current session notebook to the disk.
@@ -16,6 +23,10 @@ def save_notebook(session_state: SessionState) -> None:
     Args:
         session_state (SessionState): Current session state.
     """
+    if session_state.shared_notebook is not None:
+        session_state.shared_notebook.save()
+        return
+
     notebook = session_state.notebook
     if notebook is None:
         logger.debug("Not saving notebook to file, notebook was None")
@@ -28,7 +39,31 @@ def save_notebook(session_state: SessionState) -> None:
 
     notebook.set_updated_time()
     logger.debug("Saving notebook to file: %s", filepath)
+    start_time = time.perf_counter()
     notebook.to_filepath(filepath)
+    server_metrics.observe_save(time.perf_counter() - start_time)
+
+
+def schedule_save(session_state: SessionState) -> None:
+    """Save the current session notebook, coalescing with other recent changes if the session has an autosaver.
+
+    Args:
+        session_state (SessionState): Current session state.
+    """
+    if session_state.autosaver is None:
+        save_notebook(session_state)
+    else:
+        session_state.autosaver.schedule()
+
+
+def flush_save(session_state: SessionState) -> None:
+    """Write any unsaved changes to the current session notebook to disk.
+
+    Args:
+        session_state (SessionState): Current session state.
+    """
+    if session_state.autosaver is not None:
+        session_state.autosaver.flush()
 
 
 def create_notebook(session_state: SessionState) -> None:
@@ -45,8 +80,7 @@ def create_notebook(session_state: SessionState) -> None:
     notebook = Notebook(name=name)
     notebook.add_cell()
     notebook.to_filepath(filepath)
-    session_state.filepath = filepath
-    session_state.notebook = notebook
+    notebook_registry.join(session_state, filepath, notebook=notebook)
 
 
 def get_unique_notebook_name(name: str, dirpath: Path) -> str:
@@ -69,12 +103,22 @@ def get_unique_notebook_name(name: str, dirpath: Path) -> str:
 
 
 def delete_existing_notebook(filepath: Path) -> None:
-    """Delete a notebook from the disk.
+    """Delete a notebook and its saved outputs from the disk.
 
     Args:
         filepath (Path): Path on disk to the notebook.
     """
+    details = notebook_index.get(filepath)
+    output_store = OutputStore.for_notebook(filepath, details.id)
+    # Copies of the notebook file share its output store, and keep the outputs they refer to
+    shared_refs = find_shared_output_refs(filepath, details.id)
+    if len(shared_refs) > 0:
+        output_store.prune(shared_refs)
+    else:
+        output_store.delete()
     filepath.unlink()
+    notebook_index.remove(filepath)
+    notebook_registry.discard(filepath)
 
 
 def rename_notebook(session_state: SessionState, notebook: Notebook, name: str) -> None:
@@ -98,9 +142,13 @@ def rename_notebook(session_state: SessionState, notebook: Notebook, name: str)
     new_name = get_unique_notebook_name(name, dirpath)
     new_filepath = dirpath / f"{new_name}.cado"
 
-    session_state.filepath = new_filepath
+    if session_state.shared_notebook is not None:
+        notebook_registry.move(session_state.shared_notebook, new_filepath)
+    else:
+        session_state.filepath = new_filepath
     save_notebook(session_state)
-    delete_existing_notebook(old_filepath)
+    # The output store is keyed by notebook ID, so it is shared with the renamed file and must be kept
+    old_filepath.unlink()
 
 
 def list_local_notebooks() -> List[NotebookDetails]:
@@ -109,18 +157,14 @@ def list_local_notebooks() -> List[NotebookDetails]:
     Returns:
         List[NotebookDetails]: A list of NotebookDetail objects.
     """
-    details = []
     cwd = Path.cwd()
-    for path in cwd.iterdir():
-        if path.is_file():
-            if str(path).endswith(".cado"):
-                details.append(NotebookDetails.from_filepath(path))
+    details = notebook_index.list_notebooks(cwd)
 
     if len(details) == 0:
         filename = "example.cado"
         filepath = cwd / filename
         notebook = load_example_notebook(filename)
         notebook.to_filepath(filepath)
-        details.append(NotebookDetails.from_filepath(filepath))
+        details.append(notebook_index.get(filepath))
 
     return details
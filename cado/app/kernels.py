@@ -0,0 +1,49 @@
+import logging
+from typing import List
+
+from cado.app.session_state import SessionState
+from cado.core.kernel_pool import preload_modules, warm_kernels
+
+logger = logging.getLogger(__name__)
+
+
+def preload_notebook_modules(session_state: SessionState) -> None:
+    """Import the modules the current session notebook asks to preload, in the server and in the worker pool.
+
+    Importing a module runs its code, so only modules that the server allows are preloaded, and a notebook file
+    can't make the server run anything else before the user runs a cell. The workers import the modules in the
+    background, ahead of any cells that are run afterwards.
+
+    Args:
+        session_state (SessionState): Current session state.
+    """
+    notebook = session_state.notebook
+    if notebook is None or len(notebook.preload) == 0:
+        return
+
+    settings = session_state.settings
+    allowed = [*settings.allow_preload, *settings.preload]
+    modules = [module for module in notebook.preload if is_preload_allowed(module, allowed)]
+    if len(modules) < len(notebook.preload):
+        logger.warning("Not preloading modules for notebook %s that are not allowed: %s", notebook.name,
+                       [module for module in notebook.preload if module not in modules])
+    if len(modules) == 0:
+        return
+
+    logger.debug("Preloading modules for notebook %s: %s", notebook.name, modules)
+    preload_modules(modules)
+    if session_state.executor is not None:
+        warm_kernels(session_state.executor, settings.workers, modules)
+
+
+def is_preload_allowed(module: str, allowed: List[str]) -> bool:
+    """Check whether a module may be preloaded.
+
+    Args:
+        module (str): Name of the module.
+        allowed (List[str]): Names of the allowed modules, whose submodules are allowed too.
+
+    Returns:
+        bool: Whether the module may be preloaded.
+    """
+    return any(module == name or module.startswith(f"{name}.") for name in allowed)
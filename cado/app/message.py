@@ -1,11 +1,13 @@
 from enum import Enum
 from pathlib import Path
-from typing import List, Optional
+from typing import Any, Dict, List, Optional
 from uuid import UUID
 
 from pydantic import BaseModel
 
 from cado.core.cell import Cell
+from cado.core.evaluation import Evaluation
+from cado.core.execution_plan import ExecutionPlan
 from cado.core.language import Language
 from cado.core.notebook import Notebook
 from cado.core.notebook_details import NotebookDetails
@@ -19,6 +21,8 @@ class MessageType(Enum):
     UPDATE_CELL_INPUT_NAMES = "update-cell-input-names"
     UPDATE_CELL_LANGUAGE = "update-cell-language"
     RUN_CELL = "run-cell"
+    PLAN_CELL = "plan-cell"
+    CANCEL_CELL = "cancel-cell"
     CLEAR_CELL = "clear-cell"
     NEW_CELL = "new-cell"
     DELETE_CELL = "delete-cell"
@@ -29,12 +33,18 @@ class MessageType(Enum):
     OPEN_NOTEBOOK = "open-notebook"
     EXIT_NOTEBOOK = "exit-notebook"
     UPDATE_NOTEBOOK_NAME = "update-notebook-name"
+    UPDATE_NOTEBOOK_EVALUATION = "update-notebook-evaluation"
+    PULL_CELLS = "pull-cells"
+    BATCH = "batch"
 
     # subscribe
     GET_NOTEBOOK_RESPONSE = "get-notebook-response"
     GET_CELL_RESPONSE = "get-cell-response"
     ERROR_RESPONSE = "error-response"
     LIST_NOTEBOOKS_RESPONSE = "list-notebooks-response"
+    EXECUTION_PLAN_RESPONSE = "execution-plan-response"
+    CELL_OUTPUT_RESPONSE = "cell-output-response"
+    NOTEBOOK_DELTA_RESPONSE = "notebook-delta-response"
 
     @classmethod
     def from_str(cls, message_name: str) -> 'MessageType':
@@ -49,10 +59,10 @@ class MessageType(Enum):
         Returns:
             MessageType: The parsed MessageType.
         """
-        for _, enum_value in cls.__members__.items():
-            if enum_value.value == message_name:
-                return enum_value
-        raise ValueError(f"Unknown message type '{message_name}'")
+        try:
+            return cls(message_name)
+        except ValueError as exc:
+            raise ValueError(f"Unknown message type '{message_name}'") from exc
 
 
 class Message(BaseModel):
@@ -95,6 +105,16 @@ class RunCell(Message):
     type: MessageType = MessageType.RUN_CELL
 
 
+class PlanCell(Message):
+    cell_id: UUID
+    type: MessageType = MessageType.PLAN_CELL
+
+
+class CancelCell(Message):
+    cell_id: UUID
+    type: MessageType = MessageType.CANCEL_CELL
+
+
 class ClearCell(Message):
     cell_id: UUID
     type: MessageType = MessageType.CLEAR_CELL
@@ -142,6 +162,24 @@ class UpdateNotebookName(Message):
     type: MessageType = MessageType.UPDATE_NOTEBOOK_NAME
 
 
+class UpdateNotebookEvaluation(Message):
+    evaluation: Evaluation
+    type: MessageType = MessageType.UPDATE_NOTEBOOK_EVALUATION
+
+
+class PullCells(Message):
+    # Cells whose outputs the client needs, like cells scrolled into view whose outputs were not loaded yet or are
+    # out of date in a lazy notebook
+    cell_ids: List[UUID]
+    type: MessageType = MessageType.PULL_CELLS
+
+
+class Batch(Message):
+    # Raw messages for operations on the open notebook, applied in order with a single save and response
+    messages: List[Dict[str, Any]]
+    type: MessageType = MessageType.BATCH
+
+
 # endregion: publish
 
 # region: subscribe
@@ -149,9 +187,22 @@ class UpdateNotebookName(Message):
 
 class GetNotebookResponse(Message):
     notebook: Optional[Notebook]
+    version: int = 0
+    execution_plan: Optional[ExecutionPlan] = None
     type: MessageType = MessageType.GET_NOTEBOOK_RESPONSE
 
 
+class NotebookDeltaResponse(Message):
+    version: int
+    name: Optional[str] = None
+    evaluation: Optional[Evaluation] = None
+    cells: List[Cell] = []
+    cell_ids: Optional[List[UUID]] = None
+    deleted_cell_ids: List[UUID] = []
+    execution_plan: Optional[ExecutionPlan] = None
+    type: MessageType = MessageType.NOTEBOOK_DELTA_RESPONSE
+
+
 class GetCellResponse(Message):
     cell: Cell
     type: MessageType = MessageType.GET_CELL_RESPONSE
@@ -159,6 +210,8 @@ class GetCellResponse(Message):
 
 class ErrorResponse(Message):
     error: str
+    # Cells the error is about, like the cells in a dependency cycle
+    cell_ids: List[UUID] = []
     type: MessageType = MessageType.ERROR_RESPONSE
 
 
@@ -167,4 +220,17 @@ class ListNotebooksResponse(Message):
     type: MessageType = MessageType.LIST_NOTEBOOKS_RESPONSE
 
 
+class ExecutionPlanResponse(Message):
+    execution_plan: ExecutionPlan
+    type: MessageType = MessageType.EXECUTION_PLAN_RESPONSE
+
+
+class CellOutputResponse(Message):
+    cell_id: UUID
+    stream: str
+    text: str
+    reset: bool = False
+    type: MessageType = MessageType.CELL_OUTPUT_RESPONSE
+
+
 # endregion: subscribe
@@ -0,0 +1,142 @@
+import asyncio
+import logging
+import threading
+from dataclasses import dataclass
+from typing import Dict, List
+
+logger = logging.getLogger(__name__)
+
+EVENT_LOOP_LAG_INTERVAL = 0.5
+
+
+@dataclass
+class Summary:
+    count: int = 0
+    total: float = 0.0
+
+
+class ServerMetrics:
+    """Aggregate metrics for the server, rendered in the Prometheus text exposition format."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._message_latency: Dict[str, Summary] = {}
+        self._save_duration = Summary()
+        self._active_sessions = 0
+        self._event_loop_lag = 0.0
+        self._notebook_cache: Dict[str, int] = {"hits": 0, "misses": 0, "evictions": 0}
+        self._notebook_cache_bytes = 0
+
+    def observe_message(self, message_type: str, seconds: float) -> None:
+        """Record the time taken to process a client message.
+
+        Args:
+            message_type (str): Type of the message.
+            seconds (float): Seconds from taking the message off the queue to having the response.
+        """
+        with self._lock:
+            summary = self._message_latency.setdefault(message_type, Summary())
+            summary.count += 1
+            summary.total += seconds
+
+    def observe_save(self, seconds: float) -> None:
+        """Record the time taken to save a notebook.
+
+        Args:
+            seconds (float): Seconds the save took.
+        """
+        with self._lock:
+            self._save_duration.count += 1
+            self._save_duration.total += seconds
+
+    def add_sessions(self, count: int) -> None:
+        """Change the number of active sessions.
+
+        Args:
+            count (int): Number of sessions that started, or negative for sessions that ended.
+        """
+        with self._lock:
+            self._active_sessions += count
+
+    def set_event_loop_lag(self, seconds: float) -> None:
+        """Record how late the event loop last woke up a sleeping task.
+
+        Args:
+            seconds (float): Seconds of lag.
+        """
+        with self._lock:
+            self._event_loop_lag = seconds
+
+    def count_notebook_cache(self, event: str) -> None:
+        """Count a lookup or eviction in the cache of open notebooks.
+
+        Args:
+            event (str): One of "hits", "misses" or "evictions".
+        """
+        with self._lock:
+            self._notebook_cache[event] += 1
+
+    def set_notebook_cache_bytes(self, size: int) -> None:
+        """Record the estimated memory used by closed notebooks in the cache.
+
+        Args:
+            size (int): Estimated size in bytes.
+        """
+        with self._lock:
+            self._notebook_cache_bytes = size
+
+    def render(self) -> str:
+        """Render the metrics in the Prometheus text exposition format.
+
+        Returns:
+            str: The metrics.
+        """
+        with self._lock:
+            lines: List[str] = [
+                "# HELP cado_message_latency_seconds Time to process a client message, by message type.",
+                "# TYPE cado_message_latency_seconds summary",
+            ]
+            for message_type, summary in sorted(self._message_latency.items()):
+                labels = f'{{type="{message_type}"}}'
+                lines.append(f"cado_message_latency_seconds_count{labels} {summary.count}")
+                lines.append(f"cado_message_latency_seconds_sum{labels} {summary.total}")
+            lines += [
+                "# HELP cado_save_duration_seconds Time to save a notebook to disk.",
+                "# TYPE cado_save_duration_seconds summary",
+                f"cado_save_duration_seconds_count {self._save_duration.count}",
+                f"cado_save_duration_seconds_sum {self._save_duration.total}",
+                "# HELP cado_active_sessions Number of connected websocket sessions.",
+                "# TYPE cado_active_sessions gauge",
+                f"cado_active_sessions {self._active_sessions}",
+                "# HELP cado_event_loop_lag_seconds How late the event loop last woke up a sleeping task.",
+                "# TYPE cado_event_loop_lag_seconds gauge",
+                f"cado_event_loop_lag_seconds {self._event_loop_lag}",
+            ]
+            for event, count in self._notebook_cache.items():
+                lines += [
+                    f"# HELP cado_notebook_cache_{event}_total Notebook cache {event}.",
+                    f"# TYPE cado_notebook_cache_{event}_total counter",
+                    f"cado_notebook_cache_{event}_total {count}",
+                ]
+            lines += [
+                "# HELP cado_notebook_cache_bytes Estimated memory used by closed notebooks kept in memory.",
+                "# TYPE cado_notebook_cache_bytes gauge",
+                f"cado_notebook_cache_bytes {self._notebook_cache_bytes}",
+            ]
+        return "\n".join(lines) + "\n"
+
+
+server_metrics = ServerMetrics()
+
+
+async def monitor_event_loop_lag(interval: float = EVENT_LOOP_LAG_INTERVAL) -> None:
+    """Measure event loop lag until cancelled, by checking how late a sleep of a known length wakes up.
+
+    Args:
+        interval (float): Seconds to sleep between measurements.
+    """
+    loop = asyncio.get_running_loop()
+    while True:
+        start_time = loop.time()
+        await asyncio.sleep(interval)
+        server_metrics.set_event_loop_lag(max(0.0, loop.time() - start_time - interval))
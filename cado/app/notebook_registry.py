@@ -0,0 +1,281 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
+from uuid import UUID
+
+from cado.app.autosave import Autosaver
+from cado.app.metrics import server_metrics
+from cado.core.cancel_token import CancelToken
+from cado.core.notebook import Notebook
+
+if TYPE_CHECKING:
+    from cado.app.session_state import SessionState
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_BYTES = 256 * 1024 * 1024
+
+
+class SharedNotebook:
+    """A notebook that is open in one or more sessions.
+
+    Sessions share the notebook instance, its runs and its saves. Changes must be made while holding the lock,
+    and each session is notified when another session changes the notebook.
+
+    Args:
+        notebook (Notebook): The notebook.
+        filepath (Path): Filepath the notebook is saved to.
+    """
+
+    def __init__(self, notebook: Notebook, filepath: Path):
+        self.notebook = notebook
+        self.filepath = filepath
+        self.lock = threading.RLock()
+        self.cancel_token = CancelToken()
+        self.autosaver: Optional[Autosaver] = None
+        self.subscribers: List["SessionState"] = []
+
+    def save(self) -> None:
+        """Save the notebook to disk."""
+        with self.lock:
+            self.notebook.set_updated_time()
+            logger.debug("Saving notebook to file: %s", self.filepath)
+            start_time = time.perf_counter()
+            self.notebook.to_filepath(self.filepath)
+            server_metrics.observe_save(time.perf_counter() - start_time)
+
+    def broadcast_output(self, cell_id: UUID, stream: str, text: str) -> None:
+        """Stream cell output to every session.
+
+        Args:
+            cell_id (UUID): ID of the running cell.
+            stream (str): Stream name, "stdout" or "stderr".
+            text (str): Text the cell wrote.
+        """
+        for subscriber in list(self.subscribers):
+            if subscriber.on_output is not None:
+                subscriber.on_output(cell_id, stream, text)
+
+    def reset_output(self) -> None:
+        """Start streaming the output of a new run to every session."""
+        for subscriber in list(self.subscribers):
+            if subscriber.on_output_reset is not None:
+                subscriber.on_output_reset()
+
+    def notify_changed(self, source: "SessionState") -> None:
+        """Tell every session except the one that made a change that the notebook changed.
+
+        Args:
+            source (SessionState): Session that changed the notebook.
+        """
+        for subscriber in list(self.subscribers):
+            if subscriber is not source and subscriber.on_notebook_changed is not None:
+                subscriber.on_notebook_changed()
+
+
+@dataclass
+class CachedNotebook:
+    shared: SharedNotebook
+    size: int
+    # Modification time and size of the file when the notebook was cached, to detect changes made outside cado
+    file_key: Tuple[int, int]
+
+
+# pylint: disable=too-many-instance-attributes
+class NotebookRegistry:
+    """Notebooks open on the server keyed by filepath, so that sessions opening the same file share one notebook.
+
+    Notebooks that no session has open anymore are kept in memory with their outputs, least recently used first,
+    until their estimated size goes over the cache budget. They are saved before they are cached.
+
+    Args:
+        max_bytes (int): Size budget for closed notebooks kept in memory.
+    """
+
+    def __init__(self, max_bytes: int = DEFAULT_CACHE_BYTES) -> None:
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._notebooks: Dict[Path, SharedNotebook] = {}
+        self._cache: "OrderedDict[Path, CachedNotebook]" = OrderedDict()
+        self._cache_bytes = 0
+        self._lock = threading.Lock()
+        # Saves for shared notebooks run here, holding the notebook's lock
+        self._save_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="cado-save")
+
+    def join(self, session_state: "SessionState", filepath: Path, notebook: Optional[Notebook] = None) -> None:
+        """Open a notebook in a session, sharing it with any other session that has it open.
+
+        Args:
+            session_state (SessionState): Session opening the notebook. It leaves its current notebook first.
+            filepath (Path): Filepath of the notebook.
+            notebook (Optional[Notebook]): The notebook, if it was just created, otherwise it is loaded from disk.
+        """
+        self.leave(session_state)
+        key = filepath.resolve()
+        with self._lock:
+            shared = self._notebooks.get(key) or self._take_cached(key)
+            if shared is not None:
+                self._subscribe(key, shared, session_state)
+            elif notebook is None:
+                self._count("misses")
+
+        if shared is None:
+            # Loading a large notebook takes a while, so it happens outside the lock to not hold up other sessions
+            loaded = notebook or Notebook.from_filepath(filepath)
+            with self._lock:
+                # Another session may have opened the notebook meanwhile
+                shared = self._notebooks.get(key) or self._take_cached(key)
+                if shared is None:
+                    shared = SharedNotebook(loaded, filepath)
+                    if session_state.settings.save_delay > 0:
+                        shared.autosaver = Autosaver(shared.save, self._save_executor,
+                                                     session_state.settings.save_delay)
+                self._subscribe(key, shared, session_state)
+
+        logger.debug("Session joined notebook %s with %d sessions", filepath, len(shared.subscribers))
+        session_state.shared_notebook = shared
+        session_state.notebook = shared.notebook
+        session_state.filepath = shared.filepath
+        session_state.cancel_token = shared.cancel_token
+        session_state.autosaver = shared.autosaver
+
+    def leave(self, session_state: "SessionState") -> None:
+        """Close the notebook open in a session.
+
+        The last session to leave saves the notebook, which is then kept in the cache of closed notebooks.
+
+        Args:
+            session_state (SessionState): Session closing its notebook.
+        """
+        shared = session_state.shared_notebook
+        if shared is None:
+            return
+
+        with self._lock:
+            shared.subscribers.remove(session_state)
+            last = len(shared.subscribers) == 0
+
+        session_state.shared_notebook = None
+        session_state.notebook = None
+        session_state.filepath = None
+        session_state.cancel_token = CancelToken()
+        session_state.autosaver = None
+        if not last:
+            return
+
+        # The notebook stays registered while saving, so that a session opening it meanwhile shares it
+        if shared.autosaver is not None:
+            shared.autosaver.flush()
+        with self._lock:
+            if len(shared.subscribers) > 0:
+                return
+            key = shared.filepath.resolve()
+            if self._notebooks.get(key) is shared:
+                del self._notebooks[key]
+            evicted = self._put_cached(key, shared)
+        for cached in evicted:
+            self._flush(cached)
+
+    def discard(self, filepath: Path) -> None:
+        """Drop a closed notebook from the cache without saving it, for when its file is deleted.
+
+        Args:
+            filepath (Path): Filepath of the notebook.
+        """
+        with self._lock:
+            cached = self._cache.pop(filepath.resolve(), None)
+            if cached is not None:
+                self._set_cache_bytes(self._cache_bytes - cached.size)
+
+    def _subscribe(self, key: Path, shared: SharedNotebook, session_state: "SessionState") -> None:
+        self._notebooks[key] = shared
+        shared.subscribers.append(session_state)
+
+    def _take_cached(self, key: Path) -> Optional[SharedNotebook]:
+        cached = self._cache.pop(key, None)
+        if cached is None:
+            return None
+        self._set_cache_bytes(self._cache_bytes - cached.size)
+        if _get_file_key(key) != cached.file_key:
+            logger.debug("Notebook %s changed on disk since it was cached", key)
+            return None
+        self._count("hits")
+        return cached.shared
+
+    def _put_cached(self, key: Path, shared: SharedNotebook) -> List[CachedNotebook]:
+        file_key = _get_file_key(key)
+        if file_key is None or self.max_bytes <= 0:
+            return []
+        # Results kept aside for cleared cells only pay off while the notebook is being edited
+        shared.notebook.discard_previous_results()
+        cached = CachedNotebook(shared=shared, size=shared.notebook.estimate_size(), file_key=file_key)
+        previous = self._cache.pop(key, None)
+        cache_bytes = self._cache_bytes - (0 if previous is None else previous.size)
+        self._cache[key] = cached
+        cache_bytes += cached.size
+
+        evicted = []
+        while cache_bytes > self.max_bytes and len(self._cache) > 0:
+            _, oldest = self._cache.popitem(last=False)
+            cache_bytes -= oldest.size
+            evicted.append(oldest)
+            self._count("evictions")
+        self._set_cache_bytes(cache_bytes)
+        return evicted
+
+    def _flush(self, cached: CachedNotebook) -> None:
+        logger.debug("Evicting notebook %s from the cache", cached.shared.filepath)
+        if cached.shared.autosaver is not None:
+            cached.shared.autosaver.flush()
+
+    def _count(self, event: str) -> None:
+        setattr(self, event, getattr(self, event) + 1)
+        server_metrics.count_notebook_cache(event)
+
+    def _set_cache_bytes(self, size: int) -> None:
+        self._cache_bytes = size
+        server_metrics.set_notebook_cache_bytes(size)
+
+    def move(self, shared: SharedNotebook, filepath: Path) -> None:
+        """Change the filepath of a shared notebook, for every session that has it open.
+
+        Args:
+            shared (SharedNotebook): The shared notebook.
+            filepath (Path): New filepath of the notebook.
+        """
+        with self._lock:
+            self._notebooks.pop(shared.filepath.resolve(), None)
+            shared.filepath = filepath
+            self._notebooks[filepath.resolve()] = shared
+            for subscriber in shared.subscribers:
+                subscriber.filepath = filepath
+
+    def get(self, filepath: Path) -> Optional[SharedNotebook]:
+        """Get the shared notebook for a filepath, if any session has it open.
+
+        Args:
+            filepath (Path): Filepath of the notebook.
+
+        Returns:
+            Optional[SharedNotebook]: The shared notebook.
+        """
+        with self._lock:
+            return self._notebooks.get(filepath.resolve())
+
+
+def _get_file_key(filepath: Path) -> Optional[Tuple[int, int]]:
+    try:
+        stat = filepath.stat()
+    except FileNotFoundError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+notebook_registry = NotebookRegistry()
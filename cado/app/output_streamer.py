@@ -0,0 +1,87 @@
+import asyncio
+import threading
+from typing import Awaitable, Callable, Dict, Set, Tuple
+from uuid import UUID
+
+from cado.app.message import CellOutputResponse, Message
+from cado.core.output_buffer import OutputBuffer
+
+DEFAULT_INTERVAL = 0.1
+MAX_CHUNK_HEAD_CHARS = 10_000
+MAX_CHUNK_TAIL_CHARS = 10_000
+
+
+# pylint: disable=too-many-instance-attributes
+class OutputStreamer:
+    """Sends cell output to the client while cells run.
+
+    Output is written from the thread running the cells and is coalesced into at most one chunk per cell and
+    stream per interval, which is then sent from the event loop. Each pending chunk is bounded, so a cell that
+    prints in a tight loop only sends the head and tail of what it printed during the interval.
+
+    Args:
+        loop (asyncio.AbstractEventLoop): Event loop that owns the websocket.
+        send (Callable[[Message], Awaitable[None]]): Coroutine function that sends a message to the client.
+        interval (float): Seconds to wait after new output before sending it.
+    """
+
+    def __init__(
+        self,
+        loop: asyncio.AbstractEventLoop,
+        send: Callable[[Message], Awaitable[None]],
+        interval: float = DEFAULT_INTERVAL,
+    ):
+        self.loop = loop
+        self.send = send
+        self.interval = interval
+        self._pending: Dict[Tuple[UUID, str], OutputBuffer] = {}
+        self._sent: Set[Tuple[UUID, str]] = set()
+        self._scheduled = False
+        self._lock = threading.Lock()
+        self._send_lock = asyncio.Lock()
+
+    def write(self, cell_id: UUID, stream: str, text: str) -> None:
+        """Queue cell output to be sent. Safe to call from any thread.
+
+        Args:
+            cell_id (UUID): ID of the cell that wrote the output.
+            stream (str): Name of the stream, "stdout" or "stderr".
+            text (str): Text that was written.
+        """
+        with self._lock:
+            key = (cell_id, stream)
+            if key not in self._pending:
+                self._pending[key] = OutputBuffer(
+                    max_head_chars=MAX_CHUNK_HEAD_CHARS,
+                    max_tail_chars=MAX_CHUNK_TAIL_CHARS,
+                )
+            self._pending[key].write(text)
+            if self._scheduled:
+                return
+            self._scheduled = True
+        self.loop.call_soon_threadsafe(self.loop.call_later, self.interval, self._flush_later)
+
+    def reset(self) -> None:
+        """Start a new run, so that the next chunk for each cell replaces the output shown by the client."""
+        with self._lock:
+            self._sent.clear()
+
+    async def flush(self) -> None:
+        """Send all pending output."""
+        async with self._send_lock:
+            with self._lock:
+                pending = self._pending
+                self._pending = {}
+                self._scheduled = False
+            for (cell_id, stream), buffer in pending.items():
+                reset = (cell_id, stream) not in self._sent
+                self._sent.add((cell_id, stream))
+                await self.send(CellOutputResponse(
+                    cell_id=cell_id,
+                    stream=stream,
+                    text=buffer.getvalue(),
+                    reset=reset,
+                ))
+
+    def _flush_later(self) -> None:
+        asyncio.ensure_future(self.flush())
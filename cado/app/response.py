@@ -1,22 +1,84 @@
+import contextlib
 import logging
-from typing import Any
-from cado.app.disk import (create_notebook, delete_existing_notebook, list_local_notebooks, rename_notebook,
-                           save_notebook)
-
-from cado.app.message import (ClearCell, DeleteCell, DeleteNotebook, ErrorResponse, ExitNotebook, GetNotebook,
-                              GetNotebookResponse, ListNotebooks, ListNotebooksResponse, Message, MessageType, NewCell,
-                              NewNotebook, OpenNotebook, ReorderCells, RunCell, UpdateCellCode, UpdateCellInputNames,
-                              UpdateCellLanguage, UpdateCellOutputName, UpdateNotebookName)
+from dataclasses import dataclass, field
+from typing import Any, Callable, ContextManager, Dict, Hashable, List, Optional, Type
+from uuid import UUID
+
+from cado.app.disk import (create_notebook, delete_existing_notebook, flush_save, list_local_notebooks,
+                           rename_notebook, schedule_save)
+from cado.app.kernels import preload_notebook_modules
+from cado.app.message import (Batch, ClearCell, DeleteCell, DeleteNotebook, ErrorResponse, ExecutionPlanResponse,
+                              ExitNotebook, GetNotebook, ListNotebooks, ListNotebooksResponse, Message, MessageType,
+                              NewCell, NewNotebook, OpenNotebook, PlanCell, PullCells, ReorderCells, RunCell,
+                              UpdateCellCode, UpdateCellInputNames, UpdateCellLanguage, UpdateCellOutputName,
+                              UpdateNotebookEvaluation, UpdateNotebookName)
+from cado.app.notebook_registry import notebook_registry
+from cado.app.serialization import encode_message
 from cado.app.session_state import SessionState
+from cado.core.execution_plan import ExecutionPlan
 from cado.core.notebook import Notebook
 
 logger = logging.getLogger(__name__)
 
 
-# pylint: disable=too-many-locals
-# pylint: disable=too-many-return-statements
-# pylint: disable=too-many-branches
-# pylint: disable=too-many-statements
+@dataclass
+class MessageContext:
+    session_state: SessionState
+    # Cells to run, and cells to bring up to date, in a single pass once every operation has been applied
+    run_cell_ids: List[UUID] = field(default_factory=list)
+    pull_cell_ids: List[UUID] = field(default_factory=list)
+    # Whether the notebook's file should be renamed to match its name, once every operation has been applied
+    rename: bool = False
+    full_response: bool = False
+
+    @property
+    def notebook(self) -> Notebook:
+        """The open notebook, which handlers that need a notebook can rely on."""
+        notebook = self.session_state.notebook
+        if notebook is None:
+            raise ValueError("No active notebook")
+        return notebook
+
+
+Handle = Callable[[Any, MessageContext], Optional[Message]]
+
+
+@dataclass
+class MessageHandler:
+    model: Type[Message]
+    # Returns a response for the client, or None to respond with the changes to the notebook
+    handle: Handle
+    needs_notebook: bool
+    # Whether the operation only changes the open notebook, so that it can be part of a batch
+    batchable: bool
+
+
+MESSAGE_HANDLERS: Dict[MessageType, MessageHandler] = {}
+
+
+def message_handler(
+    message_type: MessageType,
+    model: Type[Message],
+    needs_notebook: bool = True,
+    batchable: bool = False,
+) -> Callable[[Handle], Handle]:
+    """Register a function as the handler for a type of request message.
+
+    Args:
+        message_type (MessageType): Type of request message.
+        model (Type[Message]): Model the raw message is parsed into before it is passed to the handler.
+        needs_notebook (bool): Whether the message can only be handled with a notebook open.
+        batchable (bool): Whether the message can be part of a batch.
+
+    Returns:
+        Callable[[Handle], Handle]: Decorator that registers the handler.
+    """
+    def register(handle: Handle) -> Handle:
+        MESSAGE_HANDLERS[message_type] = MessageHandler(model, handle, needs_notebook, batchable)
+        return handle
+    return register
+
+
 def process_message(
     message_type: MessageType,
     message_json: Any,
@@ -30,88 +92,231 @@ def process_message(
         session_state (SessionState): Current session state.
 
     Returns:
-        Message: A response message.
+        Message: A response message. Changes to the open notebook are sent as a delta, and the whole notebook is
+            sent when it is requested or when a different notebook is opened. The changes are not saved here, see
+            handle_message.
     """
+    handler = MESSAGE_HANDLERS.get(message_type)
+    if handler is None:
+        logger.error("Request type did not match any known message types")
+        return ErrorResponse(error=f"Unknown message type from client: {message_type}")
     notebook = session_state.notebook
+    if handler.needs_notebook and notebook is None:
+        return ErrorResponse(error=f"Can't process {message_type}, no active notebook")
 
-    if message_type == MessageType.GET_NOTEBOOK:
-        GetNotebook.parse_obj(message_json)
-    elif message_type == MessageType.UPDATE_CELL_CODE:
-        if notebook is None:
-            return ErrorResponse(error=f"Can't process {message_type}, no active notebook")
-        update_cell_code = UpdateCellCode.parse_obj(message_json)
-        notebook.set_cell_code(update_cell_code.cell_id, update_cell_code.code)
-    elif message_type == MessageType.UPDATE_CELL_OUTPUT_NAME:
-        if notebook is None:
-            return ErrorResponse(error=f"Can't process {message_type}, no active notebook")
-        update_cell_output_name = UpdateCellOutputName.parse_obj(message_json)
-        notebook.update_cell_output_name(update_cell_output_name.cell_id, update_cell_output_name.output_name)
-    elif message_type == MessageType.RUN_CELL:
-        if notebook is None:
-            return ErrorResponse(error=f"Can't process {message_type}, no active notebook")
-        run_cell = RunCell.parse_obj(message_json)
-        notebook.run_cell(run_cell.cell_id)
-    elif message_type == MessageType.CLEAR_CELL:
-        if notebook is None:
-            return ErrorResponse(error=f"Can't process {message_type}, no active notebook")
-        clear_cell = ClearCell.parse_obj(message_json)
-        notebook.clear_cell(clear_cell.cell_id)
-    elif message_type == MessageType.NEW_CELL:
-        if notebook is None:
-            return ErrorResponse(error=f"Can't process {message_type}, no active notebook")
-        new_cell = NewCell.parse_obj(message_json)
-        notebook.add_cell(index=new_cell.index)
-    elif message_type == MessageType.DELETE_CELL:
-        if notebook is None:
-            return ErrorResponse(error=f"Can't process {message_type}, no active notebook")
-        delete_cell = DeleteCell.parse_obj(message_json)
-        notebook.delete_cell(delete_cell.cell_id)
-    elif message_type == MessageType.UPDATE_CELL_INPUT_NAMES:
-        if notebook is None:
-            return ErrorResponse(error=f"Can't process {message_type}, no active notebook")
-        update_cell_input_names = UpdateCellInputNames.parse_obj(message_json)
-        notebook.update_cell_input_names(update_cell_input_names.cell_id, update_cell_input_names.input_names)
-    elif message_type == MessageType.UPDATE_CELL_LANGUAGE:
-        if notebook is None:
-            return ErrorResponse(error=f"Can't process {message_type}, no active notebook")
-        update_cell_language = UpdateCellLanguage.parse_obj(message_json)
-        notebook.update_cell_language(update_cell_language.cell_id, update_cell_language.language)
-    elif message_type == MessageType.REORDER_CELLS:
-        if notebook is None:
-            return ErrorResponse(error=f"Can't process {message_type}, no active notebook")
-        reorder_cells = ReorderCells.parse_obj(message_json)
-        notebook.reorder_cells(reorder_cells.cell_ids)
-    elif message_type == MessageType.LIST_NOTEBOOKS:
-        ListNotebooks.parse_obj(message_json)
-        details = list_local_notebooks()
-        return ListNotebooksResponse(notebook_details=details)
-    elif message_type == MessageType.OPEN_NOTEBOOK:
-        open_notebook = OpenNotebook.parse_obj(message_json)
-        session_state.notebook = Notebook.from_filepath(open_notebook.filepath)
-        session_state.filepath = open_notebook.filepath
-    elif message_type == MessageType.EXIT_NOTEBOOK:
-        if notebook is None:
-            return ErrorResponse(error=f"Can't process {message_type}, no active notebook")
-        ExitNotebook.parse_obj(message_json)
-        session_state.notebook = None
-        session_state.filepath = None
-    elif message_type == MessageType.UPDATE_NOTEBOOK_NAME:
+    context = MessageContext(session_state)
+    response = handler.handle(handler.model.parse_obj(message_json), context)
+    if response is not None:
+        return response
+
+    if context.rename:
+        rename_notebook(session_state, context.notebook, context.notebook.name)
+
+    execution_plan: Optional[ExecutionPlan] = None
+    if len(context.run_cell_ids) > 0 or len(context.pull_cell_ids) > 0:
+        execution_plan = _run_cells(context)
+
+    delta_tracker = session_state.delta_tracker
+    current_notebook = session_state.notebook
+    if context.full_response or current_notebook is None or current_notebook is not notebook:
+        return delta_tracker.full_response(current_notebook, execution_plan=execution_plan)
+    return delta_tracker.delta_response(current_notebook, execution_plan=execution_plan)
+
+
+def _run_cells(context: MessageContext) -> ExecutionPlan:
+    session_state = context.session_state
+    if session_state.shared_notebook is not None:
+        session_state.shared_notebook.reset_output()
+    return context.notebook.run_cells(
+        context.run_cell_ids,
+        executor=session_state.executor,
+        memo_store=session_state.memo_store,
+        cancel_token=session_state.cancel_token,
+        on_output=session_state.output_listener,
+        pull_cell_ids=context.pull_cell_ids,
+    )
+
+
+@message_handler(MessageType.GET_NOTEBOOK, GetNotebook, needs_notebook=False)
+def _get_notebook(_message: GetNotebook, context: MessageContext) -> None:
+    context.full_response = True
+
+
+@message_handler(MessageType.UPDATE_CELL_CODE, UpdateCellCode, batchable=True)
+def _update_cell_code(message: UpdateCellCode, context: MessageContext) -> None:
+    context.notebook.set_cell_code(message.cell_id, message.code)
+
+
+@message_handler(MessageType.UPDATE_CELL_OUTPUT_NAME, UpdateCellOutputName, batchable=True)
+def _update_cell_output_name(message: UpdateCellOutputName, context: MessageContext) -> None:
+    context.notebook.update_cell_output_name(message.cell_id, message.output_name)
+
+
+@message_handler(MessageType.RUN_CELL, RunCell, batchable=True)
+def _run_cell(message: RunCell, context: MessageContext) -> None:
+    context.notebook.get_cell(message.cell_id)
+    if message.cell_id not in context.run_cell_ids:
+        context.run_cell_ids.append(message.cell_id)
+
+
+@message_handler(MessageType.PULL_CELLS, PullCells, batchable=True)
+def _pull_cells(message: PullCells, context: MessageContext) -> None:
+    for cell_id in message.cell_ids:
+        context.notebook.get_cell(cell_id).load_outputs()
+        if cell_id not in context.pull_cell_ids:
+            context.pull_cell_ids.append(cell_id)
+
+
+@message_handler(MessageType.PLAN_CELL, PlanCell)
+def _plan_cell(message: PlanCell, context: MessageContext) -> Optional[Message]:
+    return ExecutionPlanResponse(execution_plan=context.notebook.plan_run(message.cell_id))
+
+
+@message_handler(MessageType.CLEAR_CELL, ClearCell, batchable=True)
+def _clear_cell(message: ClearCell, context: MessageContext) -> None:
+    context.notebook.clear_cell(message.cell_id, keep_previous=False)
+
+
+@message_handler(MessageType.NEW_CELL, NewCell, batchable=True)
+def _new_cell(message: NewCell, context: MessageContext) -> None:
+    context.notebook.add_cell(index=message.index)
+
+
+@message_handler(MessageType.DELETE_CELL, DeleteCell, batchable=True)
+def _delete_cell(message: DeleteCell, context: MessageContext) -> None:
+    context.notebook.delete_cell(message.cell_id)
+
+
+@message_handler(MessageType.UPDATE_CELL_INPUT_NAMES, UpdateCellInputNames, batchable=True)
+def _update_cell_input_names(message: UpdateCellInputNames, context: MessageContext) -> None:
+    context.notebook.update_cell_input_names(message.cell_id, message.input_names)
+
+
+@message_handler(MessageType.UPDATE_CELL_LANGUAGE, UpdateCellLanguage, batchable=True)
+def _update_cell_language(message: UpdateCellLanguage, context: MessageContext) -> None:
+    context.notebook.update_cell_language(message.cell_id, message.language)
+
+
+@message_handler(MessageType.REORDER_CELLS, ReorderCells, batchable=True)
+def _reorder_cells(message: ReorderCells, context: MessageContext) -> None:
+    context.notebook.reorder_cells(message.cell_ids)
+
+
+@message_handler(MessageType.LIST_NOTEBOOKS, ListNotebooks, needs_notebook=False)
+def _list_notebooks(_message: ListNotebooks, _context: MessageContext) -> Optional[Message]:
+    return ListNotebooksResponse(notebook_details=list_local_notebooks())
+
+
+@message_handler(MessageType.OPEN_NOTEBOOK, OpenNotebook, needs_notebook=False)
+def _open_notebook(message: OpenNotebook, context: MessageContext) -> None:
+    flush_save(context.session_state)
+    notebook_registry.join(context.session_state, message.filepath)
+    preload_notebook_modules(context.session_state)
+
+
+@message_handler(MessageType.EXIT_NOTEBOOK, ExitNotebook)
+def _exit_notebook(_message: ExitNotebook, context: MessageContext) -> None:
+    flush_save(context.session_state)
+    notebook_registry.leave(context.session_state)
+
+
+@message_handler(MessageType.UPDATE_NOTEBOOK_NAME, UpdateNotebookName, batchable=True)
+def _update_notebook_name(message: UpdateNotebookName, context: MessageContext) -> None:
+    context.notebook.name = message.name
+    context.rename = True
+
+
+@message_handler(MessageType.UPDATE_NOTEBOOK_EVALUATION, UpdateNotebookEvaluation, batchable=True)
+def _update_notebook_evaluation(message: UpdateNotebookEvaluation, context: MessageContext) -> None:
+    context.notebook.evaluation = message.evaluation
+
+
+@message_handler(MessageType.NEW_NOTEBOOK, NewNotebook, needs_notebook=False)
+def _new_notebook(_message: NewNotebook, context: MessageContext) -> None:
+    flush_save(context.session_state)
+    create_notebook(context.session_state)
+
+
+@message_handler(MessageType.DELETE_NOTEBOOK, DeleteNotebook, needs_notebook=False)
+def _delete_notebook(message: DeleteNotebook, _context: MessageContext) -> Optional[Message]:
+    delete_existing_notebook(message.filepath)
+    return ListNotebooksResponse(notebook_details=list_local_notebooks())
+
+
+@message_handler(MessageType.BATCH, Batch)
+def _batch(batch: Batch, context: MessageContext) -> Optional[Message]:
+    # Every operation is parsed before any is applied, and the notebook is rolled back if one fails, so a batch
+    # that fails changes nothing
+    operations = []
+    for message_json in batch.messages:
+        message_type = MessageType.from_str(message_json.get("type", ""))
+        handler = MESSAGE_HANDLERS.get(message_type)
+        if handler is None or not handler.batchable:
+            return ErrorResponse(error=f"Can't process {message_type} in a batch")
+        operations.append((handler, handler.model.parse_obj(message_json)))
+
+    snapshot = context.notebook.snapshot()
+    try:
+        for handler, message in operations:
+            handler.handle(message, context)
+    except Exception:
+        context.notebook.rollback(snapshot)
+        raise
+    return None
+
+
+def handle_message(message_type: MessageType, message_json: Any, session_state: SessionState) -> str:
+    """Process a request message while holding the lock of the session's notebook, and encode the response.
+
+    If the message changed the notebook then the notebook is saved and other sessions sharing it are notified,
+    even if processing failed partway, for example when a cell failed to run.
+
+    Args:
+        message_type (MessageType): Type of request message.
+        message_json (Any): Raw request message object.
+        session_state (SessionState): Current session state.
+
+    Returns:
+        str: The encoded response message.
+    """
+    with _notebook_lock(session_state):
+        notebook = session_state.notebook
+        state = _get_notebook_state(notebook)
+        try:
+            response = process_message(message_type, message_json, session_state)
+        finally:
+            if notebook is not None and session_state.notebook is notebook and _get_notebook_state(notebook) != state:
+                schedule_save(session_state)
+                if session_state.shared_notebook is not None:
+                    session_state.shared_notebook.notify_changed(session_state)
+    # The notebook may have changed while processing the message
+    with _notebook_lock(session_state):
+        return encode_message(response)
+
+
+def refresh_notebook(session_state: SessionState) -> Optional[str]:
+    """Create an encoded response with the changes another session made to the session's notebook.
+
+    Args:
+        session_state (SessionState): Current session state.
+
+    Returns:
+        Optional[str]: The encoded delta response, or None if the session has no notebook open.
+    """
+    with _notebook_lock(session_state):
+        notebook = session_state.notebook
         if notebook is None:
-            return ErrorResponse(error=f"Can't process {message_type}, no active notebook")
-        update_notebook_name = UpdateNotebookName.parse_obj(message_json)
-        rename_notebook(session_state, notebook, update_notebook_name.name)
-    elif message_type == MessageType.NEW_NOTEBOOK:
-        NewNotebook.parse_obj(message_json)
-        create_notebook(session_state)
-    elif message_type == MessageType.DELETE_NOTEBOOK:
-        delete_notebook = DeleteNotebook.parse_obj(message_json)
-        delete_existing_notebook(delete_notebook.filepath)
-        details = list_local_notebooks()
-        return ListNotebooksResponse(notebook_details=details)
-    else:
-        logger.error("Request type did not match any known message types")
-        return ErrorResponse(error=f"Unknown message type from client: {message_type}")
+            return None
+        return encode_message(session_state.delta_tracker.delta_response(notebook))
+
+
+def _notebook_lock(session_state: SessionState) -> ContextManager[Any]:
+    shared = session_state.shared_notebook
+    return shared.lock if shared is not None else contextlib.nullcontext()
 
-    save_notebook(session_state)
 
-    return GetNotebookResponse(notebook=session_state.notebook)
+def _get_notebook_state(notebook: Optional[Notebook]) -> Hashable:
+    # Cell revisions change with every change to a cell, so comparing them is enough to find changes
+    if notebook is None:
+        return None
+    return notebook.name, notebook.evaluation, tuple((cell.id, cell.revision) for cell in notebook.cells)
@@ -1,52 +1,191 @@
+import asyncio
 import logging
+import threading
+import time
 import traceback
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any
+from uuid import UUID
 
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse
+from pydantic import ValidationError
 
-from cado.app.disk import save_notebook
-from cado.app.message import ErrorResponse, MessageType
-from cado.app.response import process_message
+from cado.app.message import CancelCell, ErrorResponse, Message, MessageType
+from cado.app.metrics import server_metrics
+from cado.app.output_streamer import OutputStreamer
+from cado.app.notebook_registry import notebook_registry
+from cado.app.response import handle_message, refresh_notebook
+from cado.app.serialization import encode_message
 from cado.app.session_state import SessionState
+from cado.core.cancel_token import CancelToken
+from cado.core.cycle_error import CycleError
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
+# Queued for a session when another session changed its notebook
+REFRESH_MESSAGE = object()
+
+
+# Queued behind the messages that were waiting when a cancel arrived, to drop the cancel once they have started
+@dataclass
+class CancelExpiry:
+    cancel_token: CancelToken
+    cell_id: UUID
+
 
 # pylint: disable=too-many-branches
 # pylint: disable=too-many-statements
 @router.websocket(path="/stream")
 async def stream_api(socket: WebSocket) -> None:
-    """Websocket endpoint for streaming commands."""
+    """Websocket endpoint for streaming commands.
+
+    Messages are processed in order on a worker thread so that running cells does not block the event loop.
+    Cancel messages are handled as soon as they are received, and cell output is streamed while cells run.
+    """
     logger.info("Starting connection...")
 
     await socket.accept()
     logger.info("Connection open")
 
-    session_state = SessionState()
+    async def send(message: Message) -> None:
+        await send_message(socket, message)
+
+    loop = asyncio.get_running_loop()
+    queue: "asyncio.Queue[Any]" = asyncio.Queue()
+    refresh_pending = threading.Event()
+
+    def on_notebook_changed() -> None:
+        # Changes by other sessions are sent in order with this session's responses, coalescing bursts
+        if not refresh_pending.is_set():
+            refresh_pending.set()
+            loop.call_soon_threadsafe(queue.put_nowait, REFRESH_MESSAGE)
+
+    streamer = OutputStreamer(loop, send)
+    session_state = SessionState(
+        executor=socket.app.state.executor,
+        settings=socket.app.state.settings,
+        on_output=streamer.write,
+        on_output_reset=streamer.reset,
+        on_notebook_changed=on_notebook_changed,
+    )
+    # A single thread keeps messages for the session in order and away from the event loop
+    thread_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="cado-session")
+    server_metrics.add_sessions(1)
+    consumer = asyncio.create_task(
+        process_messages(socket, queue, session_state, thread_executor, streamer, refresh_pending),
+    )
 
     try:
         while True:
             message_json = await socket.receive_json()
-            try:
-                message_type = MessageType.from_str(message_json["type"])
-                logger.debug("Received client message: %s", message_json)
-                response = process_message(message_type, message_json, session_state)
-                response_json = response.json()
-                logger.debug("Sending server message: %s", response_json)
-                await socket.send_json(response_json)
-            # pylint: disable=broad-exception-caught
-            except Exception as exc:
-                logger.error("Exception raised during cado session loop")
-                logger.error("Traceback: %s", traceback.format_exc())
-                response = ErrorResponse(error=str(exc))
-                response_json = response.json()
-                logger.debug("Sending server message: %s", response_json)
-                await socket.send_json(response_json)
+            if isinstance(message_json, dict) and message_json.get("type") == MessageType.CANCEL_CELL.value:
+                try:
+                    cancel_cell = CancelCell.parse_obj(message_json)
+                except ValidationError:
+                    logger.error("Invalid cancel message: %s", message_json)
+                    continue
+                logger.info("Cancelling run for cell %s", cancel_cell.cell_id)
+                # A run of the cell that is still queued is cancelled when it starts
+                session_state.cancel_token.cancel(cancel_cell.cell_id)
+                queue.put_nowait(CancelExpiry(session_state.cancel_token, cancel_cell.cell_id))
+            else:
+                queue.put_nowait(message_json)
     except WebSocketDisconnect:
         logger.info("Websocket disconnected")
-        save_notebook(session_state)
+    finally:
+        # The session is closed however the connection ended, so that its thread and notebook are not leaked
+        shared = session_state.shared_notebook
+        # Runs of a shared notebook carry on for the other sessions
+        if shared is None or len(shared.subscribers) == 1:
+            session_state.cancel_token.cancel()
+        consumer.cancel()
+        try:
+            await loop.run_in_executor(thread_executor, notebook_registry.leave, session_state)
+        finally:
+            thread_executor.shutdown(wait=False)
+            server_metrics.add_sessions(-1)
+
+
+# pylint: disable=too-many-arguments
+async def process_messages(
+    socket: WebSocket,
+    queue: "asyncio.Queue[Any]",
+    session_state: SessionState,
+    thread_executor: ThreadPoolExecutor,
+    streamer: OutputStreamer,
+    refresh_pending: threading.Event,
+) -> None:
+    """Process queued client messages one at a time and send the responses.
+
+    Args:
+        socket (WebSocket): Websocket connected to the client.
+        queue (asyncio.Queue[Any]): Queue of raw client messages, refresh markers for changes by other sessions, and
+            cancel expiries.
+        session_state (SessionState): Current session state.
+        thread_executor (ThreadPoolExecutor): Executor that messages are processed on.
+        streamer (OutputStreamer): Streamer for cell output, flushed before each response.
+        refresh_pending (threading.Event): Set while a refresh marker is queued.
+    """
+    loop = asyncio.get_running_loop()
+    while True:
+        message_json = await queue.get()
+        if message_json is REFRESH_MESSAGE:
+            refresh_pending.clear()
+            response_text = await loop.run_in_executor(thread_executor, refresh_notebook, session_state)
+            await streamer.flush()
+            if response_text is not None:
+                await send_text(socket, response_text)
+            continue
+        if isinstance(message_json, CancelExpiry):
+            message_json.cancel_token.expire(message_json.cell_id)
+            continue
+
+        streamer.reset()
+        start_time = time.perf_counter()
+        try:
+            message_type = MessageType.from_str(message_json["type"])
+            logger.debug("Received client message: %s", message_json)
+            response_text = await loop.run_in_executor(
+                thread_executor,
+                handle_message,
+                message_type,
+                message_json,
+                session_state,
+            )
+            server_metrics.observe_message(message_type.value, time.perf_counter() - start_time)
+        # pylint: disable=broad-exception-caught
+        except Exception as exc:
+            logger.error("Exception raised during cado session loop")
+            logger.error("Traceback: %s", traceback.format_exc())
+            cell_ids = exc.cycle if isinstance(exc, CycleError) else []
+            response_text = encode_message(ErrorResponse(error=str(exc), cell_ids=cell_ids))
+        await streamer.flush()
+        await send_text(socket, response_text)
+
+
+async def send_message(socket: WebSocket, message: Message) -> None:
+    """Send a message to the client.
+
+    Args:
+        socket (WebSocket): Websocket connected to the client.
+        message (Message): Message to send.
+    """
+    await send_text(socket, encode_message(message))
+
+
+async def send_text(socket: WebSocket, message_text: str) -> None:
+    """Send an encoded message to the client.
+
+    Args:
+        socket (WebSocket): Websocket connected to the client.
+        message_text (str): Encoded message to send.
+    """
+    logger.debug("Sending server message: %s", message_text)
+    await socket.send_text(message_text)
 
 
 @router.get(path="/status")
@@ -56,3 +195,9 @@ def get_status() -> JSONResponse:
     return JSONResponse({
         'status': 'healthy',
     })
+
+
+@router.get(path="/metrics")
+def get_metrics() -> PlainTextResponse:
+    """Endpoint for server metrics in the Prometheus text format."""
+    return PlainTextResponse(server_metrics.render(), media_type="text/plain; version=0.0.4")
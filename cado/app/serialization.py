@@ -0,0 +1,48 @@
+import json
+from datetime import date, datetime
+from enum import Enum
+from pathlib import PurePath
+from typing import Any
+from uuid import UUID
+
+from pydantic import BaseModel
+
+from cado.app.message import Message
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None  # type: ignore[assignment]
+
+
+def _default(obj: Any) -> Any:
+    # Models are encoded from their field values directly, rather than converted to dicts or strings first
+    if isinstance(obj, BaseModel):
+        return obj.__dict__
+    if isinstance(obj, (UUID, PurePath)):
+        return str(obj)
+    if isinstance(obj, (datetime, date)):
+        return obj.isoformat()
+    if isinstance(obj, Enum):
+        return obj.value
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def encode_message(message: Message) -> str:
+    """Encode a message as JSON in a single pass.
+
+    Uses orjson when it is installed and falls back to the standard library otherwise, or for values orjson
+    does not support such as integers larger than 64 bits.
+
+    Args:
+        message (Message): Message to encode.
+
+    Returns:
+        str: JSON encoded message.
+    """
+    if orjson is not None:
+        try:
+            return orjson.dumps(message, default=_default, option=orjson.OPT_NON_STR_KEYS).decode()
+        except TypeError:
+            pass
+    return json.dumps(message, default=_default)
@@ -1,11 +1,48 @@
-from dataclasses import dataclass
+from concurrent.futures import Executor
+from dataclasses import dataclass, field
 from pathlib import Path
-from typing import Optional
+from typing import TYPE_CHECKING, Callable, Optional
+from uuid import UUID
 
+from cado.app.autosave import Autosaver
+from cado.app.delta_tracker import DeltaTracker
+from cado.app.settings import Settings
+from cado.core.cancel_token import CancelToken
+from cado.core.memo_store import MemoStore, get_memo_store
 from cado.core.notebook import Notebook
 
+if TYPE_CHECKING:
+    from cado.app.notebook_registry import SharedNotebook
 
+
+# pylint: disable=too-many-instance-attributes
 @dataclass
 class SessionState:
     notebook: Optional[Notebook] = None
     filepath: Optional[Path] = None
+    executor: Optional[Executor] = None
+    settings: Settings = field(default_factory=Settings)
+    cancel_token: CancelToken = field(default_factory=CancelToken)
+    on_output: Optional[Callable[[UUID, str, str], None]] = None
+    # Called when a run starts, so that output streamed for the run replaces earlier output
+    on_output_reset: Optional[Callable[[], None]] = None
+    delta_tracker: DeltaTracker = field(default_factory=DeltaTracker)
+    autosaver: Optional[Autosaver] = None
+    # Set while the notebook is open through the notebook registry, which may share it with other sessions
+    shared_notebook: Optional["SharedNotebook"] = None
+    # Called from any thread when another session changes the shared notebook
+    on_notebook_changed: Optional[Callable[[], None]] = None
+
+    @property
+    def output_listener(self) -> Optional[Callable[[UUID, str, str], None]]:
+        """Listener for output of running cells, which streams it to every session sharing the notebook."""
+        if self.shared_notebook is not None:
+            return self.shared_notebook.broadcast_output
+        return self.on_output
+
+    @property
+    def memo_store(self) -> Optional[MemoStore]:
+        """Memo store for the current notebook, if memoization is enabled."""
+        if not self.settings.memo or self.filepath is None:
+            return None
+        return get_memo_store(self.filepath, max_bytes=self.settings.memo_size * 1024 * 1024)
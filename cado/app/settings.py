@@ -0,0 +1,14 @@
+from dataclasses import dataclass, field
+from typing import List
+
+
+@dataclass
+class Settings:
+    workers: int = 0
+    memo: bool = False
+    memo_size: int = 1024
+    save_delay: float = 1.0
+    preload: List[str] = field(default_factory=list)
+    # Modules that notebooks may ask to preload when they are opened, along with their submodules
+    allow_preload: List[str] = field(default_factory=list)
+    cache_size: int = 256
@@ -1,17 +1,22 @@
 import logging
-import webbrowser
+import sys
+import time
+from importlib.metadata import version
 from pathlib import Path
+from typing import TYPE_CHECKING, List, Optional, Tuple
 
 import click
-import pkg_resources
-import uvicorn
 
-from cado.app.app import app as cado_app
+# Commands import what they need when they run, so that starting the CLI stays fast
+if TYPE_CHECKING:
+    from cado.core.execution_plan import ExecutionPlan
+    from cado.core.notebook import Notebook
 
 logger = logging.getLogger(__name__)
 
 
 @click.group()
+@click.version_option(package_name="cado")
 def main() -> None:
     """Main CLI entrypoint."""
 
@@ -23,8 +28,39 @@ def main() -> None:
 @click.option("--debug", is_flag=True, default=False)
 @click.option("--log-level", type=int, default=logging.INFO)
 @click.option("--open/--no-open", is_flag=True, default=True)
-def up_command(host: str, port: int, debug: bool, log_level: int, open: bool) -> None:
+@click.option("--workers", "-w", type=int, default=0, help="Worker processes for running cells in parallel.")
+@click.option("--memo/--no-memo", is_flag=True, default=False, help="Reuse results of cells with unchanged inputs.")
+@click.option("--memo-size", type=int, default=1024, help="Size budget in MB for memoized cell results.")
+@click.option("--save-delay", type=float, default=1.0, help="Seconds to collect changes for before saving.")
+@click.option("--preload", type=str, multiple=True, help="Module to import before running cells, can be repeated.")
+@click.option("--cache-size", type=int, default=256, help="Size budget in MB for closed notebooks kept in memory.")
+@click.option("--allow-preload", type=str, multiple=True,
+              help="Module that notebooks may ask to preload when opened, can be repeated.")
+# pylint: disable=too-many-arguments
+# pylint: disable=too-many-locals
+def up_command(
+    host: str,
+    port: int,
+    debug: bool,
+    log_level: int,
+    open: bool,
+    workers: int,
+    memo: bool,
+    memo_size: int,
+    save_delay: float,
+    preload: Tuple[str, ...],
+    cache_size: int,
+    allow_preload: Tuple[str, ...],
+) -> None:
     """Command to start up cado app."""
+    # pylint: disable=import-outside-toplevel
+    import webbrowser
+
+    import uvicorn
+
+    from cado.app.app import app as cado_app
+    from cado.app.settings import Settings
+
     current_dirpath = Path(__file__).parent
     cado_string = """
                  _
@@ -38,7 +74,7 @@ def up_command(host: str, port: int, debug: bool, log_level: int, open: bool) ->
     print("\033[0;32m")
     print(cado_string)
 
-    package_version = pkg_resources.get_distribution("cado").version
+    package_version = version("cado")
     print(f"\nRunning cado version {package_version}\n")
 
     url = f"http://{host}:{port}"
@@ -54,6 +90,15 @@ def up_command(host: str, port: int, debug: bool, log_level: int, open: bool) ->
     package_dirpath = current_dirpath.parent.parent
     log_config_filepath = package_dirpath / "logging.yaml"
     log_level = logging.DEBUG if debug else log_level
+    cado_app.state.settings = Settings(
+        workers=workers,
+        memo=memo,
+        memo_size=memo_size,
+        save_delay=save_delay,
+        preload=list(preload),
+        cache_size=cache_size,
+        allow_preload=list(allow_preload),
+    )
     uvicorn.run(
         cado_app,
         host=host,
@@ -61,3 +106,91 @@ def up_command(host: str, port: int, debug: bool, log_level: int, open: bool) ->
         log_level=log_level,
         log_config=str(log_config_filepath),
     )
+
+
+@main.command(name="run")
+@click.argument("notebook_path", type=click.Path(exists=True, dir_okay=False, path_type=Path))
+@click.option("--workers", "-w", type=int, default=0, help="Worker processes for running cells in parallel.")
+@click.option("--output", "-o", "output_names", type=str, multiple=True,
+              help="Output name of a cell to compute along with its ancestors, can be repeated. Defaults to all cells.")
+@click.option("--preload", type=str, multiple=True, help="Module to import before running cells, can be repeated.")
+@click.option("--save/--no-save", is_flag=True, default=True, help="Write the outputs back to the notebook file.")
+@click.option("--timings", is_flag=True, default=False, help="Print how long each cell took to run.")
+# pylint: disable=too-many-arguments
+# pylint: disable=too-many-locals
+def run_command(
+    notebook_path: Path,
+    workers: int,
+    output_names: Tuple[str, ...],
+    preload: Tuple[str, ...],
+    save: bool,
+    timings: bool,
+) -> None:
+    """Command to run a notebook without starting the app."""
+    # pylint: disable=import-outside-toplevel
+    from cado.core.kernel_pool import create_kernel_pool, preload_modules, shutdown_kernel_pool
+    from cado.core.notebook import Notebook
+    from cado.core.plan_runner import PlanRunner
+
+    notebook = Notebook.from_filepath(notebook_path)
+    try:
+        plan = notebook.plan_run_all(list(output_names) if len(output_names) > 0 else None)
+    except ValueError as exc:
+        raise click.BadParameter(str(exc), param_hint="--output") from exc
+
+    modules = [*notebook.preload, *preload]
+    preload_modules(modules)
+    executor = create_kernel_pool(workers, modules) if workers > 0 else None
+    error = None
+    start_time = time.perf_counter()
+    try:
+        PlanRunner(notebook, plan, executor=executor).run()
+    except ValueError as exc:
+        error = exc
+    finally:
+        if executor is not None:
+            shutdown_kernel_pool(executor)
+    wall_time = time.perf_counter() - start_time
+
+    if save:
+        notebook.set_updated_time()
+        notebook.to_filepath(notebook_path)
+    if timings:
+        click.echo(format_timing_report(notebook, plan, wall_time))
+    if error is not None:
+        click.echo(f"Failed to run notebook: {error}", err=True)
+        sys.exit(1)
+
+
+def format_timing_report(notebook: "Notebook", plan: "ExecutionPlan", wall_time: float) -> str:
+    """Format a table of how long each cell in a run took.
+
+    Args:
+        notebook (Notebook): The notebook that was run.
+        plan (ExecutionPlan): The plan that was run.
+        wall_time (float): Seconds the whole run took.
+
+    Returns:
+        str: The report.
+    """
+    # pylint: disable=import-outside-toplevel
+    from cado.core.cell_status import CellStatus
+
+    lines: List[str] = [f"{'cell':<36}  {'status':<8}  {'wall':>9}  {'cpu':>9}"]
+    cell_time = 0.0
+    for cell_id in plan.cell_ids:
+        cell = notebook.get_cell(cell_id)
+        name = cell.output_name or str(cell.id)
+        # Cells that did not run because a parent failed keep the metrics of an earlier run
+        ran = cell.status != CellStatus.EXPIRED
+        cell_wall_time = cell.metrics.wall_time if ran else None
+        cpu_time = cell.metrics.cpu_time if ran else None
+        cell_time += cell_wall_time or 0.0
+        lines.append(f"{name[:36]:<36}  {cell.status.value:<8}  {_format_seconds(cell_wall_time)}  "
+                     f"{_format_seconds(cpu_time)}")
+    lines.append(f"Ran {len(plan.cell_ids)} cells in {wall_time:.3f}s, with {cell_time:.3f}s of cell time")
+    return "\n".join(lines)
+
+
+def _format_seconds(seconds: Optional[float]) -> str:
+    return f"{'-':>9}" if seconds is None else f"{seconds:>8.3f}s"
@@ -0,0 +1,78 @@
+import hashlib
+from typing import Any, Dict
+
+BINARY_OUTPUT_TYPE = "cado/binary"
+PREVIEW_BYTES = 32
+
+
+def is_binary(output: Any) -> bool:
+    """Check whether a cell output is a binary buffer, like bytes or an array, rather than JSON data.
+
+    Binary outputs are passed to child cells running in-process as the same object, without being copied or
+    serialized. Only a preview of them is sent to the client and saved to disk.
+
+    Args:
+        output (Any): The cell output.
+
+    Returns:
+        bool: Whether the output supports the buffer protocol.
+    """
+    if isinstance(output, (bytes, bytearray, memoryview)):
+        return True
+    if output is None or isinstance(output, (str, int, float, bool, list, dict)):
+        return False
+    try:
+        memoryview(output)
+    except TypeError:
+        return False
+    return True
+
+
+def is_binary_preview(output: Any) -> bool:
+    """Check whether a cell output is the preview of a binary output.
+
+    Args:
+        output (Any): The cell output.
+
+    Returns:
+        bool: Whether the output was created by preview_binary.
+    """
+    return isinstance(output, dict) and output.get("type") == BINARY_OUTPUT_TYPE
+
+
+def preview_binary(output: Any) -> Dict[str, Any]:
+    """Create a compact JSON serializable description of a binary output.
+
+    Args:
+        output (Any): The binary cell output.
+
+    Returns:
+        Dict[str, Any]: Preview with the type, format, shape and size of the buffer, and its first bytes in hex.
+    """
+    view = memoryview(output)
+    head = None
+    if view.c_contiguous:
+        head = view.cast("B")[:PREVIEW_BYTES].hex()
+    return {
+        "type": BINARY_OUTPUT_TYPE,
+        "object_type": type(output).__name__,
+        "format": view.format,
+        "shape": list(view.shape or []),
+        "nbytes": view.nbytes,
+        "head": head,
+    }
+
+
+def hash_binary(output: Any) -> str:
+    """Hash a binary output without copying it, unless the buffer is not contiguous.
+
+    Args:
+        output (Any): The binary cell output.
+
+    Returns:
+        str: Hex digest of the output.
+    """
+    view = memoryview(output)
+    digest = hashlib.sha256(f"{BINARY_OUTPUT_TYPE}:{view.format}:{view.shape}:".encode())
+    digest.update(view if view.c_contiguous else view.tobytes())
+    return digest.hexdigest()
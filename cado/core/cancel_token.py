@@ -0,0 +1,114 @@
+import ctypes
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Collection, Iterator, List, Optional, Set, Type
+from uuid import UUID
+
+logger = logging.getLogger(__name__)
+
+
+class RunInterrupted(BaseException):
+    """Raised inside a running cell when its run is cancelled.
+
+    This derives from BaseException so that cell code catching Exception does not swallow it.
+    """
+
+
+def _set_async_exc(thread_id: int, exc_type: Optional[Type[BaseException]]) -> None:
+    if not hasattr(ctypes, "pythonapi"):
+        return
+    exc = ctypes.py_object(exc_type) if exc_type is not None else None
+    ctypes.pythonapi.PyThreadState_SetAsyncExc(ctypes.c_ulong(thread_id), exc)
+
+
+class CancelToken:
+    """Signals that a run should stop, and interrupts the cell that is currently running in-process.
+
+    A cancel for a cell only stops a run that includes the cell. If no such run is in progress, the cancel is kept
+    pending until it expires, so that a run of the cell that was requested before the cancel but has not started yet
+    is cancelled as soon as it starts.
+    """
+
+    def __init__(self) -> None:
+        self._cancelled = False
+        # Cells in the run in progress, or None if there is no run in progress
+        self._cell_ids: Optional[Set[UUID]] = None
+        self._pending: List[UUID] = []
+        self._thread_id: Optional[int] = None
+        self._interrupted = False
+        self._lock = threading.Lock()
+
+    @property
+    def cancelled(self) -> bool:
+        """Whether the run in progress has been cancelled."""
+        return self._cancelled
+
+    def cancel(self, cell_id: Optional[UUID] = None) -> None:
+        """Cancel the run in progress, interrupting the running cell if there is one.
+
+        Args:
+            cell_id (Optional[UUID]): Cell whose run to cancel. The run in progress is cancelled whatever cells it
+                includes if not given.
+        """
+        with self._lock:
+            if cell_id is not None and (self._cell_ids is None or cell_id not in self._cell_ids):
+                self._pending.append(cell_id)
+                return
+            if self._cell_ids is None:
+                return
+            self._cancel()
+
+    def expire(self, cell_id: UUID) -> None:
+        """Drop a pending cancel for a cell, once every run requested before it has started.
+
+        Args:
+            cell_id (UUID): Cell the cancel was for.
+        """
+        with self._lock:
+            if cell_id in self._pending:
+                self._pending.remove(cell_id)
+
+    def start(self, cell_ids: Collection[UUID]) -> None:
+        """Start a run of some cells, which is cancelled straight away if one of them has a pending cancel.
+
+        Args:
+            cell_ids (Collection[UUID]): IDs of the cells in the run.
+        """
+        with self._lock:
+            self._cell_ids = set(cell_ids)
+            self._cancelled = any(cell_id in self._cell_ids for cell_id in self._pending)
+
+    def finish(self) -> None:
+        """Finish the run in progress."""
+        with self._lock:
+            self._cell_ids = None
+            self._cancelled = False
+
+    def _cancel(self) -> None:
+        self._cancelled = True
+        if self._thread_id is not None and not self._interrupted:
+            logger.debug("Interrupting cell running on thread %s", self._thread_id)
+            _set_async_exc(self._thread_id, RunInterrupted)
+            self._interrupted = True
+
+    @contextmanager
+    def interruptible(self) -> Iterator[None]:
+        """Allow the current thread to be interrupted by cancel while in the context.
+
+        Raises:
+            RunInterrupted: If the run is cancelled before or while in the context.
+        """
+        with self._lock:
+            if self._cancelled:
+                raise RunInterrupted()
+            self._thread_id = threading.get_ident()
+            self._interrupted = False
+        try:
+            yield
+        finally:
+            with self._lock:
+                if self._interrupted and self._thread_id is not None:
+                    # Clear the interrupt in case it was not raised before the cell finished
+                    _set_async_exc(self._thread_id, None)
+                self._thread_id = None
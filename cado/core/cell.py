@@ -1,16 +1,99 @@
-import io
-import json
 import traceback
-from contextlib import redirect_stdout, redirect_stderr
-from typing import Any, Dict, List, Mapping, Optional
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Mapping, Optional, Tuple
 from uuid import UUID, uuid4
 
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, PrivateAttr
 
+from cado.core.binary_output import is_binary, is_binary_preview, preview_binary
+from cado.core.cell_metrics import CellMetrics, RunMeasurement, measure_run
 from cado.core.cell_status import CellStatus
+from cado.core.compile_cache import compile_code
+from cado.core.hashing import hash_output
+from cado.core.output_buffer import OutputBuffer
+from cado.core.output_capture import capture_output
+from cado.core.output_size import get_output_size
+from cado.core.output_store import CellOutputs, OutputStore
 from cado.core.language import Language
 
+OUTPUT_FIELDS = {"output", "stdout", "stderr"}
 
+
+@dataclass
+class CellResult:
+    output: Any = None
+    output_size: Optional[int] = None
+    stdout: Optional[str] = None
+    stderr: Optional[str] = None
+    error: Optional[str] = None
+    measurement: Optional[RunMeasurement] = None
+
+
+def execute(
+    cell_id: UUID,
+    code: str,
+    output_name: str,
+    context: Dict[str, Any],
+    on_output: Optional[Callable[[str, str], None]] = None,
+) -> CellResult:
+    """Execute cell code without touching the cell itself, so that it can be run in a worker process.
+
+    Args:
+        cell_id (UUID): ID of the cell, used in error messages.
+        code (str): Code to execute.
+        output_name (str): Name of the output variable, or an empty string if there is no output.
+        context (Dict[str, Any]): Parent outputs keyed by output name.
+        on_output (Optional[Callable[[str, str], None]]): Called with the stream name ("stdout" or "stderr")
+            and each chunk of text as the cell writes it.
+
+    Returns:
+        CellResult: The output and logs of the cell, or an error message if execution failed.
+    """
+    if code == "":
+        return CellResult(error=f"Code is empty for cell \"{cell_id}\"")
+
+    exec_locals: Mapping[str, object] = {}
+    stdout = OutputBuffer(on_write=_stream_callback(on_output, "stdout"))
+    stderr = OutputBuffer(on_write=_stream_callback(on_output, "stderr"))
+    with measure_run() as measurement:
+        try:
+            with capture_output(stdout, stderr):
+                # pylint: disable=exec-used
+                exec(compile_code(code), context, exec_locals)
+        # pylint: disable=broad-exception-caught
+        except Exception:
+            return CellResult(error=f"Failed to exec: {traceback.format_exc()}", measurement=measurement)
+
+    result = CellResult(
+        stdout=stdout.getvalue().rstrip(),
+        stderr=stderr.getvalue().rstrip(),
+        measurement=measurement,
+    )
+    if output_name != "":
+        # Check that a variable with the cell output name was emitted by exec
+        if output_name not in exec_locals:
+            result.error = f"Cell name \"{output_name}\" was not found in exec locals for cell ({cell_id})"
+            return result
+        output = exec_locals[output_name]
+        try:
+            result.output_size = get_output_size(output)
+        except ValueError as exc:
+            result.error = str(exc)
+        else:
+            result.output = output
+    return result
+
+
+def _stream_callback(
+    on_output: Optional[Callable[[str, str], None]],
+    stream: str,
+) -> Optional[Callable[[str], None]]:
+    if on_output is None:
+        return None
+    return lambda text: on_output(stream, text)
+
+
+# pylint: disable=too-many-instance-attributes
 class Cell(BaseModel):
     id: UUID = Field(default_factory=uuid4)
     code: str = ""
@@ -23,68 +106,222 @@ class Cell(BaseModel):
     stdout: Optional[str] = None
     stderr: Optional[str] = None
     status: CellStatus = CellStatus.EXPIRED
+    # Approximate size of the output serialized as JSON, or the number of bytes of a binary output
+    output_size: Optional[int] = None
+    metrics: CellMetrics = Field(default_factory=CellMetrics)
+
+    # Reference to the output, stdout and stderr in the notebook's output store, if they were saved there
+    output_ref: Optional[str] = None
+
+    # Incremented whenever a field changes, so that changed cells can be found without comparing their contents
+    _revision: int = PrivateAttr(default=0)
+    # Store to load the outputs from, while they have not been loaded yet
+    _output_store: Optional[OutputStore] = PrivateAttr(default=None)
+    # Binary output object, while the output field holds its preview
+    _raw_output: Any = PrivateAttr(default=None)
+    # Fingerprint of the output, computed when first needed
+    _output_hash: Optional[str] = PrivateAttr(default=None)
+    # Fingerprint of the code and parent outputs that produced the output, if it was produced by a run
+    _input_key: Optional[str] = PrivateAttr(default=None)
+    # Result from before the cell was last cleared, with its input key and output hash, so it can be reused
+    _previous: Optional[Tuple[str, CellResult, Optional[str]]] = PrivateAttr(default=None)
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        if name in self.__private_attributes__:
+            # Private attributes skip validation and change tracking, as they do in pydantic itself
+            object.__setattr__(self, name, value)
+            return
+        if name in OUTPUT_FIELDS:
+            # New outputs replace any outputs that have not been loaded yet
+            self._output_store = None
+            self.__dict__["output_ref"] = None
+        if name == "output":
+            self._raw_output = None
+            self._output_hash = None
+            self._input_key = None
+            self.__dict__["output_size"] = None
+        changed = name in self.__fields__ and self.__dict__.get(name) is not value
+        if changed:
+            changed = self.__dict__.get(name) != value
+        super().__setattr__(name, value)
+        if changed:
+            self._revision += 1
+
+    @property
+    def revision(self) -> int:
+        """Number of times a field of the cell has changed."""
+        return self._revision
+
+    @property
+    def output_value(self) -> Any:
+        """The output to pass to child cells, which is the object itself for binary outputs."""
+        if self._raw_output is not None:
+            return self._raw_output
+        return self.output
+
+    @property
+    def output_hash(self) -> str:
+        """Fingerprint of the output passed to child cells."""
+        if self._output_hash is None:
+            self._output_hash = hash_output(self.output_value)
+        return self._output_hash
+
+    @property
+    def previous_size(self) -> int:
+        """Approximate size of the result kept aside when the cell was last cleared, or 0 if there is none."""
+        if self._previous is None:
+            return 0
+        result = self._previous[1]
+        return (result.output_size or 0) + len(result.stdout or "") + len(result.stderr or "")
+
+    @property
+    def outputs_loaded(self) -> bool:
+        """Whether the outputs are in memory, rather than waiting to be loaded from the output store."""
+        return self._output_store is None
+
+    def defer_outputs(self, output_store: OutputStore) -> None:
+        """Load the outputs from an output store the first time they are needed, instead of now.
+
+        Args:
+            output_store (OutputStore): Store that the cell's output reference points into.
+        """
+        if self.output_ref is not None:
+            self._output_store = output_store
+
+    def load_outputs(self) -> None:
+        """Load the outputs from the output store if they have not been loaded yet.
+
+        If the outputs can no longer be found then the cell is cleared.
+        """
+        output_store = self._output_store
+        if output_store is None or self.output_ref is None:
+            return
+        self._output_store = None
+        outputs = output_store.get(self.output_ref)
+        if outputs is None:
+            self.clear()
+            return
+        # Loading outputs is not a change to the cell
+        self.__dict__.update(output=outputs.output, stdout=outputs.stdout, stderr=outputs.stderr)
+        if is_binary_preview(outputs.output):
+            # Only the preview of a binary output is saved, so the cell has to run again to produce it
+            self.status = CellStatus.EXPIRED
+
+    def store_outputs(self, output_store: OutputStore) -> Optional[str]:
+        """Save the outputs to an output store, if they are not already saved there.
+
+        Args:
+            output_store (OutputStore): Store to save the outputs to.
+
+        Returns:
+            Optional[str]: Reference to the outputs in the store, or None if the cell has no outputs.
+        """
+        if self._output_store is not None and self._output_store.dirpath != output_store.dirpath:
+            self.load_outputs()
+        if self._output_store is None and self.output_ref is None:
+            if self.output is None and self.stdout is None and self.stderr is None:
+                return None
+            outputs = CellOutputs(output=self.output, stdout=self.stdout, stderr=self.stderr)
+            self.__dict__["output_ref"] = output_store.put(outputs)
+        return self.output_ref
 
     def run(self, context: Dict[str, Any]) -> None:
         """Run the cell.
 
-        Returns:
-            Any: The output of running the cell.
+        Args:
+            context (Dict[str, Any]): Parent outputs keyed by output name.
         """
-        if self.code == "":
-            error = ValueError(f"Code is empty for cell \"{self.id}\"")
-            self.set_error(error)
-            raise error
+        self.apply_result(execute(self.id, self.code, self.output_name, context))
 
-        exec_locals: Mapping[str, object] = {}
-        try:
+    def apply_result(
+        self,
+        result: CellResult,
+        cached: bool = False,
+        input_key: Optional[str] = None,
+    ) -> None:
+        """Update the cell from the result of executing its code.
 
-            stdout = io.StringIO()
-            stderr = io.StringIO()
-            with redirect_stdout(stdout), redirect_stderr(stderr):
-                # pylint: disable=exec-used
-                exec(self.code, context, exec_locals)
+        Args:
+            result (CellResult): Result of executing the cell code.
+            cached (bool): Whether the result was reused from an earlier run instead of executing the code.
+            input_key (Optional[str]): Fingerprint of the code and parent outputs that produced the result.
+
+        Raises:
+            ValueError: If the result contains an error.
+        """
+        self._previous = None
+        measurement = result.measurement or RunMeasurement()
+        self.metrics = CellMetrics(
+            wall_time=measurement.wall_time,
+            cpu_time=measurement.cpu_time,
+            peak_memory_growth=measurement.peak_memory_growth,
+            run_count=self.metrics.run_count + (0 if cached else 1),
+            cache_hits=self.metrics.cache_hits + (1 if cached else 0),
+        )
+        if result.stdout is not None:
+            self.stdout = result.stdout
+            self.stderr = result.stderr
 
-            self.stdout = stdout.getvalue().rstrip()
-            self.stderr = stderr.getvalue().rstrip()
-        except Exception as exc:
-            error = ValueError(f"Failed to exec: {traceback.format_exc()}")
+        if result.error is not None:
+            error = ValueError(result.error)
             self.set_error(error)
-            raise error from exc
+            raise error
 
         if self.output_name != "":
-            # Check that a variable with the cell output name was emitted by exec
-            if self.output_name not in exec_locals:
-                error = ValueError(
-                    f"Cell name \"{self.output_name}\" was not found in exec locals for cell ({self.id})")
-                self.set_error(error)
-                raise error
-            self.output = self.parse_output(exec_locals[self.output_name])
+            if is_binary(result.output):
+                self.output = preview_binary(result.output)
+                self._raw_output = result.output
+            else:
+                self.output = result.output
+            self.output_size = result.output_size
+        self._input_key = input_key
         self.status = CellStatus.OK
 
-    def parse_output(self, output: Any) -> Any:
-        """Parse the cells output as JSON.
+    def restore(self, input_key: str) -> bool:
+        """Reuse the current result, or the result from before the cell was last cleared, instead of running the
+        cell, if the same code and parent outputs produced it.
 
         Args:
-            output (Any): The cell output.
+            input_key (str): Fingerprint of the current code and parent outputs.
 
         Returns:
-            Any: The cell output if it could be JSON serialized.
+            bool: Whether an earlier result was reused.
         """
-        try:
-            json.dumps(output)
-        except TypeError as exc:
-            error = ValueError(f"Cell outputs must be JSON serializable. {exc}.")
-            self.set_error(error)
-            raise error from exc
-        return output
+        previous = self._snapshot() or self._previous
+        if previous is None or previous[0] != input_key:
+            return False
+        _, result, output_hash = previous
+        self.apply_result(result, cached=True, input_key=input_key)
+        self._output_hash = output_hash
+        return True
 
-    def clear(self) -> None:
-        """Clear the cell outputs and set the status to expired."""
+    def _snapshot(self) -> Optional[Tuple[str, CellResult, Optional[str]]]:
+        if self.status != CellStatus.OK or self._input_key is None:
+            return None
+        result = CellResult(output=self.output_value, output_size=self.output_size, stdout=self.stdout,
+                            stderr=self.stderr)
+        return self._input_key, result, self._output_hash
+
+    def clear(self, keep_previous: bool = True) -> None:
+        """Clear the cell outputs and set the status to expired.
+
+        Outputs produced by a run can be kept aside, so that they can be restored if the cell's code and parent
+        outputs turn out to be unchanged when it next runs.
+
+        Args:
+            keep_previous (bool): Whether to keep the outputs aside, rather than drop them along with any outputs
+                kept aside before.
+        """
+        self._previous = (self._snapshot() or self._previous) if keep_previous else None
         self.output = None
         self.stdout = None
         self.stderr = None
         self.status = CellStatus.EXPIRED
 
+    def discard_previous(self) -> None:
+        """Drop the result kept aside when the cell was last cleared, so that its memory can be freed."""
+        self._previous = None
+
     def set_error(self, error: ValueError) -> None:
         """Clear the cell outputs and set the status to error."""
         self.output = None
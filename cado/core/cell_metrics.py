@@ -0,0 +1,65 @@
+import sys
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Iterator, Optional
+
+from pydantic import BaseModel
+
+try:
+    import resource
+except ImportError:  # pragma: no cover
+    resource = None  # type: ignore[assignment]
+
+
+class CellMetrics(BaseModel):
+    """Measurements of the last run of a cell, and counts over all of its runs."""
+
+    # Seconds the last run took, and seconds of CPU time it used
+    wall_time: Optional[float] = None
+    cpu_time: Optional[float] = None
+    # Bytes by which the last run raised the peak memory of the whole process running it. This is 0 when the run
+    # stayed under an earlier peak, and counts memory used by other threads during the run.
+    peak_memory_growth: Optional[int] = None
+    run_count: int = 0
+    cache_hits: int = 0
+
+
+@dataclass
+class RunMeasurement:
+    wall_time: Optional[float] = None
+    cpu_time: Optional[float] = None
+    peak_memory_growth: Optional[int] = None
+
+
+@contextmanager
+def measure_run() -> Iterator[RunMeasurement]:
+    """Measure the wall time, CPU time and process peak memory growth of the code run inside the context.
+
+    CPU time is counted for the current thread only. Peak memory is the high-water mark of the whole process, so
+    it only grows when the process uses more memory than it ever did before, and is not available on Windows. It
+    is not the memory used by the run itself, which would take tracing every allocation to measure.
+
+    Yields:
+        RunMeasurement: Measurement, filled in when the context exits.
+    """
+    measurement = RunMeasurement()
+    start_peak_memory = _get_peak_memory()
+    start_cpu_time = time.thread_time()
+    start_wall_time = time.perf_counter()
+    try:
+        yield measurement
+    finally:
+        measurement.wall_time = time.perf_counter() - start_wall_time
+        measurement.cpu_time = time.thread_time() - start_cpu_time
+        end_peak_memory = _get_peak_memory()
+        if start_peak_memory is not None and end_peak_memory is not None:
+            measurement.peak_memory_growth = end_peak_memory - start_peak_memory
+
+
+def _get_peak_memory() -> Optional[int]:
+    if resource is None:
+        return None
+    peak_memory = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes and macOS reports bytes
+    return peak_memory if sys.platform == "darwin" else peak_memory * 1024
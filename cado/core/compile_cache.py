@@ -0,0 +1,64 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from types import CodeType
+
+DEFAULT_MAX_SIZE = 512
+
+
+class CompileCache:
+    """LRU cache of compiled cell code, keyed by a hash of the source."""
+
+    def __init__(self, max_size: int = DEFAULT_MAX_SIZE):
+        self.max_size = max_size
+        self._code_objects: "OrderedDict[str, CodeType]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def compile(self, code: str) -> CodeType:
+        """Compile cell code, reusing the code object if the same source was compiled before.
+
+        Args:
+            code (str): Source code of the cell.
+
+        Raises:
+            SyntaxError: If the code could not be compiled.
+
+        Returns:
+            CodeType: Compiled code object.
+        """
+        key = hashlib.sha256(code.encode()).hexdigest()
+        with self._lock:
+            code_object = self._code_objects.get(key)
+            if code_object is not None:
+                self._code_objects.move_to_end(key)
+                return code_object
+
+        code_object = compile(code, "<string>", "exec")
+
+        with self._lock:
+            self._code_objects[key] = code_object
+            while len(self._code_objects) > self.max_size:
+                self._code_objects.popitem(last=False)
+        return code_object
+
+    def __len__(self) -> int:
+        return len(self._code_objects)
+
+
+# Each process, including each pool worker, keeps its own cache
+compile_cache = CompileCache()
+
+
+def compile_code(code: str) -> CodeType:
+    """Compile cell code using the process-wide compile cache.
+
+    Args:
+        code (str): Source code of the cell.
+
+    Raises:
+        SyntaxError: If the code could not be compiled.
+
+    Returns:
+        CodeType: Compiled code object.
+    """
+    return compile_cache.compile(code)
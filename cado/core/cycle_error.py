@@ -0,0 +1,16 @@
+from typing import List
+from uuid import UUID
+
+
+class CycleError(ValueError):
+    """Raised when a change to cell inputs would make the cell dependencies cyclic."""
+
+    def __init__(self, cycle: List[UUID]):
+        """Create a cycle error.
+
+        Args:
+            cycle (List[UUID]): IDs of the cells in the cycle, each an input to the next, and the last an input to
+                the first.
+        """
+        super().__init__("Cycle found in cell dependencies")
+        self.cycle = cycle
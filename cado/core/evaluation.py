@@ -0,0 +1,8 @@
+from enum import Enum
+
+
+class Evaluation(Enum):
+    # Running a cell runs all of its descendants
+    EAGER = "eager"
+    # Running a cell only marks its descendants expired, and they run when their outputs are pulled
+    LAZY = "lazy"
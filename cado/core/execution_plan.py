@@ -0,0 +1,10 @@
+from typing import List, Optional
+from uuid import UUID
+
+from pydantic import BaseModel
+
+
+class ExecutionPlan(BaseModel):
+    # Cell that was run, or None for a run of several cells or of the whole notebook
+    cell_id: Optional[UUID] = None
+    cell_ids: List[UUID] = []
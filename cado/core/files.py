@@ -0,0 +1,28 @@
+import os
+from pathlib import Path
+from uuid import uuid4
+
+
+def write_text_atomic(filepath: Path, text: str, fsync: bool = True) -> None:
+    """Write a text file atomically.
+
+    The text is written to a temporary file in the same directory, which is then renamed over the target. A crash
+    while writing leaves either the old file or the new file, never a truncated one.
+
+    Args:
+        filepath (Path): Path of the file to write.
+        text (str): Text to write.
+        fsync (bool): Whether to flush the file to disk before renaming it.
+    """
+    temp_filepath = filepath.with_name(f".{filepath.name}.{uuid4().hex}.tmp")
+    fd = os.open(temp_filepath, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o666)
+    try:
+        with os.fdopen(fd, "w") as f:
+            f.write(text)
+            if fsync:
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(temp_filepath, filepath)
+    except BaseException:
+        temp_filepath.unlink(missing_ok=True)
+        raise
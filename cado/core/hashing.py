@@ -0,0 +1,43 @@
+import hashlib
+import json
+from typing import Any, Dict
+
+from cado.core.binary_output import hash_binary, is_binary
+
+
+def hash_output(output: Any) -> str:
+    """Hash a JSON serializable or binary cell output.
+
+    Args:
+        output (Any): The cell output.
+
+    Returns:
+        str: Hex digest of the output.
+    """
+    if is_binary(output):
+        return hash_binary(output)
+    try:
+        output_json = json.dumps(output, sort_keys=True, separators=(",", ":"))
+    except TypeError:
+        # Keys of mixed types can't be sorted
+        output_json = json.dumps(output, separators=(",", ":"))
+    return hashlib.sha256(output_json.encode()).hexdigest()
+
+
+def hash_cell_inputs(code: str, output_name: str, input_hashes: Dict[str, str]) -> str:
+    """Hash everything that determines the result of running a cell.
+
+    Args:
+        code (str): Code of the cell.
+        output_name (str): Output name of the cell.
+        input_hashes (Dict[str, str]): Hashes of the parent outputs keyed by output name.
+
+    Returns:
+        str: Hex digest of the cell inputs.
+    """
+    key_json = json.dumps({
+        "code": code,
+        "output_name": output_name,
+        "inputs": input_hashes,
+    }, sort_keys=True)
+    return hashlib.sha256(key_json.encode()).hexdigest()
@@ -0,0 +1,94 @@
+import json
+import re
+from typing import Any, Dict, TextIO
+
+HEADER_CHUNK_SIZE = 4096
+
+_WHITESPACE_REGEX = re.compile(r"[ \t\n\r]*")
+_DECODER = json.JSONDecoder()
+
+
+def read_header(f: TextIO, stop_key: str = "cells") -> Dict[str, Any]:
+    """Read the top-level fields of a JSON object up to a given key, without parsing the rest of the file.
+
+    Args:
+        f (TextIO): File containing a JSON object.
+        stop_key (str): Key at which to stop reading.
+
+    Returns:
+        Dict[str, Any]: Fields that come before the stop key.
+
+    Raises:
+        ValueError: If the file does not contain a JSON object.
+    """
+    reader = _HeaderReader(f)
+    header: Dict[str, Any] = {}
+    if reader.read_char() != "{":
+        raise ValueError("Expected a JSON object")
+    if reader.peek_char() == "}":
+        return header
+    while True:
+        key = reader.read_value()
+        if key == stop_key:
+            return header
+        if reader.read_char() != ":":
+            raise ValueError("Expected ':' after object key")
+        header[key] = reader.read_value()
+        char = reader.read_char()
+        if char == "}":
+            return header
+        if char != ",":
+            raise ValueError("Expected ',' or '}' after object value")
+
+
+class _HeaderReader:
+    """Reads JSON tokens from a file in chunks, so that only the start of the file is read."""
+
+    def __init__(self, f: TextIO):
+        self._f = f
+        self._buffer = ""
+        self._pos = 0
+
+    def peek_char(self) -> str:
+        """Get the next non-whitespace character without consuming it."""
+        self._skip_whitespace()
+        if self._pos >= len(self._buffer):
+            raise ValueError("Unexpected end of file")
+        return self._buffer[self._pos]
+
+    def read_char(self) -> str:
+        """Consume the next non-whitespace character."""
+        char = self.peek_char()
+        self._pos += 1
+        return char
+
+    def read_value(self) -> Any:
+        """Consume the next JSON value, reading more of the file until it is complete."""
+        self._skip_whitespace()
+        while True:
+            try:
+                value, end = _DECODER.raw_decode(self._buffer, self._pos)
+            except json.JSONDecodeError:
+                if not self._fill():
+                    raise
+                continue
+            # A number at the end of the buffer may continue in the next chunk
+            if end == len(self._buffer) and self._fill():
+                continue
+            self._pos = end
+            return value
+
+    def _skip_whitespace(self) -> None:
+        while True:
+            match = _WHITESPACE_REGEX.match(self._buffer, self._pos)
+            self._pos = match.end() if match is not None else self._pos
+            if self._pos < len(self._buffer) or not self._fill():
+                return
+
+    def _fill(self) -> bool:
+        chunk = self._f.read(HEADER_CHUNK_SIZE)
+        if chunk == "":
+            return False
+        self._buffer = self._buffer[self._pos:] + chunk
+        self._pos = 0
+        return True
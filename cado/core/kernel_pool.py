@@ -0,0 +1,98 @@
+import importlib
+import logging
+import multiprocessing
+import sys
+import time
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, wait
+from multiprocessing.context import BaseContext
+from typing import Iterable, List
+
+logger = logging.getLogger(__name__)
+
+# Modules that every worker needs to run cells, preloaded along with any configured modules
+KERNEL_MODULES = ["cado.core.cell"]
+
+
+def preload_modules(modules: Iterable[str]) -> List[str]:
+    """Import modules so that cells importing them later do not pay the import cost.
+
+    Args:
+        modules (Iterable[str]): Names of the modules to import.
+
+    Returns:
+        List[str]: Names of the modules that could not be imported.
+    """
+    failed = []
+    for module in modules:
+        try:
+            importlib.import_module(module)
+        # pylint: disable=broad-exception-caught
+        except Exception:
+            logger.warning("Could not preload module %s", module)
+            failed.append(module)
+    return failed
+
+
+def create_kernel_pool(workers: int, preload: List[str]) -> ProcessPoolExecutor:
+    """Create a pool of worker processes with modules already imported, and wait for the workers to start.
+
+    Where the platform supports it, workers are forked from a fork server that imported the modules once, so a
+    new worker is ready in milliseconds. Otherwise each worker is spawned and imports the modules itself.
+
+    Args:
+        workers (int): Number of worker processes.
+        preload (List[str]): Names of modules to import before any cell runs.
+
+    Returns:
+        ProcessPoolExecutor: The started pool.
+    """
+    modules = KERNEL_MODULES + preload
+    context: BaseContext
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context("forkserver")
+        context.set_forkserver_preload(modules)
+    else:
+        context = multiprocessing.get_context("spawn")
+
+    start_time = time.perf_counter()
+    executor = ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=context,
+        initializer=preload_modules,
+        initargs=(modules,),
+    )
+    wait(warm_kernels(executor, workers, []))
+    logger.info("Started %d workers in %.2fs", workers, time.perf_counter() - start_time)
+    return executor
+
+
+def shutdown_kernel_pool(executor: ProcessPoolExecutor) -> None:
+    """Stop a pool of worker processes, cancelling cells that have not started yet where the platform allows.
+
+    Cells that are already running in a worker are not interrupted, so shutdown waits for them to finish.
+
+    Args:
+        executor (ProcessPoolExecutor): Pool of worker processes.
+    """
+    # Cancelling queued work on shutdown needs Python 3.9, and runs that were cancelled already cancelled theirs
+    if sys.version_info >= (3, 9):
+        executor.shutdown(wait=True, cancel_futures=True)
+    else:
+        executor.shutdown(wait=True)
+
+
+def warm_kernels(executor: Executor, workers: int, modules: List[str]) -> List["Future[List[str]]"]:
+    """Import modules in the pool's workers.
+
+    Tasks are spread over the workers on a best-effort basis, so a worker that misses them imports the modules
+    the first time a cell needs them.
+
+    Args:
+        executor (Executor): Pool of worker processes.
+        workers (int): Number of worker processes in the pool.
+        modules (List[str]): Names of modules to import.
+
+    Returns:
+        List[Future[List[str]]]: One future per task, each giving the modules that could not be imported.
+    """
+    return [executor.submit(preload_modules, modules) for _ in range(workers)]
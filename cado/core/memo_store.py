@@ -0,0 +1,136 @@
+import json
+import logging
+import os
+import threading
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+from cado.core.binary_output import is_binary
+from cado.core.cell import CellResult
+from cado.core.files import write_text_atomic
+
+logger = logging.getLogger(__name__)
+
+MEMO_DIRNAME = ".cado-memo"
+DEFAULT_MAX_BYTES = 1024 * 1024 * 1024
+
+
+class MemoStore:
+    """On-disk store of cell results keyed by a hash of the cell code and parent outputs.
+
+    Entries are evicted least recently used first, using file modification times, once the total size of the
+    store goes over its budget.
+    """
+
+    def __init__(self, dirpath: Path, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.dirpath = dirpath
+        self.max_bytes = max_bytes
+        self._total_bytes: Optional[int] = None
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[CellResult]:
+        """Get a memoized cell result.
+
+        Args:
+            key (str): Hash of the cell inputs.
+
+        Returns:
+            Optional[CellResult]: The memoized result, or None if there was no entry for the key.
+        """
+        filepath = self._get_filepath(key)
+        try:
+            with filepath.open() as f:
+                result_json = json.load(f)
+            os.utime(filepath)
+        except (OSError, ValueError):
+            return None
+        return CellResult(
+            output=result_json["output"],
+            output_size=result_json.get("output_size"),
+            stdout=result_json["stdout"],
+            stderr=result_json["stderr"],
+        )
+
+    def put(self, key: str, result: CellResult) -> None:
+        """Memoize a successful cell result, evicting old entries if the store is over budget.
+
+        Args:
+            key (str): Hash of the cell inputs.
+            result (CellResult): Result of running the cell.
+        """
+        if is_binary(result.output):
+            # Binary outputs are only kept in memory
+            logger.debug("Not memoizing binary result")
+            return
+
+        result_json = json.dumps({
+            "output": result.output,
+            "output_size": result.output_size,
+            "stdout": result.stdout,
+            "stderr": result.stderr,
+        })
+        size = len(result_json.encode())
+        if size > self.max_bytes:
+            logger.debug("Not memoizing result of %d bytes, over budget of %d", size, self.max_bytes)
+            return
+
+        self.dirpath.mkdir(parents=True, exist_ok=True)
+        write_text_atomic(self._get_filepath(key), result_json, fsync=False)
+
+        with self._lock:
+            if self._total_bytes is None:
+                self._total_bytes = sum(size for _, size in self._list_entries().values())
+            else:
+                self._total_bytes += size
+            if self._total_bytes > self.max_bytes:
+                self._evict()
+
+    def _evict(self) -> None:
+        entries = sorted(self._list_entries().items(), key=lambda item: item[1][0])
+        total_bytes = sum(size for _, (_, size) in entries)
+        for filepath, (_, size) in entries:
+            if total_bytes <= self.max_bytes:
+                break
+            logger.debug("Evicting memoized result %s", filepath.name)
+            filepath.unlink(missing_ok=True)
+            total_bytes -= size
+        self._total_bytes = total_bytes
+
+    def _list_entries(self) -> Dict[Path, Tuple[float, int]]:
+        entries = {}
+        for filepath in self.dirpath.glob("*.json"):
+            try:
+                stat = filepath.stat()
+            except OSError:
+                continue
+            entries[filepath] = (stat.st_mtime, stat.st_size)
+        return entries
+
+    def _get_filepath(self, key: str) -> Path:
+        return self.dirpath / f"{key}.json"
+
+
+_memo_stores: Dict[Path, MemoStore] = {}
+_memo_stores_lock = threading.Lock()
+
+
+def get_memo_store(notebook_filepath: Path, max_bytes: int = DEFAULT_MAX_BYTES) -> MemoStore:
+    """Get the memo store for the directory of a notebook file.
+
+    Notebooks in the same directory share one store, and one MemoStore instance per process.
+
+    Args:
+        notebook_filepath (Path): Filepath to a .cado notebook file.
+        max_bytes (int): Size budget for the store.
+
+    Returns:
+        MemoStore: The memo store.
+    """
+    dirpath = notebook_filepath.resolve().parent / MEMO_DIRNAME
+    with _memo_stores_lock:
+        memo_store = _memo_stores.get(dirpath)
+        if memo_store is None:
+            memo_store = MemoStore(dirpath, max_bytes=max_bytes)
+            _memo_stores[dirpath] = memo_store
+        memo_store.max_bytes = max_bytes
+        return memo_store
@@ -1,21 +1,47 @@
+import heapq
 import json
 import logging
+import threading
+import traceback
+from concurrent.futures import Executor
 from datetime import datetime
 from pathlib import Path
-from typing import Any, Dict, Iterator, List, Optional
+from typing import Any, Callable, Dict, Iterator, List, Optional, Set, Tuple
 from uuid import UUID, uuid4
 
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, PrivateAttr
 
+from cado.core.cancel_token import CancelToken
 from cado.core.cell import Cell
 from cado.core.cell_status import CellStatus
+from cado.core.compile_cache import compile_code
+from cado.core.cycle_error import CycleError
+from cado.core.evaluation import Evaluation
+from cado.core.execution_plan import ExecutionPlan
+from cado.core.files import write_text_atomic
+from cado.core.json_header import read_header
 from cado.core.language import Language
+from cado.core.memo_store import MemoStore
+from cado.core.output_size import get_output_size
+from cado.core.output_store import OutputStore
+from cado.core.plan_runner import PlanRunner
 
 logger = logging.getLogger(__name__)
 
-CURRENT_VERSION = "0.1"
+CURRENT_VERSION = "0.2"
+# Versions that can still be loaded, and are migrated to the current version when saved
+SUPPORTED_VERSIONS = ["0.1", CURRENT_VERSION]
 
+# Maximum approximate size of the results that cleared cells keep aside in a notebook
+MAX_PREVIOUS_SIZE = 1 << 28
 
+# Notebook ID of each notebook file read by find_shared_output_refs, keyed by filepath, with its output references
+# if the file was read in full
+_file_output_refs: Dict[Path, Tuple[Tuple[int, int], Optional[str], Optional[Set[str]]]] = {}
+_file_output_refs_lock = threading.Lock()
+
+
+# pylint: disable=too-many-public-methods
 class Notebook(BaseModel):
     id: UUID = Field(default_factory=uuid4)
     name: str
@@ -23,6 +49,19 @@ class Notebook(BaseModel):
     created: datetime = Field(default_factory=datetime.now)
     updated: datetime = Field(default_factory=datetime.now)
     cells: List[Cell] = []
+    # Modules to import before running cells, so that cells importing them start quickly
+    preload: List[str] = []
+    evaluation: Evaluation = Evaluation.EAGER
+
+    # Graph index over the cells, kept in sync by the methods below. Cells should only be
+    # mutated through the notebook so that the index does not go stale.
+    _cells_by_id: Dict[UUID, Cell] = PrivateAttr(default_factory=dict)
+    _cells_by_output_name: Dict[str, Cell] = PrivateAttr(default_factory=dict)
+    _cells_by_input_name: Dict[str, Dict[UUID, Cell]] = PrivateAttr(default_factory=dict)
+
+    def __init__(self, **data: Any) -> None:
+        super().__init__(**data)
+        self._index_cells()
 
     def update_cell_output_name(self, cell_id: UUID, output_name: str) -> None:
         """Set a notebook cell's output name.
@@ -32,24 +71,16 @@ class Notebook(BaseModel):
             output_name (str): Name for the output variable.
         """
         self.clear_cell(cell_id)
-
-        output_names = set()
-        for cell in self.cells:
-            if cell.id != cell_id and cell.output_name != "":
-                output_names.add(cell.output_name)
-
         cell = self.get_cell(cell_id)
 
-        for child in self._get_children(cell):
-            child.clear()
-
-        if output_name in output_names:
+        existing = self._cells_by_output_name.get(output_name)
+        if output_name != "" and existing is not None and existing.id != cell_id:
             error = ValueError(f"Cell with output name \"{output_name}\" already exists in the notebook")
             self.error_cell(cell.id, error)
-            cell.output_name = ""
+            self._set_output_name(cell, "")
             raise error
 
-        cell.output_name = output_name
+        self._set_output_name(cell, output_name)
 
     def update_cell_input_names(self, cell_id: UUID, input_names: List[str]) -> None:
         """Set a notebook cell's input names.
@@ -58,33 +89,30 @@ class Notebook(BaseModel):
             cell_id (UUID): ID of the cell.
             input_names (List[str]): Names for the input variables.
         """
-        self._check_no_self_ancestor(cell_id, cell_id, input_names)
+        self._check_no_self_ancestor(cell_id, input_names)
         self.clear_cell(cell_id)
 
-        output_names = set()
-        for cell in self.cells:
-            if cell.id != cell_id and cell.output_name != "":
-                output_names.add(cell.output_name)
-
         cell = self.get_cell(cell_id)
         for input_name in input_names:
             if input_name == cell.output_name:
                 error = ValueError("A cell cannot have its own output as input")
                 self.error_cell(cell.id, error)
-                cell.input_names = []
+                self._set_input_names(cell, [])
                 raise error
 
-            if input_name not in output_names:
+            if input_name not in self._cells_by_output_name:
                 error = ValueError(f"No cell with output name \"{input_name}\"")
                 self.error_cell(cell.id, error)
-                cell.input_names = []
+                self._set_input_names(cell, [])
                 raise error
 
-        cell.input_names = input_names
+        self._set_input_names(cell, input_names)
 
     def set_cell_code(self, cell_id: UUID, code: str) -> None:
         """Set a notebook cell's code.
 
+        Python code is compiled straight away so that syntax errors show up on the cell without running it.
+
         Args:
             cell_id (UUID): ID of the cell.
             code (str): String of code to set on the cell.
@@ -93,16 +121,23 @@ class Notebook(BaseModel):
         cell.code = code
         self.clear_cell(cell.id)
 
+        if cell.language == Language.PYTHON and code != "":
+            try:
+                compile_code(code)
+            except (SyntaxError, ValueError) as exc:
+                message = "".join(traceback.format_exception_only(type(exc), exc))
+                self.error_cell(cell.id, ValueError(f"Failed to compile: {message}"))
+
     def get_cell(self, cell_id: UUID) -> Cell:
         """Get a cell from the notebook.
 
         Args:
             cell_id (UUID): ID of the cell to get from the notebook.
         """
-        for cell in self.cells:
-            if cell.id == cell_id:
-                return cell
-        raise ValueError(f"No cell with ID {cell_id} found in notebook")
+        cell = self._cells_by_id.get(cell_id)
+        if cell is None:
+            raise ValueError(f"No cell with ID {cell_id} found in notebook")
+        return cell
 
     def delete_cell(self, cell_id: UUID) -> None:
         """Delete a cell from the notebook.
@@ -110,7 +145,11 @@ class Notebook(BaseModel):
         Args:
             cell_id (UUID): ID of the cell to delete from the notebook.
         """
-        self.cells = [c for c in self.cells if c.id != cell_id]
+        cell = self._cells_by_id.get(cell_id)
+        if cell is None:
+            return
+        self.cells.remove(cell)
+        self._unindex_cell(cell)
 
     def add_cell(self, index: Optional[int] = None) -> UUID:
         """Add a cell to the notebook.
@@ -126,58 +165,294 @@ class Notebook(BaseModel):
             self.cells.append(new_cell)
         else:
             self.cells.insert(index, new_cell)
+        self._index_cell(new_cell)
         return new_cell.id
 
-    def _get_children(self, cell: Cell) -> Iterator[Cell]:
-        for other in self.cells:
-            for input_name in other.input_names:
-                if input_name == cell.output_name:
-                    yield other
+    def _index_cells(self) -> None:
+        self._cells_by_id = {}
+        self._cells_by_output_name = {}
+        self._cells_by_input_name = {}
+        for cell in self.cells:
+            self._index_cell(cell)
+
+    def _index_cell(self, cell: Cell) -> None:
+        self._cells_by_id[cell.id] = cell
+        if cell.output_name != "":
+            self._cells_by_output_name[cell.output_name] = cell
+        for input_name in cell.input_names:
+            self._cells_by_input_name.setdefault(input_name, {})[cell.id] = cell
+
+    def _unindex_cell(self, cell: Cell) -> None:
+        self._cells_by_id.pop(cell.id, None)
+        if self._cells_by_output_name.get(cell.output_name) is cell:
+            del self._cells_by_output_name[cell.output_name]
+        for input_name in cell.input_names:
+            children = self._cells_by_input_name.get(input_name, {})
+            children.pop(cell.id, None)
+            if len(children) == 0:
+                self._cells_by_input_name.pop(input_name, None)
+
+    def _set_output_name(self, cell: Cell, output_name: str) -> None:
+        self._unindex_cell(cell)
+        cell.output_name = output_name
+        self._index_cell(cell)
+
+    def _set_input_names(self, cell: Cell, input_names: List[str]) -> None:
+        self._unindex_cell(cell)
+        cell.input_names = input_names
+        self._index_cell(cell)
+
+    def get_children(self, cell: Cell) -> Iterator[Cell]:
+        """Get the cells that take a cell's output as an input.
+
+        Args:
+            cell (Cell): The parent cell.
+
+        Returns:
+            Iterator[Cell]: The child cells.
+        """
+        if cell.output_name == "":
+            return
+        yield from list(self._cells_by_input_name.get(cell.output_name, {}).values())
+
+    def get_parents(self, cell: Cell) -> Iterator[Cell]:
+        """Get the cells whose outputs a cell takes as inputs.
+
+        Args:
+            cell (Cell): The child cell.
+
+        Returns:
+            Iterator[Cell]: The parent cells.
+        """
+        seen = set()
+        for input_name in cell.input_names:
+            parent = self._cells_by_output_name.get(input_name)
+            if parent is not None and parent.id not in seen:
+                seen.add(parent.id)
+                yield parent
+
+    def _check_no_self_ancestor(self, cell_id: UUID, input_names: List[str]) -> None:
+        cycle = self._find_cycle(cell_id, input_names)
+        if cycle is not None:
+            error = CycleError(cycle)
+            self.error_cell(cell_id, error)
+            raise error
+
+    def _find_cycle(self, cell_id: UUID, input_names: List[str]) -> Optional[List[UUID]]:
+        """Find the cycle that giving a cell new inputs would create, visiting each ancestor at most once.
+
+        Args:
+            cell_id (UUID): ID of the cell.
+            input_names (List[str]): New input names for the cell.
+
+        Returns:
+            Optional[List[UUID]]: IDs of the cells in the cycle starting from the cell, or None if there is no cycle.
+        """
+        # Maps each visited ancestor to the cell it is an input to, on the way back to the cell
+        next_cell_ids: Dict[UUID, UUID] = {}
+        stack: List[Cell] = []
+        for input_name in input_names:
+            parent = self._cells_by_output_name.get(input_name)
+            if parent is not None and parent.id != cell_id and parent.id not in next_cell_ids:
+                next_cell_ids[parent.id] = cell_id
+                stack.append(parent)
+
+        while len(stack) > 0:
+            ancestor = stack.pop()
+            for parent in self.get_parents(ancestor):
+                if parent.id == cell_id:
+                    cycle = [cell_id]
+                    current_id = ancestor.id
+                    while current_id != cell_id:
+                        cycle.append(current_id)
+                        current_id = next_cell_ids[current_id]
+                    return cycle
+                if parent.id not in next_cell_ids:
+                    next_cell_ids[parent.id] = ancestor.id
+                    stack.append(parent)
+        return None
+
+    def plan_run(self, cell_id: UUID) -> ExecutionPlan:
+        """Plan which cells need to run, and in which order, when running a cell.
+
+        The plan contains the cell, all of its descendants unless the notebook is lazy, and any ancestors that do
+        not have OK status. Cells are ordered topologically, with ties broken by position in the notebook.
+
+        Args:
+            cell_id (UUID): ID of the cell to run.
+
+        Returns:
+            ExecutionPlan: The plan for running the cell.
+        """
+        return self.plan_run_cells([cell_id])
+
+    def plan_run_cells(self, cell_ids: List[UUID], pull_cell_ids: Optional[List[UUID]] = None) -> ExecutionPlan:
+        """Plan running several cells together, so that cells they have in common only run once.
+
+        The plan is planned as for plan_run, starting from all of the cells at once. Pulled cells are only planned
+        if they do not have OK status, and never bring in their descendants.
+
+        Args:
+            cell_ids (List[UUID]): IDs of the cells to run.
+            pull_cell_ids (Optional[List[UUID]]): IDs of cells whose outputs are needed.
+
+        Returns:
+            ExecutionPlan: The plan for running the cells.
+        """
+        planned: Dict[UUID, Cell] = {}
+        for cell_id in cell_ids:
+            cell = self.get_cell(cell_id)
+            planned[cell.id] = cell
+
+        if self.evaluation == Evaluation.EAGER:
+            stack = list(planned.values())
+            while len(stack) > 0:
+                for child in self.get_children(stack.pop()):
+                    if child.id not in planned:
+                        planned[child.id] = child
+                        stack.append(child)
+
+        for cell_id in pull_cell_ids or []:
+            cell = self.get_cell(cell_id)
+            if cell.status != CellStatus.OK:
+                planned[cell.id] = cell
+
+        stack = list(planned.values())
+        while len(stack) > 0:
+            for parent in self.get_parents(stack.pop()):
+                if parent.id not in planned and parent.status != CellStatus.OK:
+                    planned[parent.id] = parent
+                    stack.append(parent)
+
+        plan_cell_id = cell_ids[0] if len(cell_ids) == 1 else None
+        return ExecutionPlan(cell_id=plan_cell_id, cell_ids=self._order_cells(planned))
+
+    def plan_run_all(self, output_names: Optional[List[str]] = None) -> ExecutionPlan:
+        """Plan running every Python cell in the notebook, or only the cells needed to compute some outputs.
+
+        Args:
+            output_names (Optional[List[str]]): Output names of the cells to compute, along with all of their
+                ancestors. Every Python cell with code is planned if not given.
+
+        Returns:
+            ExecutionPlan: The plan for running the cells.
+        """
+        if output_names is None:
+            planned = {c.id: c for c in self.cells if c.language == Language.PYTHON and c.code != ""}
+            return ExecutionPlan(cell_ids=self._order_cells(planned))
+
+        planned = {}
+        for output_name in output_names:
+            cell = self._cells_by_output_name.get(output_name)
+            if cell is None:
+                raise ValueError(f"No cell with output name \"{output_name}\"")
+            planned[cell.id] = cell
+
+        stack = list(planned.values())
+        while len(stack) > 0:
+            for parent in self.get_parents(stack.pop()):
+                if parent.id not in planned:
+                    planned[parent.id] = parent
+                    stack.append(parent)
+        return ExecutionPlan(cell_ids=self._order_cells(planned))
+
+    def _order_cells(self, planned: Dict[UUID, Cell]) -> List[UUID]:
+        """Order cells topologically, with ties broken by position in the notebook.
 
-    def _get_parents(self, cell: Cell) -> Iterator[Cell]:
-        for other in self.cells:
-            for input_name in cell.input_names:
-                if other.output_name == input_name:
-                    yield other
+        Args:
+            planned (Dict[UUID, Cell]): The cells to order by ID.
 
-    def _check_no_self_ancestor(
+        Returns:
+            List[UUID]: IDs of the cells in order.
+        """
+        positions = {c.id: i for i, c in enumerate(self.cells)}
+        in_degrees: Dict[UUID, int] = {}
+        for planned_cell in planned.values():
+            in_degrees[planned_cell.id] = sum(1 for p in self.get_parents(planned_cell) if p.id in planned)
+
+        ready: List[Tuple[int, UUID]] = [(positions[i], i) for i, degree in in_degrees.items() if degree == 0]
+        heapq.heapify(ready)
+        cell_ids = []
+        while len(ready) > 0:
+            _, ready_id = heapq.heappop(ready)
+            cell_ids.append(ready_id)
+            for child in self.get_children(planned[ready_id]):
+                if child.id in planned:
+                    in_degrees[child.id] -= 1
+                    if in_degrees[child.id] == 0:
+                        heapq.heappush(ready, (positions[child.id], child.id))
+        return cell_ids
+
+    def run_cell(
         self,
-        target_cell_id: UUID,
-        current_cell_id: UUID,
-        input_names: List[str],
-    ) -> None:
-        for cell in self.cells:
-            if cell.id != current_cell_id:
-                for input_name in input_names:
-                    if input_name == cell.output_name:
-                        if cell.id == target_cell_id:
-                            error = ValueError("Cycle found in cell dependencies")
-                            self.error_cell(target_cell_id, error)
-                            raise error
-                        self._check_no_self_ancestor(target_cell_id, cell.id, cell.input_names)
-
-    def run_cell(self, cell_id: UUID) -> None:
+        cell_id: UUID,
+        executor: Optional[Executor] = None,
+        memo_store: Optional[MemoStore] = None,
+        cancel_token: Optional[CancelToken] = None,
+        on_output: Optional[Callable[[UUID, str, str], None]] = None,
+    ) -> ExecutionPlan:
         """Run a cell in the notebook.
 
+        Each cell in the execution plan is run exactly once. If a cell fails then its descendants in the plan
+        are cleared instead of run, and the first error is raised once the rest of the plan has finished.
+
         Args:
             cell_id (UUID): ID of the cell to run.
+            executor (Optional[Executor]): Executor to run independent cells in parallel, usually a process pool.
+            memo_store (Optional[MemoStore]): Store of memoized results used to skip running unchanged cells.
+            cancel_token (Optional[CancelToken]): Token used to cancel the run from another thread.
+            on_output (Optional[Callable[[UUID, str, str], None]]): Called with the cell ID, stream name and text
+                as cells running in-process write to stdout or stderr.
+
+        Returns:
+            ExecutionPlan: The plan that was run.
         """
-        cell = self.get_cell(cell_id)
+        return self.run_cells([cell_id], executor=executor, memo_store=memo_store, cancel_token=cancel_token,
+                              on_output=on_output)
 
-        context: Dict[str, Any] = {}
-        for parent in self._get_parents(cell):
-            if parent.status in [CellStatus.EXPIRED, CellStatus.ERROR]:
-                self.run_cell(parent.id)
-            if parent.status == CellStatus.ERROR:
-                raise ValueError("Parent cell does not have OK status, could not run child cell")
-            context[parent.output_name] = parent.output
+    # pylint: disable=too-many-arguments
+    def run_cells(
+        self,
+        cell_ids: List[UUID],
+        executor: Optional[Executor] = None,
+        memo_store: Optional[MemoStore] = None,
+        cancel_token: Optional[CancelToken] = None,
+        on_output: Optional[Callable[[UUID, str, str], None]] = None,
+        pull_cell_ids: Optional[List[UUID]] = None,
+    ) -> ExecutionPlan:
+        """Run several cells in the notebook in a single pass, as for run_cell.
+
+        Cells that are only pulled are brought up to date, reusing their earlier results where their inputs are
+        unchanged, without running their descendants.
 
-        logger.debug("Running cell %s", cell.id)
-        cell.run(context)
+        Args:
+            cell_ids (List[UUID]): IDs of the cells to run.
+            executor (Optional[Executor]): Executor to run independent cells in parallel, usually a process pool.
+            memo_store (Optional[MemoStore]): Store of memoized results used to skip running unchanged cells.
+            cancel_token (Optional[CancelToken]): Token used to cancel the run from another thread.
+            on_output (Optional[Callable[[UUID, str, str], None]]): Called with the cell ID, stream name and text
+                as cells running in-process write to stdout or stderr.
+            pull_cell_ids (Optional[List[UUID]]): IDs of cells whose outputs are needed.
 
-        if cell.status == CellStatus.OK:
-            for child in self._get_children(cell):
-                self.run_cell(child.id)
+        Returns:
+            ExecutionPlan: The plan that was run.
+        """
+        plan = self.plan_run_cells(cell_ids, pull_cell_ids=pull_cell_ids)
+        try:
+            PlanRunner(
+                self,
+                plan,
+                executor=executor,
+                memo_store=memo_store,
+                cancel_token=cancel_token,
+                on_output=on_output,
+                always_run=cell_ids,
+            ).run()
+        finally:
+            if self.evaluation == Evaluation.LAZY:
+                # Descendants left out of the plan may depend on outputs that changed
+                self._clear_descendants(*[self.get_cell(cell_id) for cell_id in plan.cell_ids])
+        return plan
 
     def update_cell_language(self, cell_id: UUID, language: Language) -> None:
         """Run a cell in the notebook.
@@ -198,21 +473,43 @@ class Notebook(BaseModel):
         """
         cell = self.get_cell(cell_id)
         cell.set_error(error)
+        self._clear_descendants(cell)
 
-        for child in self._get_children(cell):
-            self.clear_cell(child.id)
-
-    def clear_cell(self, cell_id: UUID) -> None:
+    def clear_cell(self, cell_id: UUID, keep_previous: bool = True) -> None:
         """Clear a cell in the notebook.
 
+        Descendants of the cell are cleared too, and keep their outputs aside in case the cell's output turns out
+        to be unchanged when it next runs.
+
         Args:
             cell_id (UUID): ID of the cell to clear.
+            keep_previous (bool): Whether the cell keeps its own outputs aside, rather than dropping them as when
+                the user clears it.
         """
         cell = self.get_cell(cell_id)
-        cell.clear()
-
-        for child in self._get_children(cell):
-            self.clear_cell(child.id)
+        cell.clear(keep_previous=keep_previous)
+        self._clear_descendants(cell)
+
+    def _clear_descendants(self, *cells: Cell) -> None:
+        # Each descendant is cleared once, however many paths lead to it
+        visited = {cell.id for cell in cells}
+        stack = list(cells)
+        while len(stack) > 0:
+            for child in self.get_children(stack.pop()):
+                if child.id not in visited:
+                    visited.add(child.id)
+                    child.clear()
+                    stack.append(child)
+        self._limit_previous_results()
+
+    def _limit_previous_results(self) -> None:
+        # Drop the largest results kept aside until the rest fit in the budget
+        cells = sorted((cell for cell in self.cells if cell.previous_size > 0), key=lambda cell: cell.previous_size)
+        size = sum(cell.previous_size for cell in cells)
+        while size > MAX_PREVIOUS_SIZE:
+            cell = cells.pop()
+            size -= cell.previous_size
+            cell.discard_previous()
 
     def reorder_cells(self, cell_ids: List[UUID]) -> None:
         """Reorder cells in the notebook.
@@ -225,15 +522,70 @@ class Notebook(BaseModel):
             cell = self.get_cell(cell_id)
             new_cells.append(cell)
         self.cells = new_cells
+        self._index_cells()
+
+    def snapshot(self) -> "Notebook":
+        """Copy the notebook so that changes made after this can be rolled back.
+
+        Cells are copied shallowly, so the copy shares their outputs instead of duplicating them.
+
+        Returns:
+            Notebook: The copy, to pass to rollback.
+        """
+        return self.copy(update={"cells": [cell.copy() for cell in self.cells]})
+
+    def rollback(self, snapshot: "Notebook") -> None:
+        """Undo every change made to the notebook since a snapshot was taken.
+
+        Args:
+            snapshot (Notebook): Copy of the notebook from snapshot, which must not be used afterwards.
+        """
+        self.__dict__.update(snapshot.__dict__)
+        self._index_cells()
 
     def set_updated_time(self) -> None:
         """Set the updated time to now."""
         self.updated = datetime.now()
 
+    def load_outputs(self) -> None:
+        """Load the outputs of all cells that have not been loaded yet."""
+        for cell in self.cells:
+            cell.load_outputs()
+
+    def discard_previous_results(self) -> None:
+        """Drop the results that cleared cells keep aside, at the cost of running those cells again."""
+        for cell in self.cells:
+            cell.discard_previous()
+
+    def estimate_size(self) -> int:
+        """Estimate the memory used by the notebook, counting the code and loaded outputs of its cells, and the
+        results that cleared cells keep aside.
+
+        Returns:
+            int: The estimated size in bytes.
+        """
+        size = 0
+        for cell in self.cells:
+            size += len(cell.code) + cell.previous_size
+            if not cell.outputs_loaded:
+                continue
+            size += len(cell.stdout or "") + len(cell.stderr or "")
+            output_size = cell.output_size
+            if output_size is None and cell.output is not None:
+                try:
+                    output_size = get_output_size(cell.output_value)
+                except ValueError:
+                    output_size = 0
+            size += output_size or 0
+        return size
+
     @classmethod
     def from_filepath(cls, filepath: Path) -> "Notebook":
         """Load a notebook from a .cado notebook file.
 
+        Cell outputs are kept in the notebook's output store and are only loaded once they are needed. Notebooks
+        saved with an older version keep their outputs inline and are migrated the next time they are saved.
+
         Args:
             filepath (Path): Filepath to a .cado notebook file.
 
@@ -242,17 +594,96 @@ class Notebook(BaseModel):
         """
         with filepath.open() as f:
             notebook_json = json.load(f)
-            version = notebook_json["version"]
-            if version != CURRENT_VERSION:
-                raise ValueError(f"Cannot load notebook with version {version}")
-            return cls.parse_obj(notebook_json)
+        check_version(notebook_json["version"])
+        notebook = cls.parse_obj(notebook_json)
+        notebook.version = CURRENT_VERSION
+        output_store = OutputStore.for_notebook(filepath, notebook.id)
+        for cell in notebook.cells:
+            cell.defer_outputs(output_store)
+        return notebook
 
     def to_filepath(self, filepath: Path) -> None:
         """Save a notebook to a .cado notebook file.
 
+        Cell outputs are written to the notebook's output store, so the notebook file itself only holds the source.
+        Outputs that are already in the store are not written again, and outputs that neither this file nor a copy
+        of it refers to are removed. The file is replaced atomically, so a crash while saving cannot leave a
+        truncated notebook.
+
         Args:
             filepath (Path): Filepath to a .cado notebook file.
         """
-        with filepath.open("w") as f:
-            notebook_json = self.json()
-            f.write(notebook_json)
+        output_store = OutputStore.for_notebook(filepath, self.id)
+        output_refs = set()
+        for cell in self.cells:
+            output_ref = cell.store_outputs(output_store)
+            if output_ref is not None:
+                output_refs.add(output_ref)
+        write_text_atomic(filepath, self.json(exclude={"cells": {"__all__": {"output", "stdout", "stderr"}}}))
+        output_store.prune(output_refs | find_shared_output_refs(filepath, self.id))
+
+
+def check_version(version: str) -> None:
+    """Check that a notebook saved with a given version can be loaded.
+
+    Args:
+        version (str): Version the notebook was saved with.
+
+    Raises:
+        ValueError: If the version is not supported.
+    """
+    if version not in SUPPORTED_VERSIONS:
+        raise ValueError(f"Cannot load notebook with version {version}")
+
+
+def find_shared_output_refs(filepath: Path, notebook_id: UUID) -> Set[str]:
+    """Find the outputs that other notebook files in the same directory refer to in a notebook's output store.
+
+    The output store is keyed by notebook ID, so a notebook file that was copied shares its store with the copy.
+    Only the header of the other files is read to find their notebook IDs, and only copies are read in full.
+
+    Args:
+        filepath (Path): Filepath to the .cado notebook file, which is left out.
+        notebook_id (UUID): ID of the notebook.
+
+    Returns:
+        Set[str]: References to outputs in the store that other notebook files use.
+    """
+    refs: Set[str] = set()
+    for other_filepath in filepath.parent.glob("*.cado"):
+        if other_filepath != filepath:
+            refs |= _read_output_refs(other_filepath, str(notebook_id))
+    return refs
+
+
+def _read_output_refs(filepath: Path, notebook_id: str) -> Set[str]:
+    try:
+        stat = filepath.stat()
+    except OSError:
+        return set()
+    file_key = (stat.st_mtime_ns, stat.st_size)
+    with _file_output_refs_lock:
+        entry = _file_output_refs.get(filepath)
+    if entry is not None and entry[0] == file_key:
+        if entry[1] != notebook_id:
+            return set()
+        if entry[2] is not None:
+            return entry[2]
+
+    refs: Optional[Set[str]] = None
+    try:
+        with filepath.open() as f:
+            file_id = read_header(f).get("id")
+            if file_id is None or file_id == notebook_id:
+                f.seek(0)
+                notebook_json = json.load(f)
+                file_id = str(notebook_json["id"])
+                refs = {cell["output_ref"] for cell in notebook_json["cells"] if cell.get("output_ref") is not None}
+    except (OSError, ValueError, KeyError, TypeError):
+        logger.warning("Could not read output references from %s", filepath)
+        return set()
+    with _file_output_refs_lock:
+        _file_output_refs[filepath] = (file_key, file_id, refs)
+    if file_id != notebook_id or refs is None:
+        return set()
+    return refs
@@ -2,9 +2,10 @@ from datetime import datetime
 from pathlib import Path
 from uuid import UUID
 
-from pydantic import BaseModel
+from pydantic import BaseModel, ValidationError
 
-from cado.core.notebook import Notebook
+from cado.core.json_header import read_header
+from cado.core.notebook import Notebook, check_version
 
 
 class NotebookDetails(BaseModel):
@@ -18,12 +19,26 @@ class NotebookDetails(BaseModel):
     def from_filepath(cls, filepath: Path) -> "NotebookDetails":
         """Load notebook details from a .cado notebook file.
 
+        Only the notebook fields before the cells are read, unless the file was not written by cado and the cells
+        come first, in which case the whole notebook is loaded.
+
         Args:
             filepath (Path): Filepath to a .cado notebook file.
 
+        Raises:
+            ValueError: If the notebook was saved with a version that cannot be loaded.
+
         Returns:
             NotebookDetails: Loaded notebook details.
         """
+        with filepath.open() as f:
+            header = read_header(f)
+        if "version" in header:
+            check_version(header["version"])
+            try:
+                return NotebookDetails(filepath=filepath, **header)
+            except ValidationError:
+                pass
         notebook = Notebook.from_filepath(filepath)
         return NotebookDetails(
             id=notebook.id,
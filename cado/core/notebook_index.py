@@ -0,0 +1,69 @@
+import logging
+import threading
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+from cado.core.notebook_details import NotebookDetails
+
+logger = logging.getLogger(__name__)
+
+FileKey = Tuple[int, int]
+
+
+class NotebookIndex:
+    """Cache of notebook details, so that listing notebooks does not read every notebook file each time.
+
+    Entries are keyed by filepath and are read again whenever the file's modification time or size changes.
+    """
+
+    def __init__(self) -> None:
+        self._entries: Dict[Path, Tuple[FileKey, NotebookDetails]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, filepath: Path) -> NotebookDetails:
+        """Get the details of a notebook.
+
+        Args:
+            filepath (Path): Filepath to a .cado notebook file.
+
+        Returns:
+            NotebookDetails: Details of the notebook.
+        """
+        stat = filepath.stat()
+        file_key = (stat.st_mtime_ns, stat.st_size)
+        with self._lock:
+            entry = self._entries.get(filepath)
+        if entry is not None and entry[0] == file_key:
+            return entry[1]
+
+        logger.debug("Reading notebook details from %s", filepath)
+        details = NotebookDetails.from_filepath(filepath)
+        with self._lock:
+            self._entries[filepath] = (file_key, details)
+        return details
+
+    def list_notebooks(self, dirpath: Path) -> List[NotebookDetails]:
+        """List the details of all notebooks in a directory.
+
+        Args:
+            dirpath (Path): Directory to list.
+
+        Returns:
+            List[NotebookDetails]: Details of each notebook in the directory.
+        """
+        filepaths = [path for path in dirpath.iterdir() if path.is_file() and str(path).endswith(".cado")]
+        with self._lock:
+            existing = set(filepaths)
+            for filepath in list(self._entries):
+                if filepath.parent == dirpath and filepath not in existing:
+                    del self._entries[filepath]
+        return [self.get(filepath) for filepath in filepaths]
+
+    def remove(self, filepath: Path) -> None:
+        """Remove a notebook from the index.
+
+        Args:
+            filepath (Path): Filepath to a .cado notebook file.
+        """
+        with self._lock:
+            self._entries.pop(filepath, None)
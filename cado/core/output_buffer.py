@@ -0,0 +1,82 @@
+import io
+from collections import deque
+from typing import Callable, Deque, List, Optional
+
+DEFAULT_MAX_HEAD_CHARS = 50_000
+DEFAULT_MAX_TAIL_CHARS = 50_000
+
+
+# pylint: disable=too-many-instance-attributes
+class OutputBuffer(io.TextIOBase):
+    """Text buffer with bounded memory that keeps the head and tail of the output and drops the middle.
+
+    Args:
+        max_head_chars (int): Number of characters to keep from the start of the output.
+        max_tail_chars (int): Number of characters to keep from the end of the output.
+        on_write (Optional[Callable[[str], None]]): Called with each chunk of text as it is written.
+    """
+
+    def __init__(
+        self,
+        max_head_chars: int = DEFAULT_MAX_HEAD_CHARS,
+        max_tail_chars: int = DEFAULT_MAX_TAIL_CHARS,
+        on_write: Optional[Callable[[str], None]] = None,
+    ):
+        super().__init__()
+        self.max_head_chars = max_head_chars
+        self.max_tail_chars = max_tail_chars
+        self.on_write = on_write
+        self._head: List[str] = []
+        self._head_size = 0
+        self._tail: Deque[str] = deque()
+        self._tail_size = 0
+        self._dropped = 0
+
+    def write(self, text: str) -> int:
+        size = len(text)
+        if size == 0:
+            return 0
+        if self.on_write is not None:
+            self.on_write(text)
+
+        if self._head_size < self.max_head_chars:
+            head_text = text[:self.max_head_chars - self._head_size]
+            self._head.append(head_text)
+            self._head_size += len(head_text)
+            text = text[len(head_text):]
+
+        if len(text) > 0:
+            self._tail.append(text)
+            self._tail_size += len(text)
+            while self._tail_size > self.max_tail_chars:
+                excess = self._tail_size - self.max_tail_chars
+                first = self._tail[0]
+                if len(first) <= excess:
+                    self._tail.popleft()
+                    self._tail_size -= len(first)
+                    self._dropped += len(first)
+                else:
+                    self._tail[0] = first[excess:]
+                    self._tail_size -= excess
+                    self._dropped += excess
+        return size
+
+    def writable(self) -> bool:
+        return True
+
+    @property
+    def truncated(self) -> bool:
+        """Whether any output was dropped."""
+        return self._dropped > 0
+
+    def getvalue(self) -> str:
+        """Get the buffered output, with a marker where output was dropped.
+
+        Returns:
+            str: The buffered output.
+        """
+        head = "".join(self._head)
+        tail = "".join(self._tail)
+        if self._dropped > 0:
+            return f"{head}\n... [{self._dropped} characters truncated] ...\n{tail}"
+        return head + tail
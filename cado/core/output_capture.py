@@ -0,0 +1,70 @@
+import io
+import sys
+import threading
+from contextlib import contextmanager
+from typing import Iterator, Optional, TextIO, Union
+
+Stream = Union[TextIO, io.TextIOBase]
+
+_local = threading.local()
+_lock = threading.Lock()
+
+
+# pylint: disable=too-few-public-methods
+class _Captures:
+    # Number of threads currently capturing output, the routed streams are installed while this is non-zero
+    count = 0
+
+
+class _ThreadRoutedStream(io.TextIOBase):
+    """Stream that writes to the current thread's capture target, or to the original stream otherwise."""
+
+    def __init__(self, name: str, original: TextIO):
+        super().__init__()
+        self.name = name
+        self.original = original
+
+    def _target(self) -> Stream:
+        target: Optional[Stream] = getattr(_local, self.name, None)
+        return target if target is not None else self.original
+
+    def write(self, text: str) -> int:
+        return self._target().write(text)
+
+    def flush(self) -> None:
+        self._target().flush()
+
+    def writable(self) -> bool:
+        return True
+
+
+@contextmanager
+def capture_output(stdout: Stream, stderr: Stream) -> Iterator[None]:
+    """Redirect stdout and stderr for the current thread only.
+
+    Unlike contextlib.redirect_stdout, output written by other threads while in the context, for example by the
+    server or by other sessions, still goes to the original streams.
+
+    Args:
+        stdout (Stream): Stream to write this thread's stdout to.
+        stderr (Stream): Stream to write this thread's stderr to.
+    """
+    with _lock:
+        if _Captures.count == 0:
+            sys.stdout = _ThreadRoutedStream("stdout", sys.stdout)  # type: ignore[assignment]
+            sys.stderr = _ThreadRoutedStream("stderr", sys.stderr)  # type: ignore[assignment]
+        _Captures.count += 1
+    _local.stdout = stdout
+    _local.stderr = stderr
+    try:
+        yield
+    finally:
+        _local.stdout = None
+        _local.stderr = None
+        with _lock:
+            _Captures.count -= 1
+            if _Captures.count == 0:
+                if isinstance(sys.stdout, _ThreadRoutedStream):
+                    sys.stdout = sys.stdout.original
+                if isinstance(sys.stderr, _ThreadRoutedStream):
+                    sys.stderr = sys.stderr.original
@@ -0,0 +1,156 @@
+import itertools
+import json
+from typing import Any, Collection, List, Tuple
+
+from cado.core.binary_output import is_binary
+
+MAX_OUTPUT_DEPTH = 500
+MAX_OUTPUT_SIZE = 1 << 30
+# Containers with more nested containers than this are measured with json.dumps, which is faster than walking
+# many small containers in Python, as in a list of records
+MAX_WALKED_CHILDREN = 64
+# Numbers formatted to estimate the serialized size of a run of numbers
+NUMBER_SAMPLE_SIZE = 256
+
+_SCALAR_TYPES = {str, type(None), bool, int, float}
+# Sizes are measured as json.dumps formats outputs, with each value followed by a ", " separator
+_SEPARATOR_SIZE = 2
+# Serialized sizes of scalars whose size barely depends on their value, including a separator
+_FIXED_SIZES = {type(None): 6, bool: 7}
+
+
+def get_output_size(output: Any, max_depth: int = MAX_OUTPUT_DEPTH, max_size: int = MAX_OUTPUT_SIZE) -> int:
+    """Check that a cell output can be JSON serialized, and estimate its serialized size.
+
+    Containers of scalars are checked and measured in bulk without serializing them, with the size of numbers
+    estimated from a sample. Containers holding many nested containers are serialized instead, since that is
+    faster than walking them. The walk stops as soon as the output is found to be invalid or over budget. Binary
+    outputs are measured by their number of bytes.
+
+    Args:
+        output (Any): The cell output.
+        max_depth (int): Maximum nesting depth of lists and dicts.
+        max_size (int): Maximum approximate serialized size in bytes.
+
+    Raises:
+        ValueError: If the output is not JSON serializable, or is over the depth or size budget.
+
+    Returns:
+        int: Approximate size of the output serialized as JSON, in bytes.
+    """
+    if is_binary(output):
+        size = memoryview(output).nbytes
+    else:
+        size = _walk(output, max_depth, max_size)
+    if size > max_size:
+        raise ValueError(f"Cell output is larger than the limit of {max_size} bytes")
+    return size
+
+
+def _walk(output: Any, max_depth: int, max_size: int) -> int:
+    # Every value is measured with a separator after it, except the output itself
+    size = -_SEPARATOR_SIZE
+    stack: List[Tuple[Any, int]] = [(output, 0)]
+    while len(stack) > 0:
+        value, depth = stack.pop()
+        items: Collection[Any]
+        if isinstance(value, dict):
+            size += _measure_keys(value.keys())
+            items = value.values()
+        elif isinstance(value, (list, tuple)):
+            items = value
+        elif isinstance(value, (str, type(None), bool, int, float)):
+            size += _measure_scalars([value], {type(value)})
+            continue
+        else:
+            raise _not_serializable(type(value))
+
+        if depth >= max_depth:
+            raise ValueError(f"Cell output is nested deeper than the limit of {max_depth} levels")
+        # The brackets stand in for the separator after the last item, which the container itself needs
+        size += 2 if len(items) > 0 else 2 + _SEPARATOR_SIZE
+        item_types = set(map(type, items))
+        if item_types <= _SCALAR_TYPES:
+            size += _measure_scalars(items, item_types)
+        else:
+            children: Collection[Any] = items
+            if len(item_types & _SCALAR_TYPES) > 0:
+                size += _measure_scalars([item for item in items if type(item) in _SCALAR_TYPES],
+                                         item_types & _SCALAR_TYPES)
+                children = [item for item in items if type(item) not in _SCALAR_TYPES]
+            if len(children) > MAX_WALKED_CHILDREN:
+                size += _dumps_size(list(children), max_depth - depth)
+            else:
+                stack.extend((item, depth + 1) for item in children)
+        if size > max_size:
+            break
+    return size
+
+
+def _measure_scalars(values: Collection[Any], value_types: Collection[type]) -> int:
+    if len(values) == 0:
+        return 0
+    if len(value_types) == 1:
+        (value_type,) = value_types
+        if value_type is str:
+            return sum(map(len, values)) + (2 + _SEPARATOR_SIZE) * len(values)
+        if value_type in _FIXED_SIZES:
+            return _FIXED_SIZES[value_type] * len(values)
+        if value_type in (int, float):
+            return _estimate_numbers_size(values, len(values))
+
+    # Strings are measured exactly, and numbers are estimated from a sample
+    size = 0
+    numbers = 0
+    for value in values:
+        value_type = type(value)
+        if value_type is str:
+            size += len(value) + 2 + _SEPARATOR_SIZE
+        elif value_type in _FIXED_SIZES:
+            size += _FIXED_SIZES[value_type]
+        elif value_type in (int, float):
+            numbers += 1
+        else:
+            # Subclasses of scalars, like enums, are serialized as their base type
+            size += len(json.dumps(value)) + _SEPARATOR_SIZE
+    if numbers > 0:
+        size += _estimate_numbers_size(values, numbers)
+    return size
+
+
+def _estimate_numbers_size(values: Collection[Any], numbers: int) -> int:
+    step = max(1, len(values) // NUMBER_SAMPLE_SIZE)
+    sample = [value for value in itertools.islice(values, 0, None, step) if type(value) in (int, float)]
+    if len(sample) == 0:
+        sample = [value for value in values if type(value) in (int, float)][:NUMBER_SAMPLE_SIZE]
+    sample_size = sum(map(len, map(repr, sample))) + _SEPARATOR_SIZE * len(sample)
+    return sample_size * numbers // len(sample)
+
+
+def _measure_keys(keys: Collection[Any]) -> int:
+    key_types = set(map(type, keys))
+    # Keys are followed by ": " instead of a separator
+    if key_types == {str}:
+        return sum(map(len, keys)) + 4 * len(keys)
+    for key in keys:
+        if key is not None and not isinstance(key, (str, bool, int, float)):
+            raise ValueError("Cell outputs must be JSON serializable. Keys must be str, int, float, bool or None, "
+                             f"not {type(key).__name__}.")
+    return sum(len(str(key)) + 4 for key in keys)
+
+
+def _dumps_size(values: List[Any], max_depth: int) -> int:
+    try:
+        # The brackets of the list stand in for the separator after the last value
+        return len(json.dumps(values))
+    except TypeError as exc:
+        if "keys must be" in str(exc):
+            raise ValueError(f"Cell outputs must be JSON serializable. Keys {str(exc)[5:]}.") from exc
+        raise ValueError(f"Cell outputs must be JSON serializable. {exc}.") from exc
+    except (RecursionError, ValueError) as exc:
+        raise ValueError(f"Cell output is nested deeper than the limit of {max_depth} levels") from exc
+
+
+def _not_serializable(value_type: type) -> ValueError:
+    return ValueError(f"Cell outputs must be JSON serializable. Object of type {value_type.__name__} is not JSON "
+                      "serializable.")
@@ -0,0 +1,108 @@
+import hashlib
+import json
+import logging
+import shutil
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Optional, Set
+from uuid import UUID
+
+from cado.core.files import write_text_atomic
+
+logger = logging.getLogger(__name__)
+
+OUTPUTS_DIRNAME = ".cado-outputs"
+
+
+@dataclass
+class CellOutputs:
+    output: Any = None
+    stdout: Optional[str] = None
+    stderr: Optional[str] = None
+
+
+class OutputStore:
+    """Content-addressed store for the outputs of one notebook's cells, kept next to the notebook file.
+
+    Each entry is a JSON file named by the hash of its contents, so unchanged outputs are never written twice.
+    """
+
+    def __init__(self, dirpath: Path):
+        self.dirpath = dirpath
+
+    @classmethod
+    def for_notebook(cls, filepath: Path, notebook_id: UUID) -> "OutputStore":
+        """Get the output store for a notebook.
+
+        The store is keyed by notebook ID rather than filename, so that it survives renaming the notebook. Copies of
+        the notebook file share the store, so it is only pruned of outputs that none of them refer to.
+
+        Args:
+            filepath (Path): Filepath to a .cado notebook file.
+            notebook_id (UUID): ID of the notebook.
+
+        Returns:
+            OutputStore: The output store.
+        """
+        return cls(filepath.parent / OUTPUTS_DIRNAME / str(notebook_id))
+
+    def get(self, ref: str) -> Optional[CellOutputs]:
+        """Load cell outputs from the store.
+
+        Args:
+            ref (str): Reference returned when the outputs were stored.
+
+        Returns:
+            Optional[CellOutputs]: The outputs, or None if they were not found.
+        """
+        try:
+            with self._get_filepath(ref).open() as f:
+                outputs_json = json.load(f)
+        except (OSError, ValueError):
+            logger.warning("Could not load cell outputs %s from %s", ref, self.dirpath)
+            return None
+        return CellOutputs(
+            output=outputs_json["output"],
+            stdout=outputs_json["stdout"],
+            stderr=outputs_json["stderr"],
+        )
+
+    def put(self, outputs: CellOutputs) -> str:
+        """Store cell outputs.
+
+        Args:
+            outputs (CellOutputs): Outputs to store.
+
+        Returns:
+            str: Reference to the stored outputs.
+        """
+        outputs_json = json.dumps({
+            "output": outputs.output,
+            "stdout": outputs.stdout,
+            "stderr": outputs.stderr,
+        }, sort_keys=True)
+        ref = hashlib.sha256(outputs_json.encode()).hexdigest()
+        filepath = self._get_filepath(ref)
+        if not filepath.exists():
+            self.dirpath.mkdir(parents=True, exist_ok=True)
+            write_text_atomic(filepath, outputs_json, fsync=False)
+        return ref
+
+    def prune(self, refs: Set[str]) -> None:
+        """Delete stored outputs that are no longer referenced.
+
+        Args:
+            refs (Set[str]): References that are still in use.
+        """
+        if not self.dirpath.exists():
+            return
+        for filepath in self.dirpath.glob("*.json"):
+            if filepath.stem not in refs:
+                filepath.unlink(missing_ok=True)
+
+    def delete(self) -> None:
+        """Delete the whole store."""
+        shutil.rmtree(self.dirpath, ignore_errors=True)
+
+    def _get_filepath(self, ref: str) -> Path:
+        return self.dirpath / f"{ref}.json"
@@ -0,0 +1,186 @@
+import functools
+import heapq
+import logging
+from concurrent.futures import FIRST_COMPLETED, Executor, Future, wait
+from typing import TYPE_CHECKING, Any, Callable, Collection, Dict, List, Optional, Tuple
+from uuid import UUID
+
+from cado.core.cancel_token import CancelToken, RunInterrupted
+from cado.core.cell import Cell, CellResult, execute
+from cado.core.cell_status import CellStatus
+from cado.core.execution_plan import ExecutionPlan
+from cado.core.hashing import hash_cell_inputs
+from cado.core.memo_store import MemoStore
+
+if TYPE_CHECKING:
+    from cado.core.notebook import Notebook
+
+logger = logging.getLogger(__name__)
+
+CANCEL_POLL_INTERVAL = 0.1
+
+
+# pylint: disable=too-many-instance-attributes
+# pylint: disable=too-few-public-methods
+class PlanRunner:
+    """Runs the cells of an execution plan, each exactly once.
+
+    A cell starts once all of its parents in the plan have finished. Without an executor cells run one at a time
+    in plan order, and with an executor independent cells run in parallel. If a cell fails then its descendants
+    in the plan are cleared instead of run, and the first error is raised once the rest of the plan has finished.
+
+    Cells running in-process report their stdout and stderr through on_output as they write it. Cells running on
+    the executor only report their output once they finish.
+
+    Cancelling the token, for the whole run or for any cell in the plan, interrupts a cell running in-process,
+    abandons cells running on the executor, and clears every cell in the plan that has not finished. Abandoned
+    cells that already started keep running in their worker until they finish, since a worker can't be stopped
+    without breaking the pool.
+
+    Cells that were cleared since they last ran reuse their earlier result instead of running if their code and
+    parent outputs are unchanged, so a parent that runs again with the same output stops the change from
+    propagating to its descendants. Cells in always_run are always run.
+    """
+
+    # pylint: disable=too-many-arguments
+    def __init__(
+        self,
+        notebook: "Notebook",
+        plan: ExecutionPlan,
+        executor: Optional[Executor] = None,
+        memo_store: Optional[MemoStore] = None,
+        cancel_token: Optional[CancelToken] = None,
+        on_output: Optional[Callable[[UUID, str, str], None]] = None,
+        always_run: Collection[UUID] = (),
+    ):
+        self.notebook = notebook
+        self.plan = plan
+        self.executor = executor
+        self.memo_store = memo_store
+        self.cancel_token = cancel_token or CancelToken()
+        self.on_output = on_output
+        self.always_run = set(always_run)
+
+        self._plan_indices = {cell_id: i for i, cell_id in enumerate(plan.cell_ids)}
+        self._waiting: Dict[UUID, int] = {}
+        for cell_id in plan.cell_ids:
+            cell = notebook.get_cell(cell_id)
+            self._waiting[cell_id] = sum(1 for p in notebook.get_parents(cell) if p.id in self._plan_indices)
+        self._ready: List[Tuple[int, UUID]] = [(self._plan_indices[cell_id], cell_id)
+                                               for cell_id, waiting in self._waiting.items() if waiting == 0]
+        heapq.heapify(self._ready)
+        self._running: Dict["Future[CellResult]", Tuple[Cell, str]] = {}
+        self._first_error: Optional[ValueError] = None
+
+    def run(self) -> None:
+        """Run the plan.
+
+        Raises:
+            ValueError: If the run was cancelled, otherwise the first error raised by a cell in the plan.
+        """
+        logger.debug("Running plan for %s: %s", self._target, self.plan.cell_ids)
+        self.cancel_token.start(self.plan.cell_ids)
+        try:
+            self._run_plan()
+        finally:
+            self.cancel_token.finish()
+
+    def _run_plan(self) -> None:
+        while len(self._ready) > 0 or len(self._running) > 0:
+            while len(self._ready) > 0:
+                _, cell_id = heapq.heappop(self._ready)
+                cell = self.notebook.get_cell(cell_id)
+                if self.cancel_token.cancelled:
+                    cell.clear()
+                    self._finish(cell)
+                else:
+                    self._start(cell)
+
+            if len(self._running) > 0:
+                done, _ = wait(self._running, timeout=CANCEL_POLL_INTERVAL, return_when=FIRST_COMPLETED)
+                if self.cancel_token.cancelled:
+                    self._abandon_running()
+                    continue
+                for future in done:
+                    cell, input_key = self._running.pop(future)
+                    try:
+                        result = future.result()
+                    # pylint: disable=broad-exception-caught
+                    except Exception as exc:
+                        result = CellResult(error=f"Failed to run cell {cell.id} in worker: {exc}")
+                    self._complete(cell, result, input_key)
+
+        if self.cancel_token.cancelled:
+            raise ValueError(f"Run of {self._target} was cancelled")
+        if self._first_error is not None:
+            raise self._first_error
+
+    @property
+    def _target(self) -> str:
+        return "cells" if self.plan.cell_id is None else f"cell {self.plan.cell_id}"
+
+    def _start(self, cell: Cell) -> None:
+        parents = list(self.notebook.get_parents(cell))
+        for parent in parents:
+            parent.load_outputs()
+        if any(parent.status != CellStatus.OK for parent in parents):
+            cell.clear()
+            self._finish(cell)
+            return
+
+        input_key = hash_cell_inputs(cell.code, cell.output_name,
+                                     {parent.output_name: parent.output_hash for parent in parents})
+        if cell.id not in self.always_run and cell.restore(input_key):
+            logger.debug("Reusing earlier result for cell %s with unchanged inputs", cell.id)
+            self._finish(cell)
+            return
+        if self.memo_store is not None:
+            result = self.memo_store.get(input_key)
+            if result is not None:
+                logger.debug("Using memoized result for cell %s", cell.id)
+                self._complete(cell, result, input_key, cached=True)
+                return
+
+        context: Dict[str, Any] = {parent.output_name: parent.output_value for parent in parents}
+        logger.debug("Running cell %s", cell.id)
+        if self.executor is None:
+            on_output = None if self.on_output is None else functools.partial(self.on_output, cell.id)
+            try:
+                with self.cancel_token.interruptible():
+                    result = execute(cell.id, cell.code, cell.output_name, context, on_output=on_output)
+            except RunInterrupted:
+                logger.debug("Interrupted cell %s", cell.id)
+                cell.clear()
+                self._finish(cell)
+                return
+            self._complete(cell, result, input_key)
+        else:
+            future = self.executor.submit(execute, cell.id, cell.code, cell.output_name, context)
+            self._running[future] = (cell, input_key)
+
+    def _complete(self, cell: Cell, result: CellResult, input_key: str, cached: bool = False) -> None:
+        try:
+            cell.apply_result(result, cached=cached, input_key=input_key)
+        except ValueError as exc:
+            self._first_error = self._first_error or exc
+        else:
+            if self.memo_store is not None and not cached:
+                self.memo_store.put(input_key, result)
+        self._finish(cell)
+
+    def _abandon_running(self) -> None:
+        for future, (cell, _) in self._running.items():
+            logger.debug("Abandoning cell %s", cell.id)
+            future.cancel()
+            cell.clear()
+        running_cells = [cell for cell, _ in self._running.values()]
+        self._running.clear()
+        for cell in running_cells:
+            self._finish(cell)
+
+    def _finish(self, cell: Cell) -> None:
+        for child in self.notebook.get_children(cell):
+            if child.id in self._plan_indices:
+                self._waiting[child.id] -= 1
+                if self._waiting[child.id] == 0:
+                    heapq.heappush(self._ready, (self._plan_indices[child.id], child.id))
@@ -1,7 +1,9 @@
-import { ArrowRight, Broom, CheckCircle, Circle, Play, Trash, WarningCircle } from "@phosphor-icons/react";
+import { ArrowRight, Broom, CheckCircle, Circle, Play, Stop, Trash, WarningCircle } from "@phosphor-icons/react";
 import {
+  CancelCell,
   DeleteCell,
   MessageType,
+  PullCells,
   UpdateCellCode,
   UpdateCellInputNames,
   UpdateCellLanguage,
@@ -11,7 +13,7 @@ import { Reorder, useDragControls, useMotionValue } from "framer-motion";
 import { useEffect, useRef, useState } from "react";
 
 import Button from "../widgets/Button";
-import CellModel from "../lib/models/cell";
+import CellModel, { hasPendingOutputs } from "../lib/models/cell";
 import { CellStatus } from "../lib/models/cellStatus";
 import CodeEditor from "@uiw/react-textarea-code-editor";
 import { Language } from "../lib/models/language";
@@ -20,6 +22,8 @@ import { None } from "../lib/types";
 import { TbBrandPython as PythonIcon } from "react-icons/tb";
 import ReorderIcon from "../widgets/ReorderIcon";
 import TextBox from "../widgets/TextBox";
+import { formatBytes, formatDuration } from "../lib/format";
+import useVisible from "../hooks/visible";
 
 interface CellProps {
   cell: CellModel;
@@ -28,6 +32,7 @@ interface CellProps {
   onSetActive: (editMode: boolean) => void;
   runCell: (cell: CellModel) => void;
   clearCell: (cell: CellModel) => void;
+  lazy: boolean;
   editMode: boolean;
   onSetEditMode: (editMode: boolean) => void;
 }
@@ -36,6 +41,8 @@ export default function Cell(props: CellProps) {
   const [outputName, setOutputName] = useState<string>("");
   const [inputNames, setInputNames] = useState<string>("");
   const editorRef = useRef<HTMLTextAreaElement | null>(null);
+  const cellRef = useRef<HTMLDivElement | null>(null);
+  const visible = useVisible(cellRef);
 
   const y = useMotionValue(0);
   const dragControls = useDragControls();
@@ -56,6 +63,26 @@ export default function Cell(props: CellProps) {
     setInputNames(props.cell.input_names.join(", "));
   }, [props.cell.input_names]);
 
+  useEffect(() => {
+    // With lazy evaluation, cells that depend on other cells are only brought up to date once they are on screen
+    const cell = props.cell;
+    if (!props.lazy || !visible || cell.status !== CellStatus.EXPIRED) return;
+    if (cell.language != Language.PYTHON || cell.code === "" || cell.input_names.length === 0) return;
+    props.sendMessage<PullCells>({
+      cell_ids: [cell.id],
+      type: MessageType.PULL_CELLS,
+    });
+  }, [props.lazy, visible, props.cell.status]);
+
+  useEffect(() => {
+    // Outputs saved with the notebook are only loaded once the cell is on screen
+    if (!visible || !hasPendingOutputs(props.cell)) return;
+    props.sendMessage<PullCells>({
+      cell_ids: [props.cell.id],
+      type: MessageType.PULL_CELLS,
+    });
+  }, [visible, props.cell.output_ref]);
+
   function updateCellOutputName() {
     if (outputName == props.cell.output_name) return;
     props.sendMessage<UpdateCellOutputName>({
@@ -85,6 +112,13 @@ export default function Cell(props: CellProps) {
     });
   }
 
+  function cancelCell() {
+    props.sendMessage<CancelCell>({
+      cell_id: props.cell.id,
+      type: MessageType.CANCEL_CELL,
+    });
+  }
+
   function deleteCell() {
     props.sendMessage<DeleteCell>({
       cell_id: props.cell.id,
@@ -121,12 +155,17 @@ export default function Cell(props: CellProps) {
 
   return (
     <Reorder.Item value={props.cell} id={props.cell.id} style={{ y }} dragListener={false} dragControls={dragControls}>
-      <div className={`mx-5 mb-4 select-none rounded-lg bg-dark-rock py-3 ${activeStyles}`} onClick={onClick}>
+      <div
+        ref={cellRef}
+        className={`mx-5 mb-4 select-none rounded-lg bg-dark-rock py-3 ${activeStyles}`}
+        onClick={onClick}
+      >
         <div className="flex items-center justify-between px-5">
           <div>
             {props.cell.language == Language.PYTHON && (
               <div className="flex items-center">
                 <Button onClick={() => props.runCell(props.cell)} tooltip="Run" iconClass={Play} />
+                <Button onClick={cancelCell} tooltip="Cancel" iconClass={Stop} />
                 <Button onClick={() => props.clearCell(props.cell)} tooltip="Clear" iconClass={Broom} />
 
                 <div className="flex items-center">
@@ -137,6 +176,16 @@ export default function Cell(props: CellProps) {
                     <CheckCircle className="text-green-500" weight="bold" size={18} />
                   )}
                   {props.cell.status === CellStatus.EXPIRED && <Circle weight="bold" size={18} />}
+                  {props.cell.status === CellStatus.OK && props.cell.metrics?.wall_time != null && (
+                    <div
+                      className="ml-2 text-xs text-stone-400"
+                      title={`CPU ${formatDuration(props.cell.metrics.cpu_time ?? 0)}, process peak memory +${formatBytes(
+                        props.cell.metrics.peak_memory_growth ?? 0
+                      )}, run ${props.cell.metrics.run_count} times, ${props.cell.metrics.cache_hits} cache hits`}
+                    >
+                      {formatDuration(props.cell.metrics.wall_time)}
+                    </div>
+                  )}
                 </div>
               </div>
             )}
@@ -1,5 +1,9 @@
 import {
+  BATCHABLE_MESSAGE_TYPES,
+  Batch,
+  CellOutputResponse,
   ErrorResponse,
+  ExecutionPlanResponse,
   ExitNotebook,
   GetCellResponse,
   GetNotebook,
@@ -8,9 +12,14 @@ import {
   ListNotebooksResponse,
   Message,
   MessageType,
+  NotebookDeltaResponse,
 } from "../lib/models/message";
 import { None, Optional } from "../lib/types";
-import NotebookModel, { updateNotebookCell } from "../lib/models/notebook";
+import NotebookModel, {
+  appendNotebookCellOutput,
+  applyNotebookDelta,
+  updateNotebookCell,
+} from "../lib/models/notebook";
 import { useEffect, useRef, useState } from "react";
 import useWebSocket, { ReadyState } from "react-use-websocket";
 
@@ -29,6 +38,7 @@ interface ConnectionProps {
 
 export default function Connection(props: ConnectionProps) {
   const didUnmount = useRef(false);
+  const notebookVersion = useRef(0);
   const socketUrl = `ws://${props.appConfig.host}/stream`;
   const { sendMessage, lastMessage, readyState } = useWebSocket(socketUrl, {
     shouldReconnect: (closeEvent) => {
@@ -47,7 +57,30 @@ export default function Connection(props: ConnectionProps) {
     };
   }, []);
 
+  const pendingMessages = useRef<Message[]>([]);
+
+  // Operations sent in the same event, like a reorder followed by edits, go to the server as one batch
   function send<M>(message: M) {
+    const clientMessage = message as unknown as Message;
+    if (!BATCHABLE_MESSAGE_TYPES.includes(clientMessage.type)) {
+      flushMessages();
+      console.log("Sending client message: ", message);
+      sendMessage(JSON.stringify(message));
+      return;
+    }
+    if (pendingMessages.current.length === 0) {
+      setTimeout(flushMessages, 0);
+    }
+    pendingMessages.current.push(clientMessage);
+  }
+
+  function flushMessages() {
+    const messages = pendingMessages.current;
+    pendingMessages.current = [];
+    if (messages.length === 0) {
+      return;
+    }
+    const message: Message | Batch = messages.length === 1 ? messages[0] : { messages, type: MessageType.BATCH };
     console.log("Sending client message: ", message);
     sendMessage(JSON.stringify(message));
   }
@@ -76,7 +109,7 @@ export default function Connection(props: ConnectionProps) {
 
   useEffect(() => {
     if (lastMessage !== null) {
-      const messageJson = JSON.parse(JSON.parse(lastMessage.data));
+      const messageJson = JSON.parse(lastMessage.data);
       const message = messageJson as Message;
       console.log("Received server message: ", message);
 
@@ -85,7 +118,23 @@ export default function Connection(props: ConnectionProps) {
         if (!response.notebook) {
           listNotebooks();
         }
+        if (response.execution_plan) {
+          console.log("Ran execution plan: ", response.execution_plan);
+        }
+        notebookVersion.current = response.version;
         setCurrentNotebook(response.notebook);
+      } else if (message.type == MessageType.NOTEBOOK_DELTA_RESPONSE) {
+        const response = message as NotebookDeltaResponse;
+        if (!currentNotebook || response.version != notebookVersion.current + 1) {
+          console.log("Missed notebook changes, requesting the full notebook");
+          loadNotebook();
+          return;
+        }
+        if (response.execution_plan) {
+          console.log("Ran execution plan: ", response.execution_plan);
+        }
+        notebookVersion.current = response.version;
+        setCurrentNotebook(applyNotebookDelta(currentNotebook, response));
       } else if (message.type == MessageType.LIST_NOTEBOOKS_RESPONSE) {
         const response = message as ListNotebooksResponse;
         setNotebookDetails(response.notebook_details);
@@ -96,6 +145,16 @@ export default function Connection(props: ConnectionProps) {
           return;
         }
         setCurrentNotebook(updateNotebookCell(currentNotebook, response.cell));
+      } else if (message.type == MessageType.CELL_OUTPUT_RESPONSE) {
+        const response = message as CellOutputResponse;
+        setCurrentNotebook((notebook) =>
+          notebook
+            ? appendNotebookCellOutput(notebook, response.cell_id, response.stream, response.text, response.reset)
+            : notebook
+        );
+      } else if (message.type == MessageType.EXECUTION_PLAN_RESPONSE) {
+        const response = message as ExecutionPlanResponse;
+        console.log("Received execution plan: ", response.execution_plan);
       } else if (message.type == MessageType.ERROR_RESPONSE) {
         const response = message as ErrorResponse;
         console.error(response);
@@ -3,6 +3,7 @@ import Notebook from "../lib/models/notebook";
 import { Reorder } from "framer-motion";
 import { ClearCell, DeleteCell, MessageType, NewCell, ReorderCells, RunCell } from "../lib/models/message";
 import CellModel from "../lib/models/cell";
+import { Evaluation } from "../lib/models/evaluation";
 import { useEffect, useState } from "react";
 import { None, Optional } from "../lib/types";
 import { useKeyCombos } from "../hooks/keys";
@@ -177,6 +178,7 @@ export default function Notebook(props: NotebookProps) {
             cell={cell}
             runCell={runCell}
             clearCell={clearCell}
+            lazy={props.notebook.evaluation == Evaluation.LAZY}
             active={activeCell?.id == cell.id}
             editMode={editMode}
             onSetActive={(editMode: boolean) => updateActiveCell(cell, editMode)}
@@ -1,8 +1,9 @@
-import { Books, Gear, Plus } from "@phosphor-icons/react";
-import { MessageType, NewCell, UpdateNotebookName } from "../lib/models/message";
+import { Books, Gear, HourglassSimple, Lightning, Plus } from "@phosphor-icons/react";
+import { MessageType, NewCell, UpdateNotebookEvaluation, UpdateNotebookName } from "../lib/models/message";
 import { None, Optional } from "../lib/types";
 
 import Button from "../widgets/Button";
+import { Evaluation } from "../lib/models/evaluation";
 import Notebook from "../lib/models/notebook";
 import SlyTextBox from "../widgets/SlyTextBox";
 
@@ -27,6 +28,14 @@ export default function Toolbar(props: ToolbarProps) {
     });
   }
 
+  function toggleEvaluation() {
+    const lazy = props.notebook?.evaluation == Evaluation.LAZY;
+    props.sendMessage<UpdateNotebookEvaluation>({
+      evaluation: lazy ? Evaluation.EAGER : Evaluation.LAZY,
+      type: MessageType.UPDATE_NOTEBOOK_EVALUATION,
+    });
+  }
+
   function goToSettings() {
     alert("Settings page not implemented yet");
   }
@@ -48,6 +57,13 @@ export default function Toolbar(props: ToolbarProps) {
       </div>
       <div className="flex items-center">
         {props.notebook && <Button onClick={newCell} tooltip="New cell" iconClass={Plus} />}
+        {props.notebook && (
+          <Button
+            onClick={toggleEvaluation}
+            tooltip={props.notebook.evaluation == Evaluation.LAZY ? "Lazy evaluation" : "Eager evaluation"}
+            iconClass={props.notebook.evaluation == Evaluation.LAZY ? HourglassSimple : Lightning}
+          />
+        )}
         {props.notebook && <Button onClick={props.goToNotebooks} tooltip="Notebooks" iconClass={Books} />}
         {false && <Button onClick={goToSettings} tooltip="Settings" iconClass={Gear} />}
       </div>
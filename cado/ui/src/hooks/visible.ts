@@ -0,0 +1,18 @@
+import { RefObject, useEffect, useState } from "react";
+
+export default function useVisible(ref: RefObject<Element>) {
+  const [visible, setVisible] = useState<boolean>(false);
+
+  useEffect(() => {
+    const element = ref.current;
+    if (!element) {
+      return;
+    }
+
+    const observer = new IntersectionObserver(([entry]) => setVisible(entry.isIntersecting));
+    observer.observe(element);
+    return () => observer.disconnect();
+  }, [ref]);
+
+  return visible;
+}
@@ -3,3 +3,17 @@ import { DateTime } from "luxon";
 export function formatDateDiff(date: string) {
   return DateTime.fromISO(date).toRelative(DateTime.now());
 }
+
+export function formatDuration(seconds: number) {
+  if (seconds < 1) {
+    return `${Math.round(seconds * 1000)} ms`;
+  }
+  return `${seconds.toFixed(2)} s`;
+}
+
+export function formatBytes(bytes: number) {
+  if (bytes < 1024 * 1024) {
+    return `${Math.round(bytes / 1024)} KB`;
+  }
+  return `${(bytes / (1024 * 1024)).toFixed(1)} MB`;
+}
@@ -1,3 +1,4 @@
+import CellMetrics from "./cellMetrics";
 import { CellStatus } from "./cellStatus";
 import { Language } from "./language";
 import { Optional } from "../types";
@@ -14,4 +15,12 @@ export default interface Cell {
   stdout: Optional<string>;
   stderr: Optional<string>;
   status: CellStatus;
+  output_size: Optional<number>;
+  metrics: CellMetrics;
+  output_ref: Optional<string>;
+}
+
+// Outputs that are saved in the output store but were not sent yet, which the cell has to be pulled for
+export function hasPendingOutputs(cell: Cell): boolean {
+  return cell.output_ref != null && cell.output == null && cell.stdout == null && cell.stderr == null;
 }
@@ -0,0 +1,9 @@
+import { Optional } from "../types";
+
+export default interface CellMetrics {
+  wall_time: Optional<number>;
+  cpu_time: Optional<number>;
+  peak_memory_growth: Optional<number>;
+  run_count: number;
+  cache_hits: number;
+}
@@ -0,0 +1,4 @@
+export enum Evaluation {
+  EAGER = "eager",
+  LAZY = "lazy",
+}
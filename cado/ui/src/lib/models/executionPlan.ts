@@ -0,0 +1,6 @@
+import { Optional } from "../types";
+
+export default interface ExecutionPlan {
+  cell_id: Optional<string>;
+  cell_ids: string[];
+}
@@ -1,4 +1,6 @@
 import Cell from "./cell";
+import { Evaluation } from "./evaluation";
+import ExecutionPlan from "./executionPlan";
 import { Language } from "./language";
 import Notebook from "./notebook";
 import NotebookDetails from "./notebookDetails";
@@ -12,6 +14,8 @@ export enum MessageType {
   UPDATE_CELL_INPUT_NAMES = "update-cell-input-names",
   UPDATE_CELL_LANGUAGE = "update-cell-language",
   RUN_CELL = "run-cell",
+  PLAN_CELL = "plan-cell",
+  CANCEL_CELL = "cancel-cell",
   CLEAR_CELL = "clear-cell",
   NEW_CELL = "new-cell",
   DELETE_CELL = "delete-cell",
@@ -22,12 +26,18 @@ export enum MessageType {
   OPEN_NOTEBOOK = "open-notebook",
   EXIT_NOTEBOOK = "exit-notebook",
   UPDATE_NOTEBOOK_NAME = "update-notebook-name",
+  UPDATE_NOTEBOOK_EVALUATION = "update-notebook-evaluation",
+  PULL_CELLS = "pull-cells",
+  BATCH = "batch",
 
   // subscribe
   GET_NOTEBOOK_RESPONSE = "get-notebook-response",
   GET_CELL_RESPONSE = "get-cell-response",
   ERROR_RESPONSE = "error-response",
   LIST_NOTEBOOKS_RESPONSE = "list-notebooks-response",
+  EXECUTION_PLAN_RESPONSE = "execution-plan-response",
+  CELL_OUTPUT_RESPONSE = "cell-output-response",
+  NOTEBOOK_DELTA_RESPONSE = "notebook-delta-response",
 }
 
 export interface Message {
@@ -67,6 +77,16 @@ export interface RunCell {
   type: MessageType.RUN_CELL;
 }
 
+export interface PlanCell {
+  cell_id: string;
+  type: MessageType.PLAN_CELL;
+}
+
+export interface CancelCell {
+  cell_id: string;
+  type: MessageType.CANCEL_CELL;
+}
+
 export interface ClearCell {
   cell_id: string;
   type: MessageType.CLEAR_CELL;
@@ -114,11 +134,55 @@ export interface UpdateNotebookName {
   type: MessageType.UPDATE_NOTEBOOK_NAME;
 }
 
+export interface UpdateNotebookEvaluation {
+  evaluation: Evaluation;
+  type: MessageType.UPDATE_NOTEBOOK_EVALUATION;
+}
+
+export interface PullCells {
+  cell_ids: string[];
+  type: MessageType.PULL_CELLS;
+}
+
+export interface Batch {
+  messages: Message[];
+  type: MessageType.BATCH;
+}
+
+// Operations on the open notebook that the server can apply together in a batch
+export const BATCHABLE_MESSAGE_TYPES: string[] = [
+  MessageType.UPDATE_CELL_CODE,
+  MessageType.UPDATE_CELL_OUTPUT_NAME,
+  MessageType.UPDATE_CELL_INPUT_NAMES,
+  MessageType.UPDATE_CELL_LANGUAGE,
+  MessageType.RUN_CELL,
+  MessageType.CLEAR_CELL,
+  MessageType.NEW_CELL,
+  MessageType.DELETE_CELL,
+  MessageType.REORDER_CELLS,
+  MessageType.UPDATE_NOTEBOOK_NAME,
+  MessageType.UPDATE_NOTEBOOK_EVALUATION,
+  MessageType.PULL_CELLS,
+];
+
 export interface GetNotebookResponse {
   notebook: Optional<Notebook>;
+  version: number;
+  execution_plan: Optional<ExecutionPlan>;
   type: MessageType.GET_NOTEBOOK_RESPONSE;
 }
 
+export interface NotebookDeltaResponse {
+  version: number;
+  name: Optional<string>;
+  evaluation: Optional<Evaluation>;
+  cells: Cell[];
+  cell_ids: Optional<string[]>;
+  deleted_cell_ids: string[];
+  execution_plan: Optional<ExecutionPlan>;
+  type: MessageType.NOTEBOOK_DELTA_RESPONSE;
+}
+
 export interface GetCellResponse {
   cell: Cell;
   type: MessageType.GET_CELL_RESPONSE;
@@ -126,6 +190,7 @@ export interface GetCellResponse {
 
 export interface ErrorResponse {
   error: string;
+  cell_ids: string[];
   type: MessageType.ERROR_RESPONSE;
 }
 
@@ -133,3 +198,16 @@ export interface ListNotebooksResponse {
   notebook_details: NotebookDetails[];
   type: MessageType.LIST_NOTEBOOKS;
 }
+
+export interface ExecutionPlanResponse {
+  execution_plan: ExecutionPlan;
+  type: MessageType.EXECUTION_PLAN_RESPONSE;
+}
+
+export interface CellOutputResponse {
+  cell_id: string;
+  stream: "stdout" | "stderr";
+  text: string;
+  reset: boolean;
+  type: MessageType.CELL_OUTPUT_RESPONSE;
+}
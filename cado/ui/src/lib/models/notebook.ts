@@ -1,8 +1,12 @@
 import Cell from "./cell";
+import { Evaluation } from "./evaluation";
+import { NotebookDeltaResponse } from "./message";
 
 export default interface Notebook {
   name: string;
   cells: Cell[];
+  preload?: string[];
+  evaluation?: Evaluation;
 }
 
 export function updateNotebookCell(notebook: Notebook, cell: Cell): Notebook {
@@ -11,3 +15,29 @@ export function updateNotebookCell(notebook: Notebook, cell: Cell): Notebook {
     cells: notebook.cells.map((c) => (c.id == cell.id ? cell : c)),
   };
 }
+
+export function appendNotebookCellOutput(
+  notebook: Notebook,
+  cellId: string,
+  stream: "stdout" | "stderr",
+  text: string,
+  reset: boolean
+): Notebook {
+  return {
+    ...notebook,
+    cells: notebook.cells.map((c) => (c.id == cellId ? { ...c, [stream]: reset ? text : (c[stream] ?? "") + text } : c)),
+  };
+}
+
+export function applyNotebookDelta(notebook: Notebook, delta: NotebookDeltaResponse): Notebook {
+  const cells = new Map(notebook.cells.map((c) => [c.id, c]));
+  delta.cells.forEach((c) => cells.set(c.id, c));
+  delta.deleted_cell_ids.forEach((id) => cells.delete(id));
+  const cellIds = delta.cell_ids ?? notebook.cells.map((c) => c.id);
+  return {
+    ...notebook,
+    name: delta.name ?? notebook.name,
+    evaluation: delta.evaluation ?? notebook.evaluation,
+    cells: cellIds.filter((id) => cells.has(id)).map((id) => cells.get(id) as Cell),
+  };
+}
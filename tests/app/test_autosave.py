@@ -0,0 +1,39 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from cado.app.autosave import Autosaver
+
+
+class TestAutosaver:
+
+    def test_coalesce(self):
+        saves = []
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            autosaver = Autosaver(lambda: saves.append(time.time()), executor, delay=0.1)
+            for _ in range(10):
+                autosaver.schedule()
+            assert len(saves) == 0
+            time.sleep(0.3)
+            assert len(saves) == 1
+
+            autosaver.schedule()
+            autosaver.flush()
+            assert len(saves) == 2
+            autosaver.flush()
+            assert len(saves) == 2
+
+    def test_retry_failed_save(self):
+        saves = []
+
+        def save():
+            saves.append(time.time())
+            if len(saves) == 1:
+                raise OSError("Disk full")
+
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            autosaver = Autosaver(save, executor, delay=0.1)
+            autosaver.schedule()
+            time.sleep(0.5)
+            assert len(saves) == 2
+            autosaver.flush()
+            assert len(saves) == 2
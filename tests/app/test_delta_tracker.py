@@ -0,0 +1,49 @@
+from cado.app.delta_tracker import DeltaTracker
+from cado.core.notebook import Notebook
+
+
+class TestDeltaTracker:
+
+    def test_delta_response(self):
+        notebook = Notebook(name="notebook")
+        a_id = notebook.add_cell()
+        delta_tracker = DeltaTracker()
+        assert delta_tracker.full_response(notebook).version == 1
+
+        b_id = notebook.add_cell()
+        notebook.set_cell_code(a_id, "a = 1")
+        response = delta_tracker.delta_response(notebook)
+        assert response.version == 2
+        assert {cell.id for cell in response.cells} == {a_id, b_id}
+        assert response.cell_ids == [a_id, b_id]
+
+        notebook.delete_cell(a_id)
+        response = delta_tracker.delta_response(notebook)
+        assert response.cells == []
+        assert response.cell_ids == [b_id]
+        assert response.deleted_cell_ids == [a_id]
+
+        response = delta_tracker.delta_response(notebook)
+        assert response.cells == []
+        assert response.cell_ids is None
+
+    def test_deferred_outputs(self, tmp_path):
+        filepath = tmp_path / "notebook.cado"
+        notebook = Notebook(name="notebook")
+        cell_id = notebook.add_cell()
+        notebook.update_cell_output_name(cell_id, "a")
+        notebook.set_cell_code(cell_id, "a = 1")
+        notebook.run_cell(cell_id)
+        notebook.to_filepath(filepath)
+
+        loaded = Notebook.from_filepath(filepath)
+        cell = loaded.get_cell(cell_id)
+        delta_tracker = DeltaTracker()
+        delta_tracker.full_response(loaded)
+        assert not cell.outputs_loaded
+        assert delta_tracker.delta_response(loaded).cells == []
+
+        cell.load_outputs()
+        response = delta_tracker.delta_response(loaded)
+        assert [cell.output for cell in response.cells] == [1]
+        assert delta_tracker.delta_response(loaded).cells == []
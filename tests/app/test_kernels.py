@@ -0,0 +1,26 @@
+import sys
+
+from cado.app.kernels import is_preload_allowed, preload_notebook_modules
+from cado.app.session_state import SessionState
+from cado.app.settings import Settings
+from cado.core.notebook import Notebook
+
+
+class TestKernels:
+
+    def test_is_preload_allowed(self):
+        assert is_preload_allowed("pandas", ["pandas"])
+        assert is_preload_allowed("pandas.io", ["pandas"])
+        assert not is_preload_allowed("pandas_extra", ["pandas"])
+        assert not is_preload_allowed("os", [])
+
+    def test_preload_notebook_modules(self, monkeypatch):
+        monkeypatch.delitem(sys.modules, "colorsys", raising=False)
+        notebook = Notebook(name="notebook", preload=["colorsys"])
+
+        # Modules the server does not allow are not imported
+        preload_notebook_modules(SessionState(notebook=notebook))
+        assert "colorsys" not in sys.modules
+
+        preload_notebook_modules(SessionState(notebook=notebook, settings=Settings(allow_preload=["colorsys"])))
+        assert "colorsys" in sys.modules
@@ -1,3 +1,5 @@
+import pytest
+
 from cado.app.message import Message, MessageType
 
 
@@ -8,3 +10,8 @@ class TestMessage:
             "type": "get-notebook",
         })
         assert message.type == MessageType.GET_NOTEBOOK
+
+    def test_from_str(self):
+        assert MessageType.from_str("batch") == MessageType.BATCH
+        with pytest.raises(ValueError, match="Unknown message type"):
+            MessageType.from_str("missing")
@@ -0,0 +1,105 @@
+import threading
+
+from cado.app.notebook_registry import NotebookRegistry
+from cado.app.session_state import SessionState
+from cado.app.settings import Settings
+from cado.core.notebook import Notebook
+
+
+class TestNotebookRegistry:
+
+    def test_share_notebook(self, tmp_path):
+        filepath = tmp_path / "notebook.cado"
+        Notebook(name="notebook").to_filepath(filepath)
+        registry = NotebookRegistry()
+        changes = []
+        first = SessionState(settings=Settings(save_delay=10))
+        second = SessionState(settings=Settings(save_delay=10), on_notebook_changed=lambda: changes.append(1))
+
+        registry.join(first, filepath)
+        registry.join(second, tmp_path / "." / "notebook.cado")
+        assert first.notebook is second.notebook
+        assert first.cancel_token is second.cancel_token
+        # Sharing an open notebook is not a cache hit
+        assert (registry.hits, registry.misses) == (0, 1)
+
+        assert first.shared_notebook is not None
+        first.shared_notebook.notify_changed(first)
+        assert changes == [1]
+
+        first.notebook.add_cell()
+        first.autosaver.schedule()
+        registry.leave(first)
+        assert first.notebook is None
+        assert len(Notebook.from_filepath(filepath).cells) == 0
+
+        registry.leave(second)
+        assert registry.get(filepath) is None
+        assert len(Notebook.from_filepath(filepath).cells) == 1
+
+    def test_join_while_loading(self, tmp_path, monkeypatch):
+        filepath = tmp_path / "notebook.cado"
+        Notebook(name="notebook").to_filepath(filepath)
+        registry = NotebookRegistry()
+        first = SessionState()
+        second = SessionState()
+        from_filepath = Notebook.from_filepath
+
+        def load_and_join(path):
+            # Another session opens the notebook while the first is still loading it
+            monkeypatch.setattr(Notebook, "from_filepath", from_filepath)
+            thread = threading.Thread(target=registry.join, args=(second, filepath))
+            thread.start()
+            thread.join(timeout=5)
+            assert not thread.is_alive()
+            return from_filepath(path)
+
+        monkeypatch.setattr(Notebook, "from_filepath", staticmethod(load_and_join))
+        registry.join(first, filepath)
+        assert first.notebook is second.notebook
+        assert len(registry.get(filepath).subscribers) == 2
+
+    def test_move(self, tmp_path):
+        filepath = tmp_path / "notebook.cado"
+        Notebook(name="notebook").to_filepath(filepath)
+        registry = NotebookRegistry()
+        first = SessionState()
+        second = SessionState()
+        registry.join(first, filepath)
+        registry.join(second, filepath)
+
+        new_filepath = tmp_path / "renamed.cado"
+        registry.move(first.shared_notebook, new_filepath)
+        assert second.filepath == new_filepath
+        assert registry.get(new_filepath) is first.shared_notebook
+
+    def test_cache_closed_notebooks(self, tmp_path):
+        filepaths = [tmp_path / "first.cado", tmp_path / "second.cado"]
+        for filepath in filepaths:
+            notebook = Notebook(name=filepath.stem)
+            notebook.add_cell()
+            notebook.cells[0].code = "x = 1"
+            notebook.to_filepath(filepath)
+        registry = NotebookRegistry(max_bytes=8)
+        session_state = SessionState(settings=Settings(save_delay=10))
+
+        registry.join(session_state, filepaths[0])
+        notebook = session_state.notebook
+        registry.leave(session_state)
+        registry.join(session_state, filepaths[0])
+        assert session_state.notebook is notebook
+        assert (registry.hits, registry.misses, registry.evictions) == (1, 1, 0)
+
+        # Only one of the notebooks fits in the budget
+        registry.join(session_state, filepaths[1])
+        registry.leave(session_state)
+        assert registry.evictions == 1
+        registry.join(session_state, filepaths[0])
+        assert session_state.notebook is not notebook
+        assert (registry.hits, registry.misses, registry.evictions) == (1, 3, 1)
+
+        # Changes made outside the server are loaded from disk
+        registry.leave(session_state)
+        Notebook(name="changed").to_filepath(filepaths[0])
+        registry.join(session_state, filepaths[0])
+        assert session_state.notebook.name == "changed"
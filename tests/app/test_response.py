@@ -0,0 +1,161 @@
+import pytest
+
+from cado.app.message import ErrorResponse, MessageType, NotebookDeltaResponse
+from cado.app.notebook_registry import NotebookRegistry
+from cado.app.response import handle_message, process_message
+from cado.app.session_state import SessionState
+from cado.app.settings import Settings
+from cado.core.cell_status import CellStatus
+from cado.core.evaluation import Evaluation
+from cado.core.notebook import Notebook
+
+
+class TestResponse:
+
+    def test_batch(self):
+        notebook = Notebook(name="notebook")
+        a_id = notebook.add_cell()
+        b_id = notebook.add_cell()
+        notebook.update_cell_output_name(a_id, "a")
+        notebook.update_cell_output_name(b_id, "b")
+        notebook.update_cell_input_names(b_id, ["a"])
+        session_state = SessionState(notebook=notebook)
+        session_state.delta_tracker.full_response(notebook)
+
+        response = process_message(MessageType.BATCH, {
+            "type": "batch",
+            "messages": [
+                {"type": "reorder-cells", "cell_ids": [str(b_id), str(a_id)]},
+                {"type": "update-cell-code", "cell_id": str(a_id), "code": "a = 1"},
+                {"type": "update-cell-code", "cell_id": str(b_id), "code": "b = a + 1"},
+                {"type": "run-cell", "cell_id": str(a_id)},
+                {"type": "run-cell", "cell_id": str(b_id)},
+            ],
+        }, session_state)
+        assert isinstance(response, NotebookDeltaResponse)
+        assert response.cell_ids == [b_id, a_id]
+        assert response.execution_plan is not None
+        assert response.execution_plan.cell_ids == [a_id, b_id]
+        assert notebook.get_cell(b_id).output == 2
+        assert notebook.get_cell(a_id).metrics.run_count == 1
+
+    def test_batch_invalid(self):
+        notebook = Notebook(name="notebook")
+        cell_id = notebook.add_cell()
+        session_state = SessionState(notebook=notebook)
+
+        response = process_message(MessageType.BATCH, {
+            "type": "batch",
+            "messages": [
+                {"type": "update-cell-code", "cell_id": str(cell_id), "code": "a = 1"},
+                {"type": "list-notebooks"},
+            ],
+        }, session_state)
+        assert isinstance(response, ErrorResponse)
+        assert notebook.get_cell(cell_id).code == ""
+
+    def test_batch_rollback(self):
+        notebook = Notebook(name="notebook")
+        a_id = notebook.add_cell()
+        b_id = notebook.add_cell()
+        notebook.update_cell_output_name(a_id, "a")
+        session_state = SessionState(notebook=notebook)
+
+        with pytest.raises(ValueError, match="No cell with output name"):
+            process_message(MessageType.BATCH, {
+                "type": "batch",
+                "messages": [
+                    {"type": "update-cell-code", "cell_id": str(a_id), "code": "a = 1"},
+                    {"type": "reorder-cells", "cell_ids": [str(b_id), str(a_id)]},
+                    {"type": "update-notebook-name", "name": "renamed"},
+                    {"type": "update-cell-input-names", "cell_id": str(b_id), "input_names": ["missing"]},
+                ],
+            }, session_state)
+        assert notebook.name == "notebook"
+        assert [cell.id for cell in notebook.cells] == [a_id, b_id]
+        assert notebook.get_cell(a_id).code == ""
+        b_cell = notebook.get_cell(b_id)
+        assert (b_cell.input_names, b_cell.status) == ([], CellStatus.EXPIRED)
+        assert list(notebook.get_children(notebook.get_cell(a_id))) == []
+
+    def test_pull_cells(self):
+        notebook = Notebook(name="notebook")
+        a_id = notebook.add_cell()
+        b_id = notebook.add_cell()
+        notebook.update_cell_output_name(a_id, "a")
+        notebook.update_cell_output_name(b_id, "b")
+        notebook.update_cell_input_names(b_id, ["a"])
+        notebook.set_cell_code(a_id, "a = 1")
+        notebook.set_cell_code(b_id, "b = a + 1")
+        session_state = SessionState(notebook=notebook)
+        session_state.delta_tracker.full_response(notebook)
+
+        response = process_message(MessageType.BATCH, {
+            "type": "batch",
+            "messages": [
+                {"type": "update-notebook-evaluation", "evaluation": "lazy"},
+                {"type": "run-cell", "cell_id": str(a_id)},
+            ],
+        }, session_state)
+        assert isinstance(response, NotebookDeltaResponse)
+        assert response.evaluation == Evaluation.LAZY
+        assert response.execution_plan is not None
+        assert response.execution_plan.cell_ids == [a_id]
+        assert notebook.get_cell(b_id).status == CellStatus.EXPIRED
+
+        response = process_message(MessageType.PULL_CELLS, {
+            "type": "pull-cells",
+            "cell_ids": [str(b_id)],
+        }, session_state)
+        assert isinstance(response, NotebookDeltaResponse)
+        assert response.evaluation is None
+        assert notebook.get_cell(b_id).output == 2
+
+    def test_pull_cells_outputs(self, tmp_path):
+        filepath = tmp_path / "notebook.cado"
+        notebook = Notebook(name="notebook")
+        cell_id = notebook.add_cell()
+        notebook.update_cell_output_name(cell_id, "a")
+        notebook.set_cell_code(cell_id, "a = 1")
+        notebook.run_cell(cell_id)
+        notebook.to_filepath(filepath)
+        loaded = Notebook.from_filepath(filepath)
+        session_state = SessionState(notebook=loaded)
+        session_state.delta_tracker.full_response(loaded)
+        assert not loaded.get_cell(cell_id).outputs_loaded
+
+        response = process_message(MessageType.PULL_CELLS, {
+            "type": "pull-cells",
+            "cell_ids": [str(cell_id)],
+        }, session_state)
+        assert isinstance(response, NotebookDeltaResponse)
+        assert [cell.output for cell in response.cells] == [1]
+        assert response.execution_plan is not None
+        assert response.execution_plan.cell_ids == []
+
+    def test_handle_message_failed_run(self, tmp_path):
+        filepath = tmp_path / "notebook.cado"
+        notebook = Notebook(name="notebook")
+        a_id = notebook.add_cell()
+        b_id = notebook.add_cell()
+        notebook.update_cell_output_name(a_id, "a")
+        notebook.update_cell_input_names(b_id, ["a"])
+        notebook.set_cell_code(a_id, "a = 1")
+        notebook.set_cell_code(b_id, "1 / 0")
+        notebook.to_filepath(filepath)
+        registry = NotebookRegistry()
+        changes = []
+        first = SessionState(settings=Settings(save_delay=10))
+        second = SessionState(settings=Settings(save_delay=10), on_notebook_changed=lambda: changes.append(1))
+        registry.join(first, filepath)
+        registry.join(second, filepath)
+
+        # The results of a run that failed are still saved and shared
+        with pytest.raises(ValueError, match="division by zero"):
+            handle_message(MessageType.RUN_CELL, {"type": "run-cell", "cell_id": str(a_id)}, first)
+        assert changes == [1]
+        registry.leave(first)
+        registry.leave(second)
+        loaded = Notebook.from_filepath(filepath)
+        assert loaded.get_cell(a_id).status == CellStatus.OK
+        assert loaded.get_cell(b_id).status == CellStatus.ERROR
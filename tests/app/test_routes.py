@@ -1,11 +1,17 @@
+import time
+
 import pytest
 from fastapi import FastAPI, WebSocket
 from fastapi.testclient import TestClient
 
 from cado.app.app import app as cado_app
+from cado.core.notebook import Notebook
 
 API_ENDPOINT = "/stream"
 
+# Runs for up to 10 seconds, so that a failed cancel fails the test instead of hanging it
+LONG_CELL_CODE = "import time\nfor _ in range(1000):\n    time.sleep(0.01)"
+
 
 @pytest.fixture(scope="module")
 def fast_api() -> FastAPI:
@@ -27,3 +33,74 @@ class TestRoutes:
             })
             response_json = socket.receive_json()
             print("Response: ", response_json)
+
+    def test_metrics(self, test_client: TestClient, tmp_path, monkeypatch):
+        monkeypatch.chdir(tmp_path)
+        with test_client.websocket_connect(API_ENDPOINT) as socket:
+            socket.send_json({"type": "list-notebooks"})
+            socket.receive_json()
+            response = test_client.get("/metrics")
+        assert response.status_code == 200
+        assert 'cado_message_latency_seconds_count{type="list-notebooks"}' in response.text
+        assert "cado_active_sessions 1" in response.text
+
+    def test_shared_notebook(self, test_client: TestClient, tmp_path):
+        filepath = tmp_path / "notebook.cado"
+        notebook = Notebook(name="notebook")
+        cell_id = notebook.add_cell()
+        notebook.to_filepath(filepath)
+
+        with test_client.websocket_connect(API_ENDPOINT) as first, \
+                test_client.websocket_connect(API_ENDPOINT) as second:
+            for socket in [first, second]:
+                socket.send_json({"type": "open-notebook", "filepath": str(filepath)})
+                assert socket.receive_json()["type"] == "get-notebook-response"
+
+            first.send_json({"type": "update-cell-code", "cell_id": str(cell_id), "code": "a = 1"})
+            assert first.receive_json()["type"] == "notebook-delta-response"
+            response_json = second.receive_json()
+            assert response_json["type"] == "notebook-delta-response"
+            assert response_json["cells"][0]["code"] == "a = 1"
+
+    def test_cancel_cell(self, test_client: TestClient, tmp_path):
+        filepath = tmp_path / "notebook.cado"
+        notebook = Notebook(name="notebook")
+        cell_id = notebook.add_cell()
+        notebook.set_cell_code(cell_id, LONG_CELL_CODE)
+        notebook.to_filepath(filepath)
+
+        with test_client.websocket_connect(API_ENDPOINT) as socket:
+            socket.send_json({"type": "open-notebook", "filepath": str(filepath)})
+            assert socket.receive_json()["type"] == "get-notebook-response"
+
+            for delay in [0.2, 0]:
+                # A cancel sent straight after the run also stops it, even if the run has not started yet
+                start_time = time.perf_counter()
+                socket.send_json({"type": "run-cell", "cell_id": str(cell_id)})
+                time.sleep(delay)
+                socket.send_json({"type": "cancel-cell", "cell_id": str(cell_id)})
+                response_json = socket.receive_json()
+                assert response_json["type"] == "error-response"
+                assert "cancelled" in response_json["error"]
+                assert time.perf_counter() - start_time < 5
+
+    def test_status_while_running(self, test_client: TestClient, tmp_path):
+        filepath = tmp_path / "notebook.cado"
+        notebook = Notebook(name="notebook")
+        cell_id = notebook.add_cell()
+        notebook.set_cell_code(cell_id, LONG_CELL_CODE)
+        notebook.to_filepath(filepath)
+
+        with test_client.websocket_connect(API_ENDPOINT) as socket:
+            socket.send_json({"type": "open-notebook", "filepath": str(filepath)})
+            assert socket.receive_json()["type"] == "get-notebook-response"
+
+            socket.send_json({"type": "run-cell", "cell_id": str(cell_id)})
+            time.sleep(0.2)
+            # Cells run off the event loop, so the server keeps answering while one runs
+            start_time = time.perf_counter()
+            response = test_client.get("/status")
+            assert response.status_code == 200
+            assert time.perf_counter() - start_time < 1
+            socket.send_json({"type": "cancel-cell", "cell_id": str(cell_id)})
+            assert socket.receive_json()["type"] == "error-response"
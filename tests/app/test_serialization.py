@@ -0,0 +1,18 @@
+import json
+
+from cado.app.message import GetNotebookResponse
+from cado.app.serialization import encode_message
+from cado.core.notebook import Notebook
+
+
+class TestSerialization:
+
+    def test_encode_message(self):
+        notebook = Notebook(name="notebook")
+        cell_id = notebook.add_cell()
+        notebook.update_cell_output_name(cell_id, "a")
+        notebook.set_cell_code(cell_id, "a = {1: 2 ** 70}")
+        notebook.run_cell(cell_id)
+
+        message = GetNotebookResponse(notebook=notebook)
+        assert json.loads(encode_message(message)) == json.loads(message.json())
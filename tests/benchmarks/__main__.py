@@ -0,0 +1,67 @@
+"""Run the benchmark suite and compare it against a stored baseline.
+
+Run with: python -m tests.benchmarks [--json results.json] [--baseline baseline.json]
+
+Timings are the best of several runs. With a baseline, benchmarks that are slower than the baseline by more than
+the tolerance are reported as regressions and the exit code is 1.
+"""
+import argparse
+import json
+import sys
+from dataclasses import asdict
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from tests.benchmarks.suite import BenchmarkResult, run_benchmarks
+
+
+def load_baseline(filepath: Path) -> Dict[str, float]:
+    with filepath.open() as f:
+        results_json = json.load(f)
+    return {result["name"]: result["best"] for result in results_json["results"]}
+
+
+def print_results(results: List[BenchmarkResult], baseline: Optional[Dict[str, float]], tolerance: float) -> int:
+    regressions = 0
+    print(f"{'benchmark':<44} {'best (ms)':>12} {'mean (ms)':>12} {'baseline (ms)':>14} {'change':>8}")
+    for result in results:
+        line = f"{result.name:<44} {result.best * 1000:>12.3f} {result.mean * 1000:>12.3f}"
+        if baseline is not None and result.name in baseline:
+            change = result.best / baseline[result.name] - 1
+            line += f" {baseline[result.name] * 1000:>14.3f} {change:>+7.0%}"
+            if change > tolerance:
+                line += "  REGRESSION"
+                regressions += 1
+        print(line)
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(prog="python -m tests.benchmarks", description=__doc__.splitlines()[0])
+    parser.add_argument("--scale", type=float, default=1.0, help="Multiplier for the size of generated notebooks.")
+    parser.add_argument("--repeat", type=int, default=5, help="Number of timed runs of each benchmark.")
+    parser.add_argument("--filter", default="", help="Only run benchmarks with names containing this text.")
+    parser.add_argument("--json", type=Path, help="Write results as JSON to this file, or - for stdout.")
+    parser.add_argument("--baseline", type=Path, help="Compare against results previously saved with --json.")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed slowdown relative to the baseline.")
+    args = parser.parse_args()
+
+    baseline = load_baseline(args.baseline) if args.baseline is not None else None
+    results = run_benchmarks(args.scale, args.repeat, args.filter)
+    results_json = json.dumps({
+        "python": sys.version,
+        "scale": args.scale,
+        "results": [asdict(result) for result in results],
+    }, indent=2)
+
+    if args.json is not None and str(args.json) == "-":
+        print(results_json)
+        return 0
+    if args.json is not None:
+        args.json.write_text(results_json)
+    regressions = print_results(results, baseline, args.tolerance)
+    return 1 if regressions > 0 else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
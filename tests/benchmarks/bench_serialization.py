@@ -0,0 +1,47 @@
+"""Benchmark the cost of serializing a full notebook response for notebooks of increasing size.
+
+Run with: python -m tests.benchmarks.bench_serialization
+"""
+import json
+import timeit
+from typing import Callable
+
+from cado.app.message import GetNotebookResponse
+from cado.app.serialization import encode_message
+from cado.core.cell_status import CellStatus
+from cado.core.notebook import Notebook
+
+CELL_COUNTS = [10, 100, 1000]
+OUTPUT_SIZE = 100
+
+
+def make_notebook(n_cells: int, output_size: int) -> Notebook:
+    notebook = Notebook(name=f"notebook-{n_cells}")
+    for i in range(n_cells):
+        cell_id = notebook.add_cell()
+        cell = notebook.get_cell(cell_id)
+        cell.code = f"output_{i} = list(range({output_size}))"
+        cell.output_name = f"output_{i}"
+        cell.output = {"values": list(range(output_size)), "name": f"output_{i}"}
+        cell.status = CellStatus.OK
+    return notebook
+
+
+def time_per_call(func: Callable[[], object], number: int) -> float:
+    return min(timeit.repeat(func, number=number, repeat=5)) / number
+
+
+def main() -> None:
+    print(f"{'cells':>8} {'bytes':>12} {'double encode (ms)':>20} {'single pass (ms)':>18} {'speedup':>8}")
+    for n_cells in CELL_COUNTS:
+        message = GetNotebookResponse(notebook=make_notebook(n_cells, OUTPUT_SIZE))
+        number = max(1, 1000 // n_cells)
+        double_encode = time_per_call(lambda: json.dumps(message.json()), number)  # pylint: disable=cell-var-from-loop
+        single_pass = time_per_call(lambda: encode_message(message), number)  # pylint: disable=cell-var-from-loop
+        size = len(encode_message(message).encode())
+        print(f"{n_cells:>8} {size:>12} {double_encode * 1000:>20.3f} {single_pass * 1000:>18.3f} "
+              f"{double_encode / single_pass:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
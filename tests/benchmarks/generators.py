@@ -0,0 +1,68 @@
+"""Synthetic notebooks with the graph shapes and output sizes that stress the engine."""
+from typing import List
+from uuid import UUID
+
+from cado.core.notebook import Notebook
+
+
+def add_cell(notebook: Notebook, output_name: str, input_names: List[str], code: str) -> UUID:
+    cell_id = notebook.add_cell()
+    notebook.update_cell_output_name(cell_id, output_name)
+    notebook.update_cell_input_names(cell_id, input_names)
+    notebook.set_cell_code(cell_id, code)
+    return cell_id
+
+
+def make_chain(n_cells: int) -> Notebook:
+    """Each cell takes the previous cell's output as its only input."""
+    notebook = Notebook(name=f"chain-{n_cells}")
+    add_cell(notebook, "x0", [], "x0 = 0")
+    for i in range(1, n_cells):
+        add_cell(notebook, f"x{i}", [f"x{i - 1}"], f"x{i} = x{i - 1} + 1")
+    return notebook
+
+
+def make_fan_out(n_children: int) -> Notebook:
+    """One root cell with many children that only depend on the root."""
+    notebook = Notebook(name=f"fan-out-{n_children}")
+    add_cell(notebook, "root", [], "root = 1")
+    for i in range(n_children):
+        add_cell(notebook, f"x{i}", ["root"], f"x{i} = root + {i}")
+    return notebook
+
+
+def make_diamond_lattice(width: int, depth: int) -> Notebook:
+    """Layers of cells where every cell depends on every cell of the layer before, so paths multiply."""
+    notebook = Notebook(name=f"lattice-{width}x{depth}")
+    add_cell(notebook, "root", [], "root = 1")
+    previous = ["root"]
+    for layer in range(depth):
+        current = [f"x{layer}_{i}" for i in range(width)]
+        for name in current:
+            add_cell(notebook, name, previous, f"{name} = {' + '.join(previous)}")
+        previous = current
+    return notebook
+
+
+def make_large_outputs(n_cells: int, output_size: int) -> Notebook:
+    """Independent cells that each produce a large list output."""
+    notebook = Notebook(name=f"large-outputs-{n_cells}")
+    for i in range(n_cells):
+        add_cell(notebook, f"x{i}", [], f"x{i} = [{{'index': j, 'label': str(j)}} for j in range({output_size})]")
+    return notebook
+
+
+def make_many_cells(n_cells: int) -> Notebook:
+    """Many small independent cells."""
+    notebook = Notebook(name=f"many-cells-{n_cells}")
+    for i in range(n_cells):
+        add_cell(notebook, f"x{i}", [], f"x{i} = {i}")
+    return notebook
+
+
+def run_all(notebook: Notebook) -> Notebook:
+    """Run every cell that has no inputs, which runs the whole notebook."""
+    for cell in list(notebook.cells):
+        if len(cell.input_names) == 0:
+            notebook.run_cell(cell.id)
+    return notebook
@@ -0,0 +1,145 @@
+"""Benchmarks for the reactive engine, the persistence layer, the message round-trip and CLI startup."""
+import subprocess
+import sys
+import tempfile
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List
+
+from cado.app.message import MessageType
+from cado.app.response import process_message
+from cado.app.serialization import encode_message
+from cado.app.session_state import SessionState
+from cado.core.notebook import Notebook
+import cado
+from tests.benchmarks.generators import (make_chain, make_diamond_lattice, make_fan_out, make_large_outputs,
+                                         make_many_cells, run_all)
+
+
+@dataclass
+class Benchmark:
+    name: str
+    # Builds fresh state and returns the operation to time, so that setup is not part of the timing
+    setup: Callable[[], Callable[[], object]]
+
+
+@dataclass
+class BenchmarkResult:
+    name: str
+    best: float
+    mean: float
+    repeat: int
+
+
+def time_benchmark(benchmark: Benchmark, repeat: int) -> BenchmarkResult:
+    timings = []
+    for _ in range(repeat):
+        operation = benchmark.setup()
+        start_time = time.perf_counter()
+        operation()
+        timings.append(time.perf_counter() - start_time)
+    return BenchmarkResult(name=benchmark.name, best=min(timings), mean=sum(timings) / len(timings), repeat=repeat)
+
+
+def get_benchmarks(scale: float, tmp_dirpath: Path) -> List[Benchmark]:
+    n_chain = int(500 * scale)
+    n_fan_out = int(1000 * scale)
+    n_many = int(2000 * scale)
+    lattice_width = max(2, int(10 * scale))
+    n_large = max(1, int(20 * scale))
+    large_output_size = 5000
+    filepaths = _unique_filepaths(tmp_dirpath)
+
+    def run_first(notebook: Notebook) -> Callable[[], object]:
+        return lambda: notebook.run_cell(notebook.cells[0].id)
+
+    def clear_first() -> Callable[[], object]:
+        notebook = run_all(make_chain(n_chain))
+        return lambda: notebook.clear_cell(notebook.cells[0].id)
+
+    def reorder() -> Callable[[], object]:
+        notebook = make_many_cells(n_many)
+        cell_ids = [cell.id for cell in reversed(notebook.cells)]
+        return lambda: notebook.reorder_cells(cell_ids)
+
+    def rename_output() -> Callable[[], object]:
+        notebook = run_all(make_chain(n_chain))
+        cell_id = notebook.cells[n_chain // 2].id
+        return lambda: notebook.update_cell_output_name(cell_id, "renamed")
+
+    def update_inputs() -> Callable[[], object]:
+        notebook = make_diamond_lattice(lattice_width, lattice_width)
+        cell = notebook.cells[-1]
+        input_names = list(cell.input_names)
+        return lambda: notebook.update_cell_input_names(cell.id, input_names)
+
+    def save() -> Callable[[], object]:
+        notebook = run_all(make_large_outputs(n_large, large_output_size))
+        filepath = next(filepaths)
+        return lambda: notebook.to_filepath(filepath)
+
+    def save_unchanged() -> Callable[[], object]:
+        notebook = run_all(make_large_outputs(n_large, large_output_size))
+        filepath = next(filepaths)
+        notebook.to_filepath(filepath)
+        return lambda: notebook.to_filepath(filepath)
+
+    def load() -> Callable[[], object]:
+        filepath = next(filepaths)
+        run_all(make_large_outputs(n_large, large_output_size)).to_filepath(filepath)
+        return lambda: Notebook.from_filepath(filepath).load_outputs()
+
+    def round_trip(message_json: Callable[[Notebook], Dict[str, object]]) -> Callable[[], Callable[[], object]]:
+        def setup() -> Callable[[], object]:
+            notebook = run_all(make_many_cells(n_many))
+            session_state = SessionState(notebook=notebook)
+            message = message_json(notebook)
+            message_type = MessageType.from_str(str(message["type"]))
+            return lambda: encode_message(process_message(message_type, message, session_state))
+        return setup
+
+    def start_cli(*args: str) -> Callable[[], Callable[[], object]]:
+        # Run from the repository so that the CLI can be started without installing the package
+        cwd = Path(cado.__file__).resolve().parent.parent
+        command = [sys.executable, "-c", "from cado.cli.cli import main; main()", *args]
+        return lambda: lambda: subprocess.run(command, cwd=cwd, capture_output=True, check=True)
+
+    return [
+        Benchmark(f"run-chain-{n_chain}", lambda: run_first(make_chain(n_chain))),
+        Benchmark(f"run-fan-out-{n_fan_out}", lambda: run_first(make_fan_out(n_fan_out))),
+        Benchmark(f"run-lattice-{lattice_width}x{lattice_width}",
+                  lambda: run_first(make_diamond_lattice(lattice_width, lattice_width))),
+        Benchmark(f"clear-chain-{n_chain}", clear_first),
+        Benchmark(f"reorder-{n_many}", reorder),
+        Benchmark(f"rename-output-chain-{n_chain}", rename_output),
+        Benchmark(f"update-inputs-lattice-{lattice_width}x{lattice_width}", update_inputs),
+        Benchmark(f"save-large-outputs-{n_large}", save),
+        Benchmark(f"save-unchanged-large-outputs-{n_large}", save_unchanged),
+        Benchmark(f"load-large-outputs-{n_large}", load),
+        Benchmark(f"message-get-notebook-{n_many}", round_trip(lambda notebook: {
+            "type": MessageType.GET_NOTEBOOK.value,
+        })),
+        Benchmark(f"message-update-cell-code-{n_many}", round_trip(lambda notebook: {
+            "type": MessageType.UPDATE_CELL_CODE.value,
+            "cell_id": str(notebook.cells[0].id),
+            "code": "x0 = -1",
+        })),
+        Benchmark("startup-help", start_cli("--help")),
+        Benchmark("startup-run-help", start_cli("run", "--help")),
+    ]
+
+
+def run_benchmarks(scale: float, repeat: int, name_filter: str = "") -> List[BenchmarkResult]:
+    with tempfile.TemporaryDirectory() as tmp_dirname:
+        benchmarks = get_benchmarks(scale, Path(tmp_dirname))
+        return [time_benchmark(benchmark, repeat) for benchmark in benchmarks if name_filter in benchmark.name]
+
+
+def _unique_filepaths(dirpath: Path) -> Iterator[Path]:
+    i = 0
+    while True:
+        i += 1
+        notebook_dirpath = dirpath / str(i)
+        notebook_dirpath.mkdir()
+        yield notebook_dirpath / "notebook.cado"
@@ -1,11 +1,17 @@
+import subprocess
+import sys
+from pathlib import Path
 from unittest.mock import Mock
 
 import pytest
 from click.testing import CliRunner
 from pytest import MonkeyPatch
 
-from cado.cli.cli import up_command
+import cado
+from cado.cli.cli import run_command, up_command
 from cado.app import app as app_module
+from cado.core.cell_status import CellStatus
+from cado.core.notebook import Notebook
 
 
 @pytest.fixture(scope="function")
@@ -23,3 +29,41 @@ class TestMain:
         result = runner.invoke(up_command, [])
         assert result.exit_code == 0
         assert result.output == "output-message"
+
+    def test_run(self, tmp_path):
+        filepath = tmp_path / "notebook.cado"
+        notebook = Notebook(name="notebook")
+        cell_ids = [notebook.add_cell() for _ in range(4)]
+        for cell_id, name, code in zip(cell_ids, ["a", "b", "c", "d"], ["a = 1", "b = a + 1", "c = 1 / 0", ""]):
+            notebook.update_cell_output_name(cell_id, name)
+            notebook.set_cell_code(cell_id, code)
+        notebook.update_cell_input_names(cell_ids[1], ["a"])
+        notebook.to_filepath(filepath)
+
+        runner = CliRunner()
+        result = runner.invoke(run_command, [str(filepath), "--output", "b", "--timings"])
+        assert result.exit_code == 0
+        assert "Ran 2 cells" in result.output
+        notebook = Notebook.from_filepath(filepath)
+        notebook.load_outputs()
+        assert notebook.get_cell(cell_ids[1]).output == 2
+        assert notebook.get_cell(cell_ids[2]).status == CellStatus.EXPIRED
+
+        result = runner.invoke(run_command, [str(filepath)])
+        assert result.exit_code == 1
+        assert "division by zero" in result.output
+
+        # Empty cells are skipped when running the whole notebook
+        notebook = Notebook.from_filepath(filepath)
+        notebook.set_cell_code(cell_ids[2], "c = 1")
+        notebook.to_filepath(filepath)
+        result = runner.invoke(run_command, [str(filepath), "--timings"])
+        assert result.exit_code == 0
+        assert "Ran 3 cells" in result.output
+
+    def test_lazy_imports(self):
+        heavy_modules = ["fastapi", "pkg_resources", "pydantic", "uvicorn"]
+        code = f"import sys, cado.cli.cli; print([m for m in {heavy_modules} if m in sys.modules])"
+        cwd = Path(cado.__file__).resolve().parent.parent
+        result = subprocess.run([sys.executable, "-c", code], cwd=cwd, capture_output=True, text=True, check=True)
+        assert result.stdout.strip() == "[]"
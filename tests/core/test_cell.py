@@ -8,3 +8,20 @@ class TestCell:
         cell.code = "a = 4 + 5"
         cell.run({})
         assert cell.output == 9
+
+    def test_output_size(self):
+        cell = Cell(output_name="a")
+        cell.code = "a = ['abc'] * 10"
+        cell.run({})
+        assert cell.output_size == 70
+        cell.clear()
+        assert cell.output_size is None
+
+    def test_metrics(self):
+        cell = Cell(output_name="a")
+        cell.code = "a = sum(range(1000))"
+        cell.run({})
+        cell.run({})
+        assert cell.metrics.run_count == 2
+        assert cell.metrics.wall_time is not None and cell.metrics.wall_time >= 0
+        assert cell.metrics.cpu_time is not None
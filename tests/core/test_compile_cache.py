@@ -0,0 +1,14 @@
+from cado.core.compile_cache import CompileCache
+
+
+class TestCompileCache:
+
+    def test_compile(self):
+        cache = CompileCache(max_size=2)
+        code_object = cache.compile("a = 1")
+        assert cache.compile("a = 1") is code_object
+
+        cache.compile("b = 2")
+        cache.compile("c = 3")
+        assert len(cache) == 2
+        assert cache.compile("a = 1") is not code_object
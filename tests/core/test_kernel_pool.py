@@ -0,0 +1,30 @@
+import sys
+
+import pytest
+
+from cado.core.kernel_pool import create_kernel_pool, preload_modules, shutdown_kernel_pool
+
+
+class TestKernelPool:
+
+    def test_preload_modules(self):
+        assert preload_modules(["json", "cado.missing"]) == ["cado.missing"]
+
+    def test_create_kernel_pool(self):
+        executor = create_kernel_pool(1, ["decimal"])
+        try:
+            assert "decimal" in executor.submit(_loaded_modules).result()
+        finally:
+            executor.shutdown()
+
+    def test_shutdown_kernel_pool(self):
+        executor = create_kernel_pool(1, [])
+        future = executor.submit(_loaded_modules)
+        shutdown_kernel_pool(executor)
+        assert future.done()
+        with pytest.raises(RuntimeError):
+            executor.submit(_loaded_modules)
+
+
+def _loaded_modules():
+    return list(sys.modules)
@@ -0,0 +1,38 @@
+import os
+from pathlib import Path
+
+from cado.core.cell import CellResult
+from cado.core.memo_store import MemoStore
+from cado.core.notebook import Notebook
+
+
+class TestMemoStore:
+
+    def test_get_put(self, tmp_path: Path):
+        memo_store = MemoStore(tmp_path)
+        assert memo_store.get("key") is None
+        memo_store.put("key", CellResult(output=[1, 2], stdout="out", stderr=""))
+        result = memo_store.get("key")
+        assert result == CellResult(output=[1, 2], stdout="out", stderr="")
+
+    def test_evict(self, tmp_path: Path):
+        memo_store = MemoStore(tmp_path, max_bytes=150)
+        memo_store.put("a", CellResult(output="a" * 50, stdout="", stderr=""))
+        os.utime(tmp_path / "a.json", (0, 0))
+        memo_store.put("b", CellResult(output="b" * 50, stdout="", stderr=""))
+        assert memo_store.get("a") is None
+        assert memo_store.get("b") is not None
+
+    def test_run_cell(self, tmp_path: Path):
+        memo_store = MemoStore(tmp_path / "memo")
+        runs_filepath = tmp_path / "runs.txt"
+        notebook = Notebook(name="notebook")
+        cell_id = notebook.add_cell()
+        notebook.update_cell_output_name(cell_id, "a")
+        notebook.set_cell_code(cell_id, f"open({str(runs_filepath)!r}, 'a').write('x')\na = 1")
+
+        notebook.run_cell(cell_id, memo_store=memo_store)
+        notebook.clear_cell(cell_id)
+        notebook.run_cell(cell_id, memo_store=memo_store)
+        assert notebook.get_cell(cell_id).output == 1
+        assert runs_filepath.read_text() == "x"
@@ -1,4 +1,14 @@
-from cado.core.notebook import Notebook
+import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from cado.core.cancel_token import CancelToken
+from cado.core.cell_status import CellStatus
+from cado.core.cycle_error import CycleError
+from cado.core.evaluation import Evaluation
+from cado.core.notebook import Notebook, find_shared_output_refs
 
 
 class TestNotebook:
@@ -7,3 +17,346 @@ class TestNotebook:
         notebook_filename = "notebook.cado"
         notebook = Notebook(name=notebook_filename)
         assert notebook.name == notebook_filename
+
+    def test_graph_index(self):
+        notebook = Notebook(name="notebook")
+        a_id = notebook.add_cell()
+        b_id = notebook.add_cell()
+        notebook.update_cell_output_name(a_id, "a")
+        notebook.update_cell_output_name(b_id, "b")
+        notebook.update_cell_input_names(b_id, ["a"])
+
+        a_cell = notebook.get_cell(a_id)
+        b_cell = notebook.get_cell(b_id)
+        assert list(notebook.get_children(a_cell)) == [b_cell]
+        assert list(notebook.get_parents(b_cell)) == [a_cell]
+
+        notebook.update_cell_output_name(a_id, "c")
+        assert list(notebook.get_children(a_cell)) == []
+
+        notebook.delete_cell(b_id)
+        notebook.reorder_cells([a_id])
+        assert [cell.id for cell in notebook.cells] == [a_id]
+
+    def test_run_cell_diamond(self):
+        notebook = Notebook(name="notebook")
+        cell_ids = {}
+        for name in ["a", "b", "c", "d"]:
+            cell_ids[name] = notebook.add_cell()
+            notebook.update_cell_output_name(cell_ids[name], name)
+        notebook.update_cell_input_names(cell_ids["b"], ["a"])
+        notebook.update_cell_input_names(cell_ids["c"], ["a"])
+        notebook.update_cell_input_names(cell_ids["d"], ["b", "c"])
+        notebook.set_cell_code(cell_ids["a"], "a = 1")
+        notebook.set_cell_code(cell_ids["b"], "b = a + 1")
+        notebook.set_cell_code(cell_ids["c"], "c = a + 2")
+        notebook.set_cell_code(cell_ids["d"], "print('run')\nd = b + c")
+
+        plan = notebook.run_cell(cell_ids["a"])
+        assert plan.cell_ids == [cell_ids["a"], cell_ids["b"], cell_ids["c"], cell_ids["d"]]
+        d_cell = notebook.get_cell(cell_ids["d"])
+        assert d_cell.output == 5
+        assert d_cell.stdout == "run"
+
+        notebook.clear_cell(cell_ids["a"])
+        plan = notebook.plan_run(cell_ids["d"])
+        assert plan.cell_ids == [cell_ids["a"], cell_ids["b"], cell_ids["c"], cell_ids["d"]]
+
+    def test_run_cell_early_cutoff(self):
+        notebook = Notebook(name="notebook")
+        cell_ids = {}
+        for name in ["a", "b", "c"]:
+            cell_ids[name] = notebook.add_cell()
+            notebook.update_cell_output_name(cell_ids[name], name)
+        notebook.update_cell_input_names(cell_ids["b"], ["a"])
+        notebook.update_cell_input_names(cell_ids["c"], ["b"])
+        notebook.set_cell_code(cell_ids["a"], "a = 1")
+        notebook.set_cell_code(cell_ids["b"], "print('b')\nb = a + 1")
+        notebook.set_cell_code(cell_ids["c"], "c = b + 1")
+        notebook.run_cell(cell_ids["a"])
+
+        # The output of a is unchanged, so b and c reuse their results
+        notebook.set_cell_code(cell_ids["a"], "# One\na = 1")
+        assert notebook.get_cell(cell_ids["c"]).status == CellStatus.EXPIRED
+        notebook.run_cell(cell_ids["a"])
+        b_cell = notebook.get_cell(cell_ids["b"])
+        c_cell = notebook.get_cell(cell_ids["c"])
+        assert (b_cell.output, b_cell.stdout, b_cell.status) == (2, "b", CellStatus.OK)
+        assert (c_cell.metrics.run_count, c_cell.metrics.cache_hits) == (1, 1)
+
+        # Cells that are run directly always run
+        notebook.run_cell(cell_ids["b"])
+        assert b_cell.metrics.run_count == 2
+        assert c_cell.metrics.run_count == 1
+
+        notebook.set_cell_code(cell_ids["a"], "a = 2")
+        notebook.run_cell(cell_ids["a"])
+        assert c_cell.output == 4
+        assert c_cell.metrics.run_count == 2
+
+    def test_estimate_size_previous(self):
+        notebook = Notebook(name="notebook")
+        cell_id = notebook.add_cell()
+        notebook.update_cell_output_name(cell_id, "a")
+        notebook.set_cell_code(cell_id, "a = [1] * 1000")
+        notebook.run_cell(cell_id)
+        size = notebook.estimate_size()
+
+        # A cleared cell keeps its result aside, until it is discarded
+        notebook.clear_cell(cell_id)
+        assert notebook.estimate_size() == size
+        notebook.discard_previous_results()
+        assert notebook.estimate_size() == len(notebook.get_cell(cell_id).code)
+
+    def test_clear_cell_previous(self, monkeypatch):
+        notebook = Notebook(name="notebook")
+        a_id = notebook.add_cell()
+        b_id = notebook.add_cell()
+        notebook.update_cell_output_name(a_id, "a")
+        notebook.set_cell_code(a_id, "a = [1] * 1000")
+        notebook.update_cell_input_names(b_id, ["a"])
+        notebook.update_cell_output_name(b_id, "b")
+        notebook.set_cell_code(b_id, "b = a * 2")
+        notebook.run_cell(a_id)
+        a_cell = notebook.get_cell(a_id)
+        b_cell = notebook.get_cell(b_id)
+
+        # Clearing a cell drops its result, while the descendants it expires keep theirs aside
+        notebook.clear_cell(a_id, keep_previous=False)
+        assert a_cell.previous_size == 0
+        assert b_cell.previous_size > 0
+
+        # Results kept aside are dropped, largest first, once they go over the budget
+        notebook.run_cell(a_id)
+        monkeypatch.setattr("cado.core.notebook.MAX_PREVIOUS_SIZE", 5000)
+        notebook.clear_cell(a_id)
+        assert a_cell.previous_size > 0
+        assert b_cell.previous_size == 0
+
+    def test_run_cell_lazy(self):
+        notebook = Notebook(name="notebook", evaluation=Evaluation.LAZY)
+        cell_ids = {}
+        for name in ["a", "b", "c"]:
+            cell_ids[name] = notebook.add_cell()
+            notebook.update_cell_output_name(cell_ids[name], name)
+        notebook.update_cell_input_names(cell_ids["b"], ["a"])
+        notebook.update_cell_input_names(cell_ids["c"], ["b"])
+        notebook.set_cell_code(cell_ids["a"], "a = 1")
+        notebook.set_cell_code(cell_ids["b"], "b = a + 1")
+        notebook.set_cell_code(cell_ids["c"], "c = b + 1")
+
+        # Running a cell leaves its descendants expired until they are pulled
+        plan = notebook.run_cell(cell_ids["a"])
+        assert plan.cell_ids == [cell_ids["a"]]
+        c_cell = notebook.get_cell(cell_ids["c"])
+        assert c_cell.status == CellStatus.EXPIRED
+
+        plan = notebook.run_cells([], pull_cell_ids=[cell_ids["c"]])
+        assert plan.cell_ids == [cell_ids["b"], cell_ids["c"]]
+        assert (c_cell.output, c_cell.status) == (3, CellStatus.OK)
+
+        # A pulled cell whose inputs are unchanged reuses its result
+        notebook.set_cell_code(cell_ids["a"], "# One\na = 1")
+        notebook.run_cell(cell_ids["a"])
+        assert c_cell.status == CellStatus.EXPIRED
+        notebook.run_cells([], pull_cell_ids=[cell_ids["c"]])
+        assert (c_cell.output, c_cell.status) == (3, CellStatus.OK)
+        assert (c_cell.metrics.run_count, c_cell.metrics.cache_hits) == (1, 1)
+
+        # Cells that are already up to date are not planned
+        assert notebook.plan_run_cells([], pull_cell_ids=[cell_ids["c"]]).cell_ids == []
+
+    def test_plan_run_all(self):
+        notebook = Notebook(name="notebook")
+        cell_ids = {}
+        for name in ["a", "b", "c", "d"]:
+            cell_ids[name] = notebook.add_cell()
+            notebook.update_cell_output_name(cell_ids[name], name)
+        for name in ["a", "b", "c"]:
+            notebook.set_cell_code(cell_ids[name], f"{name} = 1")
+        notebook.update_cell_input_names(cell_ids["a"], ["c"])
+
+        # Empty cells are left out
+        plan = notebook.plan_run_all()
+        assert plan.cell_id is None
+        assert plan.cell_ids == [cell_ids["b"], cell_ids["c"], cell_ids["a"]]
+        assert notebook.plan_run_all(["a"]).cell_ids == [cell_ids["c"], cell_ids["a"]]
+        with pytest.raises(ValueError, match="No cell with output name"):
+            notebook.plan_run_all(["missing"])
+
+    def test_run_cell_executor(self):
+        notebook = Notebook(name="notebook")
+        root_id = notebook.add_cell()
+        notebook.update_cell_output_name(root_id, "root")
+        notebook.set_cell_code(root_id, "root = 2")
+        child_ids = []
+        for i in range(4):
+            child_id = notebook.add_cell()
+            notebook.update_cell_output_name(child_id, f"child_{i}")
+            notebook.update_cell_input_names(child_id, ["root"])
+            notebook.set_cell_code(child_id, f"child_{i} = root * {i}")
+            child_ids.append(child_id)
+
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            notebook.run_cell(root_id, executor=executor)
+        assert [notebook.get_cell(child_id).output for child_id in child_ids] == [0, 2, 4, 6]
+
+    def test_set_cell_code_syntax_error(self):
+        notebook = Notebook(name="notebook")
+        cell_id = notebook.add_cell()
+        notebook.set_cell_code(cell_id, "a = (")
+        cell = notebook.get_cell(cell_id)
+        assert cell.status == CellStatus.ERROR
+        assert "SyntaxError" in cell.stderr
+        assert cell.code == "a = ("
+
+    def test_run_cell_cancel(self):
+        notebook = Notebook(name="notebook")
+        a_id = notebook.add_cell()
+        b_id = notebook.add_cell()
+        notebook.update_cell_output_name(a_id, "a")
+        notebook.update_cell_input_names(b_id, ["a"])
+        notebook.set_cell_code(a_id, "while True:\n    pass")
+        notebook.set_cell_code(b_id, "print(a)")
+
+        cancel_token = CancelToken()
+        timer = threading.Timer(0.2, cancel_token.cancel)
+        timer.start()
+        with pytest.raises(ValueError, match="cancelled"):
+            notebook.run_cell(a_id, cancel_token=cancel_token)
+        assert notebook.get_cell(a_id).status == CellStatus.EXPIRED
+        assert notebook.get_cell(b_id).status == CellStatus.EXPIRED
+
+    def test_run_cell_cancel_cell_id(self):
+        notebook = Notebook(name="notebook")
+        a_id = notebook.add_cell()
+        b_id = notebook.add_cell()
+        notebook.set_cell_code(a_id, "import time\ntime.sleep(0.3)")
+        notebook.set_cell_code(b_id, "pass")
+
+        # A cancel for a cell that is not in the run does not stop it
+        cancel_token = CancelToken()
+        timer = threading.Timer(0.1, cancel_token.cancel, args=(b_id,))
+        timer.start()
+        notebook.run_cell(a_id, cancel_token=cancel_token)
+        assert notebook.get_cell(a_id).status == CellStatus.OK
+
+        # The cancel stays pending for a run of the cell that starts later, until it expires
+        with pytest.raises(ValueError, match="cancelled"):
+            notebook.run_cell(b_id, cancel_token=cancel_token)
+        cancel_token.expire(b_id)
+        notebook.run_cell(b_id, cancel_token=cancel_token)
+        assert notebook.get_cell(b_id).status == CellStatus.OK
+
+    def test_to_filepath(self, tmp_path):
+        filepath = tmp_path / "notebook.cado"
+        notebook = Notebook(name="notebook")
+        notebook.add_cell()
+        notebook.to_filepath(filepath)
+        notebook.to_filepath(filepath)
+        assert [p.name for p in tmp_path.iterdir()] == ["notebook.cado"]
+        assert Notebook.from_filepath(filepath).cells[0].id == notebook.cells[0].id
+
+    def test_to_filepath_outputs(self, tmp_path):
+        filepath = tmp_path / "notebook.cado"
+        notebook = Notebook(name="notebook")
+        a_id = notebook.add_cell()
+        b_id = notebook.add_cell()
+        notebook.update_cell_output_name(a_id, "a")
+        notebook.set_cell_code(a_id, "print('hi')\na = [1] * 1000")
+        notebook.update_cell_input_names(b_id, ["a"])
+        notebook.update_cell_output_name(b_id, "b")
+        notebook.set_cell_code(b_id, "b = len(a)")
+        notebook.run_cell(a_id)
+        notebook.to_filepath(filepath)
+        assert "1, 1" not in filepath.read_text()
+
+        loaded = Notebook.from_filepath(filepath)
+        a_cell = loaded.get_cell(a_id)
+        assert not a_cell.outputs_loaded
+        assert a_cell.output is None
+        loaded.run_cell(b_id)
+        assert a_cell.outputs_loaded
+        assert a_cell.stdout == "hi"
+        assert loaded.get_cell(b_id).output == 1000
+
+    def test_to_filepath_copied_outputs(self, tmp_path):
+        a_filepath = tmp_path / "a.cado"
+        b_filepath = tmp_path / "b.cado"
+        notebook = Notebook(name="notebook")
+        cell_id = notebook.add_cell()
+        notebook.update_cell_output_name(cell_id, "a")
+        notebook.set_cell_code(cell_id, "a = 1")
+        notebook.run_cell(cell_id)
+        notebook.to_filepath(a_filepath)
+        shutil.copy(a_filepath, b_filepath)
+        Notebook(name="other").to_filepath(tmp_path / "other.cado")
+
+        # The copy shares the output store, so saving it keeps the outputs the original refers to
+        copied = Notebook.from_filepath(b_filepath)
+        copied.set_cell_code(cell_id, "a = 2")
+        copied.run_cell(cell_id)
+        copied.to_filepath(b_filepath)
+        loaded = Notebook.from_filepath(a_filepath)
+        loaded.load_outputs()
+        assert loaded.get_cell(cell_id).output == 1
+        assert find_shared_output_refs(a_filepath, notebook.id) == {copied.get_cell(cell_id).output_ref}
+
+    def test_from_filepath_migrates_version(self, tmp_path):
+        filepath = tmp_path / "notebook.cado"
+        notebook = Notebook(name="notebook", version="0.1")
+        cell_id = notebook.add_cell()
+        notebook.update_cell_output_name(cell_id, "a")
+        notebook.set_cell_code(cell_id, "a = 1")
+        notebook.run_cell(cell_id)
+        filepath.write_text(notebook.json())
+
+        loaded = Notebook.from_filepath(filepath)
+        assert loaded.version == "0.2"
+        assert loaded.get_cell(cell_id).output == 1
+        loaded.to_filepath(filepath)
+        assert Notebook.from_filepath(filepath).get_cell(cell_id).output_ref is not None
+
+    def test_run_cell_binary_output(self, tmp_path):
+        notebook = Notebook(name="notebook")
+        a_id = notebook.add_cell()
+        b_id = notebook.add_cell()
+        notebook.update_cell_output_name(a_id, "a")
+        notebook.set_cell_code(a_id, "a = bytearray(10 ** 6)")
+        notebook.update_cell_input_names(b_id, ["a"])
+        notebook.update_cell_output_name(b_id, "b")
+        notebook.set_cell_code(b_id, "b = id(a)")
+        notebook.run_cell(a_id)
+
+        a_cell = notebook.get_cell(a_id)
+        assert a_cell.output["nbytes"] == 10 ** 6
+        assert notebook.get_cell(b_id).output == id(a_cell.output_value)
+
+        filepath = tmp_path / "notebook.cado"
+        notebook.to_filepath(filepath)
+        loaded = Notebook.from_filepath(filepath)
+        loaded.load_outputs()
+        assert loaded.get_cell(a_id).output["type"] == "cado/binary"
+        assert loaded.get_cell(a_id).status == CellStatus.EXPIRED
+
+    def test_update_cell_input_names_cycle(self):
+        notebook = Notebook(name="notebook")
+        cell_ids = [notebook.add_cell() for _ in range(4)]
+        for i, cell_id in enumerate(cell_ids):
+            notebook.update_cell_output_name(cell_id, f"x{i}")
+            if i > 0:
+                notebook.update_cell_input_names(cell_id, [f"x{i - 1}"])
+
+        with pytest.raises(CycleError) as exc_info:
+            notebook.update_cell_input_names(cell_ids[1], ["x0", "x3"])
+        assert exc_info.value.cycle == [cell_ids[1], cell_ids[2], cell_ids[3]]
+        assert notebook.get_cell(cell_ids[1]).status == CellStatus.ERROR
+
+    def test_update_cell_input_names_deep_shared(self):
+        notebook = Notebook(name="notebook")
+        cell_ids = [notebook.add_cell() for _ in range(60)]
+        for i, cell_id in enumerate(cell_ids):
+            notebook.update_cell_output_name(cell_id, f"x{i}")
+            notebook.update_cell_input_names(cell_id, [f"x{j}" for j in range(max(0, i - 3), i)])
+        with pytest.raises(CycleError):
+            notebook.update_cell_input_names(cell_ids[0], ["x59"])
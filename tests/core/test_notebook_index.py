@@ -0,0 +1,44 @@
+import io
+import json
+import os
+
+import pytest
+
+from cado.core.json_header import read_header
+from cado.core.notebook import Notebook
+from cado.core.notebook_details import NotebookDetails
+from cado.core.notebook_index import NotebookIndex
+
+
+class TestNotebookIndex:
+
+    def test_read_header(self):
+        f = io.StringIO(json.dumps({"id": "a", "name": "b" * 10000, "n": 12345, "cells": [{"x": "{"}]}))
+        assert read_header(f) == {"id": "a", "name": "b" * 10000, "n": 12345}
+
+    def test_from_filepath_cells_first(self, tmp_path):
+        filepath = tmp_path / "notebook.cado"
+        notebook = Notebook(name="notebook")
+        notebook_json = json.loads(notebook.json())
+        filepath.write_text(json.dumps({"cells": [], **notebook_json}))
+        details = NotebookDetails.from_filepath(filepath)
+        assert details.id == notebook.id
+
+    def test_from_filepath_unsupported_version(self, tmp_path):
+        filepath = tmp_path / "notebook.cado"
+        filepath.write_text(Notebook(name="notebook", version="9.9").json())
+        with pytest.raises(ValueError, match="version 9.9"):
+            NotebookDetails.from_filepath(filepath)
+
+    def test_list_notebooks(self, tmp_path):
+        filepath = tmp_path / "notebook.cado"
+        Notebook(name="a").to_filepath(filepath)
+        index = NotebookIndex()
+        assert [details.name for details in index.list_notebooks(tmp_path)] == ["a"]
+        assert index.get(filepath) is index.get(filepath)
+
+        Notebook(name="bb").to_filepath(filepath)
+        assert [details.name for details in index.list_notebooks(tmp_path)] == ["bb"]
+
+        os.remove(filepath)
+        assert index.list_notebooks(tmp_path) == []
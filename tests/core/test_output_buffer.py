@@ -0,0 +1,20 @@
+from cado.core.output_buffer import OutputBuffer
+
+
+class TestOutputBuffer:
+
+    def test_write(self):
+        chunks = []
+        buffer = OutputBuffer(on_write=chunks.append)
+        buffer.write("hello ")
+        buffer.write("world")
+        assert buffer.getvalue() == "hello world"
+        assert chunks == ["hello ", "world"]
+        assert not buffer.truncated
+
+    def test_truncate(self):
+        buffer = OutputBuffer(max_head_chars=3, max_tail_chars=3)
+        for i in range(10):
+            buffer.write(str(i))
+        assert buffer.truncated
+        assert buffer.getvalue() == "012\n... [4 characters truncated] ...\n789"
@@ -0,0 +1,35 @@
+import json
+
+import pytest
+
+from cado.core.output_size import get_output_size
+
+
+class TestOutputSize:
+
+    def test_estimate(self):
+        outputs = [
+            {"a": [1, 2.5, "xyz", None, True], "b": {"c": ["d"] * 100}, "e": (4, 5)},
+            [{"id": i, "name": f"row {i}", "score": i / 7} for i in range(1000)],
+            {"x": list(range(10000)), "y": [i * 0.5 for i in range(10000)]},
+        ]
+        for output in outputs:
+            expected = len(json.dumps(output))
+            assert abs(get_output_size(output) - expected) <= expected * 0.05
+
+    def test_binary(self):
+        assert get_output_size(bytearray(100)) == 100
+
+    def test_not_serializable(self):
+        with pytest.raises(ValueError, match="type set"):
+            get_output_size({"a": [1, {2}]})
+        with pytest.raises(ValueError, match="Keys"):
+            get_output_size({(1, 2): 3})
+
+    def test_budget(self):
+        nested: list = []
+        nested.append(nested)
+        with pytest.raises(ValueError, match="nested deeper"):
+            get_output_size(nested)
+        with pytest.raises(ValueError, match="larger"):
+            get_output_size(["x" * 100] * 100, max_size=1000)